@@ -0,0 +1,58 @@
+"""Compare the pandas and numpy backends of build_features.
+
+Runs build_features with both backends on cached synthetic transactions
+(see bench_pipeline.py), checks that the outputs are identical and prints
+the best-of-N wall time of each:
+
+    python benchmarks/bench_aggregation.py --sizes 1e6 1e7
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_pipeline import dataset_path
+
+
+def best_time(df, backend: str, repeat: int) -> tuple:
+    from src.features.feature_engineering import build_features
+
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        # build_features writes InvoiceDate back into its input, so each run gets a copy
+        data = df.copy()
+        start = time.perf_counter()
+        result = build_features(data, backend)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1e5, 1e6])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv-dtypes", action="store_true",
+                        help="Cast Invoice to int64 as it is when the stage reads data/interim/data.csv.")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from src.data.data_preprocessing import preprocessing
+
+    print(f"{'rows':>12}{'pandas s':>11}{'numpy s':>10}{'speedup':>9}")
+    for size in map(int, args.sizes):
+        df = preprocessing(pd.read_parquet(dataset_path(size, args.seed)))
+        if args.csv_dtypes:
+            df["Invoice"] = df["Invoice"].astype("int64")
+
+        pandas_s, expected = best_time(df, "pandas", args.repeat)
+        numpy_s, result = best_time(df, "numpy", args.repeat)
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+        print(f"{size:>12,}{pandas_s:>11.3f}{numpy_s:>10.3f}{pandas_s / numpy_s:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
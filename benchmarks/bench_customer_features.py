@@ -0,0 +1,75 @@
+"""Time the single-customer feature path used by /predict-transactions.
+
+Generates synthetic transactions, computes every customer's features with
+src.features.aggregation.customer_features, checks them against
+build_snapshot and prints the latency per customer by number of lines,
+next to build_snapshot run on one customer's lines:
+
+    python benchmarks/bench_customer_features.py --rows 200000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+BUCKETS = [(1, 50), (50, 200), (200, 1000), (1000, None)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--as-of", default="2011-06-01")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from src.data.synthetic import generate_transactions
+    from src.data.data_preprocessing import preprocessing
+    from src.features.aggregation import customer_features
+    from src.features.feature_engineering import build_snapshot
+
+    as_of = pd.Timestamp(args.as_of)
+    raw = generate_transactions(args.rows, seed=args.seed)
+    snapshot = build_snapshot(preprocessing(raw.copy()), as_of=as_of).set_index("Customer ID")
+    raw["InvoiceDate"] = pd.to_datetime(raw["InvoiceDate"])
+
+    lines, times, mismatches = [], [], 0
+    for customer, group in raw.groupby("Customer ID"):
+        if customer not in snapshot.index:
+            continue
+        inputs = (group["Invoice"].tolist(), group["InvoiceDate"].to_numpy(), group["Quantity"].tolist(),
+                  group["Price"].tolist(), as_of)
+        mismatches += customer_features(*inputs) != snapshot.loc[customer].to_dict()
+        best = float("inf")
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            customer_features(*inputs)
+            best = min(best, time.perf_counter() - start)
+        lines.append(len(group))
+        times.append(best)
+    lines, times = np.array(lines), np.array(times) * 1e6
+
+    group = raw[raw["Customer ID"] == snapshot.index[0]]
+    start = time.perf_counter()
+    build_snapshot(preprocessing(group.copy()), as_of=as_of)
+    snapshot_us = (time.perf_counter() - start) * 1e6
+
+    print(f"{len(lines)} customers, {mismatches} mismatches against build_snapshot")
+    print(f"{'lines':>12}{'customers':>11}{'p50 us':>10}{'p99 us':>10}")
+    for low, high in BUCKETS:
+        mask = (lines >= low) & (lines < (high or np.inf))
+        if mask.any():
+            label = f"{low}-{high - 1}" if high else f"{low}+"
+            print(f"{label:>12}{mask.sum():>11}{np.median(times[mask]):>10.0f}{np.percentile(times[mask], 99):>10.0f}")
+    print(f"{'all':>12}{len(lines):>11}{np.median(times):>10.0f}{np.percentile(times, 99):>10.0f}")
+    print(f"build_snapshot on one customer: {snapshot_us:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
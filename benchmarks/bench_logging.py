@@ -0,0 +1,62 @@
+"""Micro-benchmark of per-call logging overhead.
+
+Each mode runs in a fresh subprocess (stdout sent to /dev/null, log file in a
+temp dir) so handler setup does not leak between runs:
+
+    python benchmarks/bench_logging.py --calls 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = {
+    "sync": "configure_logger(mode='sync')",
+    "queue": "configure_logger(mode='queue')",
+    "queue+json": "configure_logger(mode='queue', json_format=True)",
+    "queue+rate_limited": "configure_logger(mode='queue'); limit_logger('hot', rate=100)",
+}
+
+CHILD = """
+import json, logging, sys, time
+import src.logger as log
+from src.logger import configure_logger, limit_logger, shutdown_logger
+log.log_dir_path = sys.argv[2]
+{setup}
+logger = logging.getLogger('hot')
+calls = int(sys.argv[1])
+start = time.perf_counter()
+for i in range(calls):
+    logger.info('processed customer %s with %d rows', i, 42)
+elapsed = time.perf_counter() - start
+shutdown_logger()
+drained = time.perf_counter() - start
+sys.stderr.write(json.dumps({{'per_call_us': elapsed / calls * 1e6, 'drained_s': drained}}))
+"""
+
+
+def run_mode(setup: str, calls: int) -> dict:
+    with tempfile.TemporaryDirectory() as log_dir:
+        result = subprocess.run(
+            [sys.executable, "-c", CHILD.format(setup=setup), str(calls), log_dir],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<22}{'per call (us)':>15}{'incl. drain (s)':>17}")
+    for name, setup in MODES.items():
+        result = run_mode(setup, args.calls)
+        print(f"{name:<22}{result['per_call_us']:>15.2f}{result['drained_s']:>17.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Compare sklearn and ONNX Runtime prediction latency and throughput.
+
+Exports the load-test forest (see load_test.py) to ONNX, checks that both
+runtimes agree, then times a prediction at each batch size the way the
+app makes it: sklearn on a DataFrame, ONNX Runtime on a float32 array.
+Prints the median and p99 latency per call and rows/sec:
+
+    python benchmarks/bench_onnx.py --sizes 1 100 100000
+    python benchmarks/bench_onnx.py --model models/rf_model.pkl --threads 4
+
+Needs skl2onnx and onnxruntime (requirements.txt).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from load_test import feature_rows, resolve_model
+
+
+def timings(predict, X, min_calls: int, min_seconds: float) -> np.ndarray:
+    """Seconds per call, after one warm-up call."""
+    predict(X)
+    times = []
+    deadline = time.perf_counter() + min_seconds
+    while len(times) < min_calls or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        predict(X)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Pickled forest (default: as in load_test.py).")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1, 100, 100_000])
+    parser.add_argument("--threads", type=int, default=1, help="ONNX Runtime intra-op threads.")
+    parser.add_argument("--min-calls", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=3.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from src.model.onnx_model import OnnxRegressor, export_onnx
+    from src.utils import load_model
+
+    rf_model = load_model(resolve_model(args.model))
+    X, _ = feature_rows(args.seed)
+    rng = np.random.default_rng(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        onnx_path = os.path.join(tmp, "rf_model.onnx")
+        start = time.perf_counter()
+        export_onnx(rf_model, list(X.columns), onnx_path)
+        print(f"Exported {len(rf_model.estimators_)} trees in {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(onnx_path) / 2**20:.1f} MiB)")
+        onnx_model = OnnxRegressor(onnx_path, threads=args.threads)
+
+        print(f"{'rows':>8}{'runtime':>9}{'p50 ms':>11}{'p99 ms':>11}{'rows/s':>13}{'speedup':>9}{'max |diff|':>12}")
+        for size in args.sizes:
+            batch = X.iloc[rng.integers(0, len(X), size)]
+            array = batch.to_numpy(dtype=np.float32)
+            diff = np.abs(onnx_model.predict(array) - rf_model.predict(batch)).max()
+
+            results = {
+                "sklearn": timings(rf_model.predict, batch, args.min_calls, args.min_seconds),
+                "onnx": timings(onnx_model.predict, array, args.min_calls, args.min_seconds),
+            }
+            base = np.median(results["sklearn"])
+            for runtime, times in results.items():
+                p50, p99 = np.median(times), np.percentile(times, 99)
+                speedup = f"{base / p50:>8.1f}x" if runtime == "onnx" else f"{'':>9}"
+                print(f"{size:>8,}{runtime:>9}{p50 * 1000:>11.2f}{p99 * 1000:>11.2f}"
+                      f"{size / p50:>13,.0f}{speedup}{diff:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Scaling benchmark for the pipeline stages on synthetic transactions.
+
+For each size, a fresh subprocess loads a cached synthetic Parquet file
+(generated on first use with src/data/synthetic.py) and runs preprocessing,
+build_features, training and batch prediction, recording wall time, CPU time,
+throughput and peak RSS per step. Results are appended to
+benchmarks/results/pipeline.jsonl so runs can be compared over time:
+
+    python benchmarks/bench_pipeline.py --sizes 1e5 1e6 1e7
+    python benchmarks/bench_pipeline.py --sizes 1e5 --compare
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DATA_DIR = os.path.join(REPO_ROOT, "benchmarks", "data")
+RESULTS_PATH = os.path.join(REPO_ROOT, "benchmarks", "results", "pipeline.jsonl")
+
+
+def dataset_path(size: int, seed: int) -> str:
+    path = os.path.join(DATA_DIR, f"transactions_{size}_{seed}.parquet")
+    if not os.path.exists(path):
+        from src.data.synthetic import write_transactions
+        write_transactions(path, size, seed)
+    return path
+
+
+def run_size(size: int, seed: int, n_estimators: int) -> dict:
+    """Run every step once in this process and return the measurements."""
+    import pandas as pd
+    from src import perf
+    from src.data.data_preprocessing import preprocessing
+    from src.features.feature_engineering import build_features
+    from src.model.model_building import model_traing
+    from src.utils import load_params
+
+    path = dataset_path(size, seed)
+    params = load_params(os.path.join(REPO_ROOT, "params.yaml"))
+    params["random_forest"]["n_estimators"] = n_estimators
+
+    rows = {}
+    with perf.stage("bench"):
+        with perf.track("load"):
+            df = pd.read_parquet(path)
+        rows["load"] = len(df)
+
+        with perf.track("preprocessing"):
+            df = preprocessing(df)
+        rows["preprocessing"] = rows["load"]
+
+        with perf.track("build_features"):
+            features = build_features(df, params["feature_engineering"].get("backend", "pandas"))
+        rows["build_features"] = len(df)
+        del df
+
+        X = features.drop(columns=["target_clv"])
+        y = features["target_clv"]
+        with perf.track("training"):
+            model = model_traing(X, y, params)
+        rows["training"] = len(X)
+
+        with perf.track("batch_prediction"):
+            model.predict(X)
+        rows["batch_prediction"] = len(X)
+
+    # Nested steps (build_features.groupby, rf.fit, leaf_quantiles) are kept next to their parent
+    rows["build_features.groupby"] = rows["build_features"]
+    rows["rf.fit"] = rows["training"]
+    rows["leaf_quantiles"] = rows["training"]
+    steps = perf.get_records()["bench"]["steps"]
+    for name, step in steps.items():
+        step.pop("calls", None)
+        # Steps added to the pipeline later have no row count here until listed above
+        step["rows"] = rows.get(name)
+        step["rows_per_s"] = round(rows[name] / step["wall_s"], 1) if rows.get(name) and step["wall_s"] else None
+    return steps
+
+
+def git_sha() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def load_results() -> list:
+    if not os.path.exists(RESULTS_PATH):
+        return []
+    with open(RESULTS_PATH) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def compare(record: dict, history: list) -> None:
+    """Print wall-time ratios against the previous run with the same size and settings."""
+    previous = [r for r in history if r["size"] == record["size"]
+                and r["n_estimators"] == record["n_estimators"] and r["seed"] == record["seed"]]
+    if not previous:
+        print("    (no previous run to compare against)")
+        return
+    last = previous[-1]
+    for name, step in record["steps"].items():
+        before = last["steps"].get(name, {}).get("wall_s")
+        if before:
+            print(f"    {name:<24} {before:>9.3f}s -> {step['wall_s']:>9.3f}s  x{step['wall_s'] / before:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1e5, 1e6])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--n-estimators", type=int, default=100,
+                        help="Trees to train (params.yaml uses 1000; fewer keeps large sizes tractable).")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        os.chdir(REPO_ROOT)
+        print(json.dumps(run_size(int(args.sizes[0]), args.seed, args.n_estimators)))
+        return
+
+    history = load_results()
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    for size in map(int, args.sizes):
+        # One process per size so peak RSS is not inherited from a larger run
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--sizes", str(size),
+             "--seed", str(args.seed), "--n-estimators", str(args.n_estimators)],
+            stdout=subprocess.PIPE, text=True, check=True,
+        )
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_sha": git_sha(),
+            "machine": f"{platform.machine()} {os.cpu_count()} cpus",
+            "python": platform.python_version(),
+            "size": size,
+            "seed": args.seed,
+            "n_estimators": args.n_estimators,
+            "steps": json.loads(result.stdout.strip().splitlines()[-1]),
+        }
+        with open(RESULTS_PATH, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+        print(f"size={size:,}")
+        for name, step in record["steps"].items():
+            print(f"    {name:<24}{step['wall_s']:>9.3f}s {step['rows_per_s'] or 0:>14,.0f} rows/s"
+                  f" {step.get('peak_rss_mb', step.get('process_peak_rss_mb')):>9.1f} MB peak"
+                  f" {step.get('rss_growth_mb', 0):>9.1f} MB growth")
+        if args.compare:
+            compare(record, history)
+
+
+if __name__ == "__main__":
+    main()
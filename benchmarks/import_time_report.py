@@ -0,0 +1,91 @@
+"""Import-time report and startup budget check for the pipeline/serving entry points.
+
+Runs `python -X importtime` for each entry point in a fresh interpreter and
+breaks the import cost down by top-level package (self time summed over all
+of a package's modules):
+
+    python benchmarks/import_time_report.py            # report
+    python benchmarks/import_time_report.py --check    # exit 1 if over budget
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import budget per entry point in milliseconds (min over --repeat runs),
+# about 1.5x the measured time (450-740 ms for the light stages on one core),
+# so that an eager scipy, sklearn or mlflow import (+350-700 ms) fails.
+ENTRY_POINTS = {
+    "src.data.data_ingestion": 900,
+    "src.data.data_preprocessing": 900,
+    "src.features.feature_engineering": 900,
+    "src.model.model_building": 2000,
+    "src.model.model_evaluation": 1000,
+    "src.model.register_model": 1000,
+    "src.pipeline.runner": 1000,
+    "flask_app.app": 1100,
+}
+
+MARKER = "--entry-point-imports--"
+
+
+def measure(module: str) -> tuple:
+    """Return (total_ms, {package: self_ms}) for importing `module`."""
+    code = f"import sys; sys.stderr.write('{MARKER}\\n'); import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=REPO_ROOT, check=True,
+    )
+    lines = result.stderr.splitlines()
+    lines = lines[lines.index(MARKER) + 1:]
+
+    total_us = 0
+    by_package = defaultdict(int)
+    for line in lines:
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        by_package[name.split(".")[0]] += int(self_us)
+        if depth == 0:
+            total_us += int(cumulative_us)
+    return total_us / 1000, {pkg: us / 1000 for pkg, us in by_package.items()}
+
+
+def report(repeat: int = 3) -> dict:
+    """Measure every entry point; returns {module: (total_ms, breakdown)}."""
+    results = {}
+    for module in ENTRY_POINTS:
+        runs = [measure(module) for _ in range(repeat)]
+        results[module] = min(runs, key=lambda run: run[0])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="Packages listed per entry point.")
+    parser.add_argument("--check", action="store_true", help="Fail when an entry point exceeds its budget.")
+    args = parser.parse_args()
+
+    over_budget = []
+    for module, (total_ms, breakdown) in report(args.repeat).items():
+        budget = ENTRY_POINTS[module]
+        status = "OK" if total_ms <= budget else "OVER BUDGET"
+        print(f"{module:<36}{total_ms:>9.1f} ms  (budget {budget} ms) {status}")
+        for package, ms in sorted(breakdown.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {package:<32}{ms:>9.1f} ms")
+        if total_ms > budget:
+            over_budget.append(module)
+
+    if args.check and over_budget:
+        print(f"Startup budget exceeded: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Load-test harness for the Flask prediction service.
+
+Starts the app (gunicorn by default) against a local model artifact, drives
+/predict and /predict-form at each concurrency level with a weighted mix of
+batch sizes, and reports p50/p95/p99 latency and requests/sec per scenario.
+Responses shed by admission control (429/503) are counted as "shed", not
+as errors. /predict-form answers 200 with the error on the page, so form
+responses that contain "Error:" count as errors.
+With --check it exits 1 when a scenario regresses past the stored baseline.
+Baselines depend on the machine and are not committed: record one with
+--save-baseline before using --check.
+
+    python benchmarks/load_test.py --concurrency 1 8 32 --duration 20
+    python benchmarks/load_test.py --save-baseline          # record a baseline
+    python benchmarks/load_test.py --check --tolerance 0.25 # CI regression gate
+
+Without --model, models/rf_model.pkl is used, or a forest with the
+params.yaml settings is trained on synthetic data and cached.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines", "serving.json")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+CACHED_MODEL_PATH = os.path.join(REPO_ROOT, "benchmarks", "data", "load_test_model.pkl")
+
+FEATURES = [
+    "unique_invoices", "total_quantity", "avg_quantity_per_order", "unit_price_std",
+    "customer_age_days", "days_since_last_purchase", "average_days_between_purchase",
+    "is_onetime_buyer",
+]
+
+
+def feature_rows(seed: int = 42):
+    """Realistic feature rows built from synthetic transactions."""
+    from src.data.synthetic import generate_transactions
+    from src.data.data_preprocessing import preprocessing
+    from src.features.feature_engineering import build_features
+
+    features = build_features(preprocessing(generate_transactions(1_000_000, seed)))
+    return features.drop(columns=["target_clv"]), features["target_clv"]
+
+
+def resolve_model(model_path: str) -> str:
+    if model_path:
+        return os.path.abspath(model_path)
+    default = os.path.join(REPO_ROOT, "models", "rf_model.pkl")
+    if os.path.exists(default):
+        return default
+    if not os.path.exists(CACHED_MODEL_PATH):
+        from src.model.model_building import model_traing, save_model
+        X, y = feature_rows()
+        os.makedirs(os.path.dirname(CACHED_MODEL_PATH), exist_ok=True)
+        os.chdir(REPO_ROOT)
+        save_model(model_traing(X, y), CACHED_MODEL_PATH)
+    return CACHED_MODEL_PATH
+
+
+def start_server(model_path: str, server: str, workers: int, port: int, extra_env: dict) -> subprocess.Popen:
+    env = dict(os.environ, MODEL_PATH=model_path, **extra_env)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    if server == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py",
+               "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "app:app"]
+    else:
+        cmd = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port)]
+    proc = subprocess.Popen(cmd, cwd=os.path.join(REPO_ROOT, "flask_app"), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+    deadline = time.time() + 120
+    try:
+        while time.time() < deadline:
+            # Otherwise a server left on the port by an earlier run would answer instead
+            if proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {proc.returncode}; is port {port} in use?")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+                conn.request("GET", "/health")
+                response = conn.getresponse()
+                # Threaded workers keep the connection alive, so the body must be read
+                response.read()
+                if response.status == 200:
+                    # Warm the lazily loaded model in every worker
+                    for _ in range(workers * 4):
+                        send(conn, "/predict", json.dumps([dict.fromkeys(FEATURES, 1)]), "application/json")
+                    return proc
+            except OSError:
+                time.sleep(0.5)
+        raise RuntimeError("Server did not become healthy")
+    except BaseException:
+        stop_server(proc)
+        raise
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    proc.wait(timeout=30)
+
+
+def send(conn: http.client.HTTPConnection, path: str, body: str, content_type: str) -> tuple:
+    """(status, response body) of one POST."""
+    conn.request("POST", path, body=body, headers={"Content-Type": content_type})
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def parse_mix(text: str) -> list:
+    """'1:0.8,100:0.15,1000:0.05' -> [(1, 0.8), (100, 0.15), (1000, 0.05)]"""
+    return [(int(size), float(weight)) for size, weight in (item.split(":") for item in text.split(","))]
+
+
+def run_scenario(port: int, concurrency: int, duration: float, batch_mix: list,
+                 form_share: float, X, seed: int, quantiles: str = None) -> dict:
+    """Closed-loop load: `concurrency` clients each sending back-to-back requests."""
+    records = X.to_dict(orient="records")
+    sizes, weights = zip(*batch_mix)
+    predict_path = f"/predict?quantiles={quantiles}" if quantiles else "/predict"
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    shed = defaultdict(int)
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(worker_id):
+        rng = random.Random(seed + worker_id)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=130)
+        local = defaultdict(list)
+        local_errors = defaultdict(int)
+        local_shed = defaultdict(int)
+        while time.perf_counter() < stop_at:
+            if rng.random() < form_share:
+                key = "/predict-form b1"
+                row = rng.choice(records)
+                path, body, ctype = "/predict-form", urllib.parse.urlencode(row), "application/x-www-form-urlencoded"
+            else:
+                size = rng.choices(sizes, weights)[0]
+                key = f"{predict_path} b{size}"
+                batch = [records[rng.randrange(len(records))] for _ in range(size)]
+                path, body, ctype = predict_path, json.dumps(batch), "application/json"
+            start = time.perf_counter()
+            try:
+                status, content = send(conn, path, body, ctype)
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=130)
+                status, content = None, b""
+            elapsed = time.perf_counter() - start
+            if status == 200 and path == "/predict-form" and b"Error:" in content:
+                local_errors[key] += 1
+            elif status == 200:
+                local[key].append(elapsed)
+            elif status in (429, 503):
+                local_shed[key] += 1
+            else:
+                local_errors[key] += 1
+        with lock:
+            for key, values in local.items():
+                latencies[key].extend(values)
+            for key, count in local_errors.items():
+                errors[key] += count
+            for key, count in local_shed.items():
+                shed[key] += count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for key in sorted(set(latencies) | set(errors) | set(shed)):
+        values = np.array(latencies.get(key, [])) * 1000
+        results[f"c{concurrency} {key}"] = {
+            "requests": int(values.size),
+            "errors": errors.get(key, 0),
+            "shed": shed.get(key, 0),
+            "rps": round(values.size / elapsed, 2),
+            "p50_ms": round(float(np.percentile(values, 50)), 3) if values.size else None,
+            "p95_ms": round(float(np.percentile(values, 95)), 3) if values.size else None,
+            "p99_ms": round(float(np.percentile(values, 99)), 3) if values.size else None,
+        }
+    total = sum(len(v) for v in latencies.values())
+    results[f"c{concurrency} total"] = {"requests": total, "errors": sum(errors.values()),
+                                        "shed": sum(shed.values()), "rps": round(total / elapsed, 2)}
+    return results
+
+
+def check_against_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p95/p99 grew or rps dropped by more than `tolerance`."""
+    regressions = []
+    for scenario, base in baseline.items():
+        current = results.get(scenario)
+        if current is None:
+            continue
+        for metric in ("p95_ms", "p99_ms"):
+            if base.get(metric) and current.get(metric) and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{scenario}: {metric} {base[metric]} -> {current[metric]}")
+        if base.get("rps") and current.get("rps", 0) < base["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: rps {base['rps']} -> {current['rps']}")
+        if current.get("errors"):
+            regressions.append(f"{scenario}: {current['errors']} errors")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Local model artifact (.pkl or MLflow model dir).")
+    parser.add_argument("--server", choices=["gunicorn", "flask"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per concurrency level.")
+    parser.add_argument("--batch-mix", default="1:0.8,100:0.15,1000:0.05",
+                        help="Batch sizes and weights for /predict.")
+    parser.add_argument("--form-share", type=float, default=0.2, help="Share of /predict-form requests.")
+    parser.add_argument("--quantiles", help="e.g. 0.1,0.9 to request prediction intervals from /predict "
+                                            "(needs a model trained with leaf quantiles).")
+    parser.add_argument("--env", nargs="*", default=[], help="Extra KEY=VALUE env for the server.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="Fail when latency regresses past the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.check and not args.save_baseline and not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}. Record one on this machine with --save-baseline "
+                 f"(or pass --baseline) before using --check.")
+
+    model_path = resolve_model(args.model)
+    X, _ = feature_rows(args.seed)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    proc = start_server(model_path, args.server, args.workers, args.port, extra_env)
+    results = {}
+    try:
+        for concurrency in args.concurrency:
+            results.update(run_scenario(args.port, concurrency, args.duration,
+                                        parse_mix(args.batch_mix), args.form_share, X, args.seed,
+                                        args.quantiles))
+    finally:
+        stop_server(proc)
+
+    print(f"{'scenario':<28}{'requests':>9}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'shed':>6}")
+    for scenario, row in results.items():
+        fmt = lambda v: f"{v:>10.2f}" if v is not None else f"{'-':>10}"
+        print(f"{scenario:<28}{row['requests']:>9}{row['rps']:>9.1f}{fmt(row.get('p50_ms'))}"
+              f"{fmt(row.get('p95_ms'))}{fmt(row.get('p99_ms'))}{row['errors']:>8}{row.get('shed', 0):>6}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    run = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "model": model_path,
+           "server": args.server, "workers": args.workers, "env": extra_env, "results": results}
+    with open(os.path.join(RESULTS_DIR, "load_test.jsonl"), "a") as file:
+        file.write(json.dumps(run) + "\n")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.check:
+        with open(args.baseline) as file:
+            regressions = check_against_baseline(results, json.load(file), args.tolerance)
+        if regressions:
+            print("Latency regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
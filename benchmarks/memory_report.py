@@ -0,0 +1,80 @@
+"""RSS/PSS of the gunicorn master and workers, with and without preloading.
+
+Starts gunicorn against a local model (see load_test.py) once per mode,
+sends a burst of /predict traffic so every worker has served requests,
+then reads /proc/<pid>/smaps_rollup for the master and each worker. PSS
+charges each shared page to all of its processes in equal parts, so the
+PSS total is the memory the pod really uses:
+
+    python benchmarks/memory_report.py --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from load_test import FEATURES, feature_rows, resolve_model, send, start_server, stop_server
+
+FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def smaps_rollup(pid: int) -> dict:
+    """Memory fields of /proc/<pid>/smaps_rollup in MiB."""
+    result = {}
+    with open(f"/proc/{pid}/smaps_rollup") as file:
+        for line in file:
+            name, _, rest = line.partition(":")
+            if name in FIELDS:
+                result[name] = int(rest.split()[0]) / 1024
+    return result
+
+
+def children(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as file:
+        return [int(child) for child in file.read().split()]
+
+
+def measure(model_path: str, workers: int, preload: bool, port: int, requests: int, X) -> list:
+    env = {"GUNICORN_PRELOAD": "1" if preload else "0", "DRIFT_MONITORING": "0"}
+    proc = start_server(model_path, "gunicorn", workers, port, env)
+    try:
+        import http.client
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=130)
+        batch = json.dumps(X[FEATURES].head(100).to_dict(orient="records"))
+        for _ in range(requests):
+            send(conn, "/predict", batch, "application/json")
+        time.sleep(1)
+        rows = [("master", proc.pid, smaps_rollup(proc.pid))]
+        rows += [("worker", pid, smaps_rollup(pid)) for pid in children(proc.pid)]
+        return rows
+    finally:
+        stop_server(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Local model artifact (.pkl or MLflow model dir).")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=5056)
+    parser.add_argument("--requests", type=int, default=200, help="/predict calls before measuring.")
+    args = parser.parse_args()
+
+    model_path = resolve_model(args.model)
+    X, _ = feature_rows()
+
+    print(f"{'mode':<12}{'process':<9}{'pid':>8}" + "".join(f"{name + ' MiB':>19}" for name in FIELDS))
+    for preload in (False, True):
+        mode = "preload" if preload else "per-worker"
+        rows = measure(model_path, args.workers, preload, args.port, args.requests, X)
+        for role, pid, fields in rows:
+            print(f"{mode:<12}{role:<9}{pid:>8}" + "".join(f"{fields.get(name, 0):>19.1f}" for name in FIELDS))
+        total = {name: sum(fields.get(name, 0) for _, _, fields in rows) for name in FIELDS}
+        print(f"{mode:<12}{'total':<9}{'':>8}" + "".join(f"{total[name]:>19.1f}" for name in FIELDS))
+
+
+if __name__ == "__main__":
+    main()
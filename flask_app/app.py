@@ -1,45 +1,74 @@
+import atexit
 import numpy as np
 import pandas as pd
-import mlflow
-import dagshub
 import os
+import sys
+import threading
 from flask import Flask, render_template, request, jsonify
 import time
-from prometheus_client import Counter, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest 
+# src/ is copied next to app.py in the Docker image and is one level up in the repo
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# For local use
-# dagshub.init(repo_owner='shashi-hue', repo_name='Mlops-Forward-Customer-Value', mlflow=True)
+from src.serving.metrics import (
+    REQUEST_COUNT, REQUEST_LATENCY, BATCH_SIZE, IN_FLIGHT, MODEL_MEMORY, DRIFT_ROWS, SHADOW_SKIPPED,
+    PREDICTION_ROWS, ADMISSION_SHED, QUEUE_TIME, ROWS_IN_FLIGHT, INFERENCE_STRATEGY, INFERENCE_THREADS,
+    PREDICTION_LOG_ROWS, PREDICTION_LOG_DROPPED, phase, model_nbytes, generate_metrics, publish_drift, record_shadow,
+)
+from src.model.quantiles import parse_quantiles
+from src.serving.admission import AdmissionController, Rejected
+from src.serving.inference import AdaptivePredictor
+from src.features.aggregation import customer_features
 
-#For production
-dagshub_token = os.getenv("CAPSTONE_TEST")
-if not dagshub_token:
-    raise EnvironmentError("CAPSTONE_TEST env variable not set")
 
-os.environ["MLFLOW_TRACKING_USERNAME"] = dagshub_token
-os.environ["MLFLOW_TRACKING_PASSWORD"] = dagshub_token
+app = Flask(__name__)
 
-dagshub_url = "https://dagshub.com"
-repo_owner = "shashi-hue"
-repo_name = "Mlops-Forward-Customer-Value"
 
-# Set up MLflow tracking URI
-mlflow.set_tracking_uri(f'{dagshub_url}/{repo_owner}/{repo_name}.mlflow')
+def setup_tracking():
+    """Point MLflow at the DagsHub registry. Called on first model load, not at import."""
+    import mlflow
 
+    # For local use
+    # import dagshub
+    # dagshub.init(repo_owner='shashi-hue', repo_name='Mlops-Forward-Customer-Value', mlflow=True)
 
-app = Flask(__name__)
+    #For production
+    dagshub_token = os.getenv("CAPSTONE_TEST")
+    if not dagshub_token:
+        raise EnvironmentError("CAPSTONE_TEST env variable not set")
 
+    os.environ["MLFLOW_TRACKING_USERNAME"] = dagshub_token
+    os.environ["MLFLOW_TRACKING_PASSWORD"] = dagshub_token
 
-# Defining custom metrics
-registry = CollectorRegistry()
-REQUEST_COUNT = Counter("app_request_count", "total number of requests to the app", ["method", "endpoint"], registry=registry)
+    dagshub_url = "https://dagshub.com"
+    repo_owner = "shashi-hue"
+    repo_name = "Mlops-Forward-Customer-Value"
 
-REQUEST_LATENCY = Histogram(
-    "app_request_latency_seconds", "Latency of requests in seconds", ["endpoint"], registry=registry)
+    # Set up MLflow tracking URI
+    mlflow.set_tracking_uri(f'{dagshub_url}/{repo_owner}/{repo_name}.mlflow')
 
 
 # Model setup
 model_name = "my_model"
+model = None
+model_version = None
+drift_monitor = None
+explainer = None
+ranking = None
+prediction_store = None
+fingerprint = None
+onnx_model = None
+forest = None
+surrogate = None
+surrogate_routes = set()
+shadow = None
+admission = None
+prediction_log = None
+_process_id = None
+_model_lock = threading.Lock()
+
 def get_latest_model_version(model_name):
+    import mlflow
+
     client = mlflow.MlflowClient()
     latest_version = client.get_latest_versions(model_name, stages=["Production"])
     if not latest_version:
@@ -47,10 +76,437 @@ def get_latest_model_version(model_name):
     return latest_version[0].version if latest_version else None
 
 
-model_version = get_latest_model_version(model_name)
-model_uri = f'models:/{model_name}/{model_version}'
-print(f"Fetching model from: {model_uri}")
-model = mlflow.pyfunc.load_model(model_uri)
+def load_local_model(model_path):
+    """Load a local artifact: a pickled estimator (.pkl) or an MLflow model directory."""
+    if model_path.endswith(".pkl"):
+        import pickle
+        with open(model_path, "rb") as file:
+            return pickle.load(file)
+
+    import mlflow.pyfunc
+    return mlflow.pyfunc.load_model(model_path)
+
+
+def load_drift_monitor(model, version):
+    """Streaming drift sketches against the training profile, or None when unavailable.
+
+    DRIFT_REFERENCE_PATH overrides the feature profile written by the
+    feature engineering stage, DRIFT_PREDICTION_PROFILE_PATH the prediction
+    profile written by the evaluation stage. Predictions are only tracked
+    when that profile was built from the served model (same tree
+    fingerprint). DRIFT_MONITORING=0 turns monitoring off.
+    """
+    from src.serving.drift import DriftMonitor, PREDICTION, PREDICTION_PROFILE_PATH, REFERENCE_PATH, load_profile
+
+    if os.getenv("DRIFT_MONITORING", "1") == "0":
+        return None
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    profile_path = os.getenv("DRIFT_REFERENCE_PATH", os.path.join(repo_root, REFERENCE_PATH))
+    if not os.path.exists(profile_path):
+        print(f"Drift monitoring disabled, no reference profile at: {profile_path}")
+        return None
+    profile = load_profile(profile_path)
+    # Older feature profiles carried a target histogram in place of predictions
+    profile["features"].pop(PREDICTION, None)
+    prediction_path = os.getenv("DRIFT_PREDICTION_PROFILE_PATH", os.path.join(repo_root, PREDICTION_PROFILE_PATH))
+    if not os.path.exists(prediction_path):
+        print(f"Prediction drift disabled, no prediction profile at: {prediction_path}")
+    else:
+        predictions = load_profile(prediction_path)
+        if predictions.get("fingerprint") is not None and predictions["fingerprint"] == served_fingerprint(model):
+            profile["features"][PREDICTION] = predictions["features"][PREDICTION]
+        else:
+            print(f"Prediction drift disabled, {prediction_path} was not built from model version {version}")
+    return DriftMonitor(
+        profile, REQUIRED_FEATURES,
+        window=int(os.getenv("DRIFT_WINDOW", "10000")),
+        on_publish=publish_drift,
+    )
+
+
+def observe_drift(X, preds_log):
+    if drift_monitor is not None:
+        drift_monitor.observe(X, preds_log)
+        DRIFT_ROWS.inc(len(X))
+
+
+def load_explainer(model, version):
+    """TreeSHAP tables for the served forest, built once per model version.
+
+    EXPLANATIONS=0 skips the build (and disables /explain).
+    """
+    from src.model.explain import TreeExplainer
+
+    estimator = raw_model(model)
+    if os.getenv("EXPLANATIONS", "1") == "0" or not hasattr(estimator, "estimators_"):
+        return None
+    start = time.time()
+    tree_explainer = TreeExplainer(estimator, version=version)
+    print(f"Built TreeSHAP tables for model version {version} in {time.time() - start:.1f}s")
+    return tree_explainer
+
+
+def served_fingerprint(model):
+    """Tree fingerprint of the served forest, or None for other models."""
+    from src.utils import model_fingerprint
+
+    estimator = raw_model(model)
+    return model_fingerprint(estimator) if hasattr(estimator, "estimators_") else None
+
+
+def load_ranking(fingerprint, version):
+    """Top-K ranking written by the batch scoring stage, or None.
+
+    RANKING_PATH points at the ranking file. It is only served if it was
+    scored by the served model (same tree fingerprint), so a new model
+    version needs a new ranking.
+    """
+    from src.serving.ranking import Ranking
+
+    ranking_path = os.getenv("RANKING_PATH")
+    if not ranking_path or fingerprint is None:
+        return None
+    if not os.path.exists(ranking_path):
+        print(f"Ranking disabled, no ranking at: {ranking_path}")
+        return None
+    loaded = Ranking.load(ranking_path)
+    if loaded.fingerprint != fingerprint:
+        print(f"Ranking disabled, {ranking_path} was not scored by model version {version}")
+        return None
+    print(f"Loaded ranking of {len(loaded)} customers from: {ranking_path}")
+    return loaded
+
+
+def load_prediction_store(fingerprint, version):
+    """Precomputed predictions of known customers, or None.
+
+    PREDICTION_STORE_PATH points at the SQLite file written by the batch
+    scoring stage. Only rows scored by the served model are used.
+    """
+    from src.serving.prediction_store import PredictionStore
+
+    store_path = os.getenv("PREDICTION_STORE_PATH")
+    if not store_path or fingerprint is None:
+        return None
+    if not os.path.exists(store_path):
+        print(f"Prediction store disabled, no store at: {store_path}")
+        return None
+    store = PredictionStore(store_path, fingerprint)
+    if not store.n_customers:
+        print(f"Prediction store disabled, {store_path} has no predictions of model version {version}")
+        return None
+    print(f"Serving {store.n_customers} known customers from: {store_path}")
+    return store
+
+
+def load_onnx_model(fingerprint, version):
+    """ONNX Runtime session for the served forest, or None.
+
+    ONNX_MODEL_PATH points at the file written by the onnx_export stage;
+    it is only used if it was exported from the served model. ONNX_THREADS
+    (default 1) is the intra-op thread count per request. Sessions do not
+    survive a fork, so each worker opens its own.
+    """
+    from src.model.onnx_model import OnnxRegressor
+
+    onnx_path = os.getenv("ONNX_MODEL_PATH")
+    if not onnx_path or fingerprint is None:
+        return None
+    if not os.path.exists(onnx_path):
+        print(f"ONNX inference disabled, no model at: {onnx_path}")
+        return None
+    try:
+        loaded = OnnxRegressor(onnx_path, threads=int(os.getenv("ONNX_THREADS", "1")))
+    except ImportError as e:
+        print(f"ONNX inference disabled: {e}")
+        return None
+    if loaded.fingerprint != fingerprint or loaded.feature_names != REQUIRED_FEATURES:
+        print(f"ONNX inference disabled, {onnx_path} was not exported from model version {version}")
+        return None
+    print(f"Predicting with ONNX Runtime from: {onnx_path}")
+    return loaded
+
+
+def predict_log(X):
+    """Log-scale predictions of the served model for the REQUIRED_FEATURES frame `X`.
+
+    With an ONNX model loaded, the features go to ONNX Runtime as a
+    float32 array; otherwise the forest predicts through the adaptive
+    predictor, or the model itself when that is disabled.
+    """
+    if onnx_model is not None:
+        return onnx_model.predict(X.to_numpy(dtype=np.float32))
+    if forest is not None:
+        return forest.predict(X)
+    return get_model().predict(X)
+
+
+def load_adaptive(loaded):
+    """AdaptivePredictor for the served forest, or None.
+
+    It validates the input once instead of once per tree and picks inline,
+    tree-parallel or row-parallel execution by batch size, from timings
+    taken here. INFERENCE_THREADS overrides the thread count (by default
+    the CPUs divided by GUNICORN_WORKERS) and ADAPTIVE_INFERENCE=0 turns
+    it off.
+    """
+    if os.getenv("ADAPTIVE_INFERENCE", "1") == "0" or not hasattr(raw_model(loaded), "estimators_"):
+        return None
+    try:
+        loaded = AdaptivePredictor(raw_model(loaded),
+                                   on_predict=lambda strategy, rows: INFERENCE_STRATEGY.labels(strategy=strategy).inc())
+    except Exception as e:
+        print(f"Adaptive inference disabled: {e}")
+        return None
+    print(f"Adaptive inference: {loaded.describe()}")
+    return loaded
+
+
+def load_surrogate(fingerprint, version):
+    """Distilled surrogate model for the endpoints in SURROGATE_ENDPOINTS, or None.
+
+    SURROGATE_ENDPOINTS is a comma-separated list such as "/predict-form".
+    The surrogate is SURROGATE_MODEL_PATH when set, otherwise the latest
+    registry version of the surrogate model. It is only used if it was
+    distilled from the served forest; a failure here only disables it.
+    """
+    from src.model.distillation import SURROGATE_MODEL_NAME
+
+    if not surrogate_routes or fingerprint is None:
+        return None
+    try:
+        source = os.getenv("SURROGATE_MODEL_PATH")
+        if source:
+            loaded = load_local_model(source)
+        else:
+            import mlflow.pyfunc
+
+            if os.getenv("MODEL_PATH"):
+                setup_tracking()
+            source = f"models:/{SURROGATE_MODEL_NAME}/{get_latest_model_version(SURROGATE_MODEL_NAME)}"
+            loaded = mlflow.pyfunc.load_model(source)
+    except Exception as e:
+        print(f"Surrogate model disabled: {e}")
+        return None
+    if getattr(raw_model(loaded), "teacher_fingerprint_", None) != fingerprint:
+        print(f"Surrogate model disabled, {source} was not distilled from model version {version}")
+        return None
+    print(f"Routing {', '.join(sorted(surrogate_routes))} to the surrogate model: {source}")
+    return loaded
+
+
+def predictor(endpoint):
+    """Predict function for `endpoint`: the surrogate when it is routed there, else predict_log."""
+    if surrogate is not None and endpoint in surrogate_routes:
+        return surrogate.predict
+    return predict_log
+
+
+def lookup_stored(df):
+    """Stored log-scale predictions of the rows sent with a customer_id and no features.
+
+    Returns (predictions, has_features): NaN marks the rows to score live,
+    i.e. explicit feature payloads and customers not in the store. None
+    when there is no store or no customer_id column.
+    """
+    if prediction_store is None or "customer_id" not in df.columns:
+        return None, None
+    has_features = df.reindex(columns=REQUIRED_FEATURES).notna().all(axis=1).to_numpy()
+    stored = np.full(len(df), np.nan)
+    if not has_features.all():
+        stored[~has_features] = prediction_store.lookup(df.loc[~has_features, "customer_id"])
+    return stored, has_features
+
+
+def load_shadow():
+    """Candidate model scorer for shadow traffic, or None when off.
+
+    SHADOW_SAMPLE_RATE (default 0) is the share of batches sent to the
+    candidate. The candidate is SHADOW_MODEL_PATH when set, otherwise the
+    registry version under the SHADOW_MODEL_ALIAS alias (default
+    "candidate", set by register_model). A failure here only disables
+    shadow scoring.
+    """
+    from src.serving.shadow import ShadowScorer
+
+    sample_rate = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+    if sample_rate <= 0:
+        return None
+    try:
+        source = os.getenv("SHADOW_MODEL_PATH")
+        tracking_uri = None
+        if not source:
+            import mlflow
+
+            if os.getenv("MODEL_PATH"):
+                setup_tracking()
+            alias = os.getenv("SHADOW_MODEL_ALIAS", "candidate")
+            version = mlflow.MlflowClient().get_model_version_by_alias(model_name, alias).version
+            if str(version) == str(model_version):
+                print(f"Shadow scoring disabled, '{alias}' is the served version {version}")
+                return None
+            source = f"models:/{model_name}/{version}"
+            tracking_uri = mlflow.get_tracking_uri()
+        print(f"Shadow scoring {sample_rate:.0%} of batches with: {source}")
+        return ShadowScorer(
+            source, sample_rate,
+            max_pending=int(os.getenv("SHADOW_MAX_PENDING", "2")),
+            tracking_uri=tracking_uri,
+            on_result=record_shadow,
+            on_skip=lambda reason: SHADOW_SKIPPED.labels(reason=reason).inc(),
+        )
+    except Exception as e:
+        print(f"Shadow scoring disabled: {e}")
+        return None
+
+
+def submit_shadow(X, preds_log):
+    if shadow is not None:
+        shadow.submit(X, preds_log)
+
+
+def load_prediction_log():
+    """Log of this worker's predictions under PREDICTION_LOG_DIR, or None when unset.
+
+    Rows go through an in-memory buffer of PREDICTION_LOG_CAPACITY rows
+    (default 100000) and are written to Parquet every
+    PREDICTION_LOG_FLUSH_ROWS rows (default 10000) or
+    PREDICTION_LOG_FLUSH_SECONDS (default 10); files are rotated every
+    PREDICTION_LOG_ROTATE_SECONDS (default 3600). Rows that do not fit in
+    the buffer are dropped.
+    """
+    from src.serving.prediction_log import PredictionLog
+
+    directory = os.getenv("PREDICTION_LOG_DIR")
+    if not directory:
+        return None
+    log = PredictionLog(
+        directory, REQUIRED_FEATURES,
+        capacity=int(os.getenv("PREDICTION_LOG_CAPACITY", "100000")),
+        flush_rows=int(os.getenv("PREDICTION_LOG_FLUSH_ROWS", "10000")),
+        flush_interval=float(os.getenv("PREDICTION_LOG_FLUSH_SECONDS", "10")),
+        rotate_seconds=float(os.getenv("PREDICTION_LOG_ROTATE_SECONDS", "3600")),
+        on_write=PREDICTION_LOG_ROWS.inc,
+        on_drop=lambda rows, reason: PREDICTION_LOG_DROPPED.labels(reason=reason).inc(rows),
+    )
+    # Write what is buffered when the worker exits
+    atexit.register(log.close)
+    print(f"Logging predictions to: {directory}")
+    return log
+
+
+def log_predictions(endpoint, df, preds_log, source, stored=None):
+    if prediction_log is not None:
+        customer_ids = df["customer_id"] if "customer_id" in df.columns else None
+        prediction_log.record(df.reindex(columns=REQUIRED_FEATURES), preds_log, model_version, endpoint,
+                              source, stored, customer_ids)
+
+
+def load_admission():
+    """Admission control for this worker's prediction calls, or None when ADMISSION=0.
+
+    Requests over ADMISSION_BATCH_ROWS rows are batches: they run in chunks
+    of ADMISSION_CHUNK_ROWS that yield to small requests for at most
+    ADMISSION_BATCH_YIELD seconds, and at most ADMISSION_MAX_BATCHES run
+    at once. At most ADMISSION_MAX_ROWS rows are
+    predicted at once; a request is shed with 503 when
+    ADMISSION_MAX_QUEUE requests are queued or its expected wait is over
+    ADMISSION_MAX_WAIT seconds, and when it is still queued after
+    ADMISSION_QUEUE_TIMEOUT seconds.
+    """
+    if os.getenv("ADMISSION", "1") == "0":
+        return None
+    return AdmissionController(
+        max_rows=int(os.getenv("ADMISSION_MAX_ROWS", "5000")),
+        batch_rows=int(os.getenv("ADMISSION_BATCH_ROWS", "1000")),
+        chunk_rows=int(os.getenv("ADMISSION_CHUNK_ROWS", "250")),
+        max_batches=int(os.getenv("ADMISSION_MAX_BATCHES", "1")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+        max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "5")),
+        batch_yield=float(os.getenv("ADMISSION_BATCH_YIELD", "0.25")),
+        queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30")),
+        on_shed=lambda reason: ADMISSION_SHED.labels(reason=reason).inc(),
+        on_wait=lambda lane, seconds: QUEUE_TIME.labels(lane=lane).observe(seconds),
+        on_rows=ROWS_IN_FLIGHT.set,
+    )
+
+
+def admitted_predict(X, predict_fn):
+    """predict_fn(X) under this worker's admission control; raises Rejected when shed."""
+    if admission is None:
+        return predict_fn(X)
+    return admission.predict(X, predict_fn)
+
+
+def load_served_model():
+    """Load the served model with its drift monitor and explainer, once.
+
+    MODEL_PATH points the app at a local artifact (used by the load-test
+    harness); otherwise the latest registry version is downloaded. Nothing
+    loaded here is tied to a process, so with GUNICORN_PRELOAD=1 the
+    gunicorn master calls this before forking and the workers share it
+    (see gunicorn.conf.py).
+    """
+    global model, model_version, drift_monitor, explainer, ranking, prediction_store, fingerprint
+    global surrogate, surrogate_routes, forest
+    if model is None:
+        with _model_lock:
+            if model is None:
+                model_path = os.getenv("MODEL_PATH")
+                if model_path:
+                    print(f"Loading model from: {model_path}")
+                    loaded = load_local_model(model_path)
+                    model_version = model_path
+                else:
+                    import mlflow.pyfunc
+
+                    setup_tracking()
+                    model_version = get_latest_model_version(model_name)
+                    model_uri = f'models:/{model_name}/{model_version}'
+                    print(f"Fetching model from: {model_uri}")
+                    loaded = mlflow.pyfunc.load_model(model_uri)
+                    model_version = str(model_version)
+                drift_monitor = load_drift_monitor(loaded, model_version)
+                explainer = load_explainer(loaded, model_version)
+                forest = load_adaptive(loaded)
+                surrogate_routes = {endpoint.strip() for endpoint in os.getenv("SURROGATE_ENDPOINTS", "").split(",")
+                                    if endpoint.strip()}
+                if surrogate_routes or any(os.getenv(name) for name in
+                                           ("RANKING_PATH", "PREDICTION_STORE_PATH", "ONNX_MODEL_PATH")):
+                    fingerprint = served_fingerprint(loaded)
+                    ranking = load_ranking(fingerprint, model_version)
+                    prediction_store = load_prediction_store(fingerprint, model_version)
+                    surrogate = load_surrogate(fingerprint, model_version)
+                model = loaded
+    return model
+
+
+def get_model():
+    """Return the served model, loading it on first use.
+
+    Per-process state (the model memory gauge, the shadow scorer's
+    background process, the ONNX Runtime session, admission control and
+    the prediction log's writer thread) is set up on the first call in each
+    process.
+    """
+    global shadow, onnx_model, admission, prediction_log, _process_id
+    load_served_model()
+    if _process_id != os.getpid():
+        with _model_lock:
+            if _process_id != os.getpid():
+                MODEL_MEMORY.set(model_nbytes(raw_model(model)))
+                INFERENCE_THREADS.set(forest.threads if forest is not None else 1)
+                shadow = load_shadow()
+                onnx_model = load_onnx_model(fingerprint, model_version)
+                admission = load_admission()
+                prediction_log = load_prediction_log()
+                _process_id = os.getpid()
+    return model
+
+
+def raw_model(model):
+    """The underlying sklearn estimator of an MLflow pyfunc model (or the model itself)."""
+    return getattr(getattr(model, "_model_impl", None), "sklearn_model", model)
 
 
 REQUIRED_FEATURES = [
@@ -64,6 +520,9 @@ REQUIRED_FEATURES = [
     "is_onetime_buyer",
 ]
 
+# Fields of a transaction line sent to /predict-transactions
+TRANSACTION_FIELDS = ["Invoice", "InvoiceDate", "Quantity", "Price"]
+
 
 @app.route("/", methods=["GET"])
 def home():
@@ -75,32 +534,57 @@ def home():
 
 
 @app.route("/predict-form", methods=["POST"])
+@IN_FLIGHT.labels(endpoint="/predict-form").track_inprogress()
 def predict_form():
     REQUEST_COUNT.labels(method="POST", endpoint="/predict-form").inc()
     start_time = time.time()
     try:
-        data = {
-            "unique_invoices": int(request.form["unique_invoices"]),
-            "total_quantity": int(request.form["total_quantity"]),
-            "avg_quantity_per_order": float(request.form["avg_quantity_per_order"]),
-            "unit_price_std": float(request.form["unit_price_std"]),
-            "customer_age_days": int(request.form["customer_age_days"]),
-            "days_since_last_purchase": int(request.form["days_since_last_purchase"]),
-            "average_days_between_purchase": float(request.form["average_days_between_purchase"]),
-            "is_onetime_buyer": int(request.form["is_onetime_buyer"]),
-        }
-
-        df = pd.DataFrame([data])
-        preds_log = model.predict(df)
-        prediction = float(np.expm1(preds_log)[0])
+        with phase("/predict-form", "decode"):
+            data = {
+                "unique_invoices": int(request.form["unique_invoices"]),
+                "total_quantity": int(request.form["total_quantity"]),
+                "avg_quantity_per_order": float(request.form["avg_quantity_per_order"]),
+                "unit_price_std": float(request.form["unit_price_std"]),
+                "customer_age_days": int(request.form["customer_age_days"]),
+                "days_since_last_purchase": int(request.form["days_since_last_purchase"]),
+                "average_days_between_purchase": float(request.form["average_days_between_purchase"]),
+                "is_onetime_buyer": int(request.form["is_onetime_buyer"]),
+            }
+
+            df = pd.DataFrame([data])
+        BATCH_SIZE.labels(endpoint="/predict-form").observe(1)
+
+        # Sets up this worker's state; the adaptive predictor does not go through get_model
+        get_model()
+
+        with phase("/predict-form", "predict"):
+            preds_log = admitted_predict(df[REQUIRED_FEATURES], predictor("/predict-form"))
+            prediction = float(np.expm1(preds_log)[0])
+
+        with phase("/predict-form", "drift"):
+            observe_drift(df[REQUIRED_FEATURES], preds_log)
+
+        # The candidate is compared with the forest, not with the surrogate
+        if predictor("/predict-form") is predict_log:
+            with phase("/predict-form", "shadow"):
+                submit_shadow(df[REQUIRED_FEATURES], preds_log)
+
+        with phase("/predict-form", "log"):
+            log_predictions("/predict-form", df, preds_log,
+                            "live" if predictor("/predict-form") is predict_log else "surrogate")
+
+        with phase("/predict-form", "encode"):
+            response = render_template(
+                "index.html",
+                prediction=round(prediction, 2)
+            )
 
         REQUEST_LATENCY.labels(endpoint="/predict-form").observe(time.time() - start_time)
+        return response
 
-        return render_template(
-            "index.html",
-            prediction=round(prediction, 2)
-        )
-
+    except Rejected as e:
+        REQUEST_LATENCY.labels(endpoint="/predict-form").observe(time.time() - start_time)
+        return render_template("index.html", prediction=f"Error: {e}"), e.status, {"Retry-After": str(e.retry_after)}
     except Exception as e:
         REQUEST_LATENCY.labels(endpoint="/predict-form").observe(time.time() - start_time)
         return render_template(
@@ -110,30 +594,281 @@ def predict_form():
 
 
 @app.route("/predict", methods=["POST"])
+@IN_FLIGHT.labels(endpoint="/predict").track_inprogress()
 def predict_api():
+    """Point predictions; `?quantiles=0.1,0.5,0.9` adds quantile regression forest quantiles.
+
+    Rows may carry a `customer_id` instead of features: with a prediction
+    store configured, those customers are looked up rather than scored.
+    Rows with features are always scored live.
+    """
     REQUEST_COUNT.labels(method="POST", endpoint="/predict").inc()
     start_time = time.time()
     try:
-        payload = request.get_json()
-        df = pd.DataFrame(payload)
+        with phase("/predict", "decode"):
+            payload = request.get_json()
+            df = pd.DataFrame(payload)
+
+        # Known customers sent by `customer_id` are answered from the prediction store
+        get_model()
+        stored = None
+        if prediction_store is not None and "quantiles" not in request.args:
+            with phase("/predict", "lookup"):
+                stored, has_features = lookup_stored(df)
+
+        with phase("/predict", "validate"):
+            status, unknown = 400, []
+            if stored is None:
+                live = None
+                missing = set(REQUIRED_FEATURES) - set(df.columns)
+                X = None if missing else df[REQUIRED_FEATURES]
+            else:
+                live = np.isnan(stored)
+                missing = set()
+                X = df.loc[live, REQUIRED_FEATURES] if live.any() and has_features[live].all() else None
+                if live.any() and X is None:
+                    status, unknown = 404, df.loc[live & ~has_features, "customer_id"].tolist()
+            try:
+                quantiles = parse_quantiles(request.args["quantiles"]) if "quantiles" in request.args else None
+                if unknown:
+                    error = f"Unknown customers without features: {unknown}"
+                else:
+                    error = f"Missing required features: {missing}" if missing else None
+            except ValueError as e:
+                status, quantiles, error = 400, None, f"Invalid quantiles: {e}"
+        if error:
+            REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+            return jsonify(
+                {"error": error}
+            ), status
+        BATCH_SIZE.labels(endpoint="/predict").observe(len(df))
+        n_live = 0 if X is None else len(X)
+        PREDICTION_ROWS.labels(source="store").inc(len(df) - n_live)
+        predict_fn = predictor("/predict") if quantiles is None else predict_log
+        PREDICTION_ROWS.labels(source="live" if predict_fn is predict_log else "surrogate").inc(n_live)
+
+        if stored is not None:
+            preds_log = stored
+            if X is not None:
+                with phase("/predict", "predict"):
+                    preds_log[live] = admitted_predict(X, predict_fn)
+        elif quantiles is None:
+            with phase("/predict", "predict"):
+                preds_log = admitted_predict(X, predict_fn)
+        else:
+            estimator = raw_model(get_model())
+            leaf_quantiles = getattr(estimator, "leaf_quantiles_", None)
+            if leaf_quantiles is None:
+                REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+                return jsonify({"error": "Quantiles are not available for this model"}), 501
+            # Point prediction and quantiles come from the same leaf lookup
+            with phase("/predict", "predict_quantiles"):
+                preds_log, quantiles_log = admitted_predict(
+                    X, lambda chunk: leaf_quantiles.predict(estimator, chunk, quantiles))
+        preds = np.expm1(preds_log)
+
+        if X is not None:
+            live_preds_log = preds_log if live is None else preds_log[live]
+            with phase("/predict", "drift"):
+                observe_drift(X, live_preds_log)
+
+            if predict_fn is predict_log:
+                with phase("/predict", "shadow"):
+                    submit_shadow(X, live_preds_log)
+
+        with phase("/predict", "log"):
+            log_predictions("/predict", df, preds_log, "live" if predict_fn is predict_log else "surrogate",
+                            None if live is None else ~live)
+
+        with phase("/predict", "encode"):
+            body = {"predictions": preds.tolist()}
+            if quantiles is not None:
+                body["quantiles"] = {
+                    f"{q:g}": np.expm1(column).tolist() for q, column in zip(quantiles, quantiles_log.T)
+                }
+            response = jsonify(body)
+
+        REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+        return response
 
-        missing = set(REQUIRED_FEATURES) - set(df.columns)
+    except Rejected as e:
+        REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/predict-transactions", methods=["POST"])
+@IN_FLIGHT.labels(endpoint="/predict-transactions").track_inprogress()
+def predict_transactions_api():
+    """Prediction for one customer from their raw transaction lines.
+
+    The body is {"transactions": [{"Invoice", "InvoiceDate", "Quantity",
+    "Price"}, ...], "as_of": date, "customer_id": optional}; as_of defaults
+    to the last InvoiceDate. The features are computed as feature
+    engineering does (cancelled invoices and lines after as_of are left
+    out) and returned with the prediction.
+    """
+    endpoint = "/predict-transactions"
+    REQUEST_COUNT.labels(method="POST", endpoint=endpoint).inc()
+    start_time = time.time()
+    try:
+        with phase(endpoint, "decode"):
+            payload = request.get_json()
+
+        with phase(endpoint, "features"):
+            try:
+                if not isinstance(payload, dict):
+                    raise ValueError("The body must be a JSON object")
+                lines = payload.get("transactions") or []
+                if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+                    raise ValueError("transactions must be a list of objects")
+                missing = {field for line in lines for field in TRANSACTION_FIELDS if field not in line}
+                if not lines or missing:
+                    raise ValueError(f"Missing transaction fields: {missing}" if missing else "No transactions")
+                for field in ("Quantity", "Price"):
+                    if not all(isinstance(line[field], (int, float)) and not isinstance(line[field], bool)
+                               for line in lines):
+                        raise ValueError(f"{field} must be a number")
+                dates = np.array([line["InvoiceDate"] for line in lines], dtype="datetime64[ns]")
+                as_of = pd.Timestamp(payload["as_of"]) if payload.get("as_of") else pd.Timestamp(dates.max())
+                features = customer_features([line["Invoice"] for line in lines], dates,
+                                             [line["Quantity"] for line in lines],
+                                             [line["Price"] for line in lines], as_of)
+                error = None
+            except ValueError as e:
+                error = str(e)
+        if error:
+            REQUEST_LATENCY.labels(endpoint=endpoint).observe(time.time() - start_time)
+            return jsonify({"error": error}), 400
+        X = pd.DataFrame([features], columns=REQUIRED_FEATURES)
+        BATCH_SIZE.labels(endpoint=endpoint).observe(1)
+
+        get_model()
+        predict_fn = predictor(endpoint)
+        PREDICTION_ROWS.labels(source="live" if predict_fn is predict_log else "surrogate").inc()
+        with phase(endpoint, "predict"):
+            preds_log = admitted_predict(X, predict_fn)
+
+        with phase(endpoint, "drift"):
+            observe_drift(X, preds_log)
+
+        if predict_fn is predict_log:
+            with phase(endpoint, "shadow"):
+                submit_shadow(X, preds_log)
+
+        with phase(endpoint, "log"):
+            logged = X.assign(customer_id=payload["customer_id"]) if payload.get("customer_id") else X
+            log_predictions(endpoint, logged, preds_log, "live" if predict_fn is predict_log else "surrogate")
+
+        with phase(endpoint, "encode"):
+            response = jsonify({
+                "prediction": float(np.expm1(preds_log)[0]),
+                "as_of": as_of.isoformat(),
+                "features": features,
+            })
+
+        REQUEST_LATENCY.labels(endpoint=endpoint).observe(time.time() - start_time)
+        return response
+
+    except Rejected as e:
+        REQUEST_LATENCY.labels(endpoint=endpoint).observe(time.time() - start_time)
+        return jsonify({"error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+    except Exception as e:
+        REQUEST_LATENCY.labels(endpoint=endpoint).observe(time.time() - start_time)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/explain", methods=["POST"])
+@IN_FLIGHT.labels(endpoint="/explain").track_inprogress()
+def explain_api():
+    """Per-feature TreeSHAP contributions on the model's log1p scale.
+
+    For every row, expected_value + sum(contributions) is the log-scale
+    prediction, and expm1 of it the CLV returned by /predict.
+    """
+    REQUEST_COUNT.labels(method="POST", endpoint="/explain").inc()
+    start_time = time.time()
+    try:
+        with phase("/explain", "decode"):
+            payload = request.get_json()
+            df = pd.DataFrame(payload)
+
+        with phase("/explain", "validate"):
+            missing = set(REQUIRED_FEATURES) - set(df.columns)
+            X = None if missing else df[REQUIRED_FEATURES]
         if missing:
-            REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+            REQUEST_LATENCY.labels(endpoint="/explain").observe(time.time() - start_time)
             return jsonify(
                 {"error": f"Missing required features: {missing}"}
             ), 400
 
-        X = df[REQUIRED_FEATURES]
-        preds_log = model.predict(X)
-        preds = np.expm1(preds_log)
+        get_model()
+        if explainer is None:
+            REQUEST_LATENCY.labels(endpoint="/explain").observe(time.time() - start_time)
+            return jsonify({"error": "Explanations are not available for this model"}), 501
+        BATCH_SIZE.labels(endpoint="/explain").observe(len(X))
 
-        REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+        with phase("/explain", "explain"):
+            contributions = explainer.explain(X)
+            preds_log = explainer.expected_value + contributions.sum(axis=1)
 
-        return jsonify({"predictions": preds.tolist()})
+        with phase("/explain", "encode"):
+            response = jsonify({
+                "model_version": explainer.version,
+                "expected_value": explainer.expected_value,
+                "contributions": [dict(zip(REQUIRED_FEATURES, row)) for row in contributions.tolist()],
+                "predictions": np.expm1(preds_log).tolist(),
+            })
+
+        REQUEST_LATENCY.labels(endpoint="/explain").observe(time.time() - start_time)
+        return response
 
     except Exception as e:
-        REQUEST_LATENCY.labels(endpoint="/predict").observe(time.time() - start_time)
+        REQUEST_LATENCY.labels(endpoint="/explain").observe(time.time() - start_time)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/top-customers", methods=["GET"])
+def top_customers():
+    """Customers with the highest predicted CLV from the precomputed ranking.
+
+    `?k=10&offset=0` pages through the ranking; `is_onetime_buyer=0|1` and
+    `tenure=<bucket>` (e.g. 365-730d) filter it.
+    """
+    from src.serving.ranking import SEGMENTS
+
+    REQUEST_COUNT.labels(method="GET", endpoint="/top-customers").inc()
+    start_time = time.time()
+    try:
+        get_model()
+        if ranking is None:
+            REQUEST_LATENCY.labels(endpoint="/top-customers").observe(time.time() - start_time)
+            return jsonify({"error": "No customer ranking for the served model version"}), 501
+
+        with phase("/top-customers", "query"):
+            try:
+                k = int(request.args.get("k", "10"))
+                offset = int(request.args.get("offset", "0"))
+                filters = {name: request.args[name] for name in SEGMENTS if name in request.args}
+                customers, total = ranking.top(k, offset, filters)
+            except ValueError as e:
+                REQUEST_LATENCY.labels(endpoint="/top-customers").observe(time.time() - start_time)
+                return jsonify({"error": str(e)}), 400
+
+        with phase("/top-customers", "encode"):
+            body = {"model_version": model_version, "total": total, "offset": offset, "k": k,
+                    "customers": customers}
+            if offset + k < total:
+                body["next_offset"] = offset + k
+            response = jsonify(body)
+
+        REQUEST_LATENCY.labels(endpoint="/top-customers").observe(time.time() - start_time)
+        return response
+
+    except Exception as e:
+        REQUEST_LATENCY.labels(endpoint="/top-customers").observe(time.time() - start_time)
         return jsonify({"error": str(e)}), 500
 
 
@@ -145,8 +880,10 @@ def health():
 def metrics():
     """Expose Prometheus metrics."""
     REQUEST_COUNT.labels(method="GET", endpoint="/metrics").inc()
-    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    body, content_type = generate_metrics()
+    return body, 200, {"Content-Type": content_type}
 
 
 if __name__ == "__main__":
+    get_model()
     app.run(host="0.0.0.0", port=5000, debug=False)
\ No newline at end of file
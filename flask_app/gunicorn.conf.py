@@ -0,0 +1,61 @@
+import gc
+import os
+import shutil
+
+bind = "0.0.0.0:5000"
+timeout = 120
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+# Inference threads per worker are the CPUs divided by this (src/serving/inference.py)
+os.environ["GUNICORN_WORKERS"] = str(workers)
+# Threads per worker (gthread). Requests in one worker share the model and
+# its admission control (src/serving/admission.py), which caps the rows
+# predicted at once and lets small requests overtake batch chunks.
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# GUNICORN_PRELOAD=1 imports the app and loads the model once in the master.
+# Workers are forked afterwards and share the model's memory copy-on-write
+# instead of each unpickling its own forest (benchmarks/memory_report.py
+# compares RSS/PSS per worker).
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+# Each worker writes its Prometheus samples here and /metrics aggregates them
+# (see src/serving/metrics.py). Must be set before the app is imported.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def reset_multiproc_dir():
+    # Stale files from a previous run would be summed into the new counters
+    multiproc_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+
+# A preloaded app creates its metric files on import, before on_starting runs
+if preload_app:
+    reset_multiproc_dir()
+
+
+def on_starting(server):
+    if not preload_app:
+        reset_multiproc_dir()
+
+
+def when_ready(server):
+    # Runs in the master before the first worker is forked
+    if not preload_app:
+        return
+    import app
+    try:
+        app.load_served_model()
+    except Exception as e:
+        server.log.warning("Model not preloaded, workers will load it on first request: %s", e)
+    # Move everything allocated so far into the permanent generation. The
+    # workers' collections then never write to those objects' headers, which
+    # would copy the shared pages into every worker.
+    gc.collect()
+    gc.freeze()
+
+
+def child_exit(server, worker):
+    from src.serving.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
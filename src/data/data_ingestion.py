@@ -1,8 +1,9 @@
 import pandas as pd
 import os
 import logging
-from src.logger import logging
+from src.logger import logging, configure_logger
 from src.utils import load_params, load_data
+from src.perf import stage, save_stage
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parents[2]  # repo root
@@ -24,13 +25,16 @@ def main():
     try:
         # params = load_params('params.yaml')
 
-        df = load_data(DATA_PATH)
+        with stage('data_ingestion'):
+            df = load_data(DATA_PATH)
 
 
-        save_data(df,'./data')
+            save_data(df,'./data')
+        save_stage('data_ingestion')
     except Exception as e:
         logging.error("Failed to do the data ingestion: %s",e)
         raise
 
 if __name__ == '__main__':
+    configure_logger()
     main()
\ No newline at end of file
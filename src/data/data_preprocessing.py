@@ -1,7 +1,8 @@
 import numpy as np
 import pandas as pd
 import os
-from src.logger import logging
+from src.logger import logging, configure_logger
+from src.perf import stage, track, save_stage
 
 def preprocessing(df: pd.DataFrame) -> pd.DataFrame:
     '''data preprocessing'''
@@ -18,23 +19,31 @@ def preprocessing(df: pd.DataFrame) -> pd.DataFrame:
         logging.error("Error while doing preprocessing: %s",e)
         raise
 
-def main():
-    try:
-        df = pd.read_csv('./data/raw/data.csv')
-        logging.info("Data loaded properly")
-        df = preprocessing(df)
-        logging.info("preprocessing completed")
+def save_data(df: pd.DataFrame, data_path: str) -> None:
+    '''Save the preprocessed data'''
+    interim_data_path = os.path.join(data_path, 'interim')
+    os.makedirs(interim_data_path, exist_ok=True)
+
+    df.to_csv(os.path.join(interim_data_path,'data.csv'),index=False)
 
+    logging.info("Processed data saved into: %s",interim_data_path)
 
-        data_path = os.path.join('./data','interim')
-        os.makedirs(data_path, exist_ok=True)
+def main():
+    try:
+        with stage('data_preprocessing'):
+            with track('csv_load'):
+                df = pd.read_csv('./data/raw/data.csv')
+            logging.info("Data loaded properly")
+            df = preprocessing(df)
+            logging.info("preprocessing completed")
 
-        df.to_csv(os.path.join(data_path,'data.csv'),index=False)
 
-        logging.info("Processed data saved into: %s",data_path)
+            save_data(df, './data')
+        save_stage('data_preprocessing')
     except Exception as e:
         logging.error("Error occured in data_preprocessing: %s",e)
         raise
 
 if __name__ == '__main__':
+    configure_logger()
     main()
\ No newline at end of file
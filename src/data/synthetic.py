@@ -0,0 +1,139 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from src.logger import logging, configure_logger
+
+COLUMNS = ['Invoice', 'StockCode', 'Description', 'Quantity', 'InvoiceDate', 'Price', 'Customer ID', 'Country']
+COUNTRIES = np.array(['United Kingdom', 'EIRE', 'Germany', 'France', 'Netherlands', 'Spain',
+                      'Switzerland', 'Belgium', 'Portugal', 'Australia'])
+COUNTRY_WEIGHTS = np.array([0.90, 0.02, 0.02, 0.015, 0.01, 0.008, 0.007, 0.007, 0.006, 0.007])
+
+START_DATE = pd.Timestamp('2009-12-01 07:45:00')
+END_DATE = pd.Timestamp('2011-12-09 12:50:00')
+LINES_PER_INVOICE = 20
+ROWS_PER_CUSTOMER = 170
+
+
+def _catalog(rng: np.random.Generator, n_products: int) -> tuple:
+    """Product codes, descriptions and unit prices (lognormal, 2 decimals)."""
+    codes = np.array([f"{20000 + i}" for i in range(n_products)], dtype=object)
+    descriptions = np.array([f"PRODUCT {i}" for i in range(n_products)], dtype=object)
+    prices = np.round(rng.lognormal(mean=0.9, sigma=0.8, size=n_products), 2).clip(0.01)
+    # Zipf-like popularity: a few products make up most of the lines
+    popularity = 1.0 / np.arange(1, n_products + 1) ** 0.9
+    return codes, descriptions, prices, popularity / popularity.sum()
+
+
+def _customers(rng: np.random.Generator, n_customers: int) -> tuple:
+    """Customer ids, activity weights and active windows (in days since START_DATE)."""
+    span_days = (END_DATE - START_DATE).days
+    ids = 12346.0 + rng.permutation(n_customers).astype(float)
+    # Heavy-tailed purchase frequency: most customers buy once or twice,
+    # a small wholesale tail places hundreds of orders.
+    activity = rng.pareto(1.8, size=n_customers) + 0.05
+    start = rng.uniform(-0.3 * span_days, span_days, size=n_customers).clip(0)
+    lifetime = rng.exponential(scale=1.5 * span_days, size=n_customers)
+    return ids, activity, start, start + lifetime
+
+
+def generate_chunks(n_rows: int, seed: int = 42, chunk_rows: int = 1_000_000,
+                    null_customer_rate: float = 0.22, cancel_rate: float = 0.02,
+                    n_customers: int = None, n_products: int = 4000):
+    """Yield Online-Retail-shaped transaction frames totalling about `n_rows` rows.
+
+    Chunks cover consecutive time slices, so invoices stay in date order and
+    invoice numbers keep increasing across chunks. The output only depends on
+    `seed`, `n_rows` and `chunk_rows`.
+    """
+    rng = np.random.default_rng(seed)
+    n_customers = n_customers or max(100, n_rows // ROWS_PER_CUSTOMER)
+    codes, descriptions, prices, popularity = _catalog(rng, n_products)
+    customer_ids, activity, active_from, active_to = _customers(rng, n_customers)
+
+    span_seconds = (END_DATE - START_DATE).total_seconds()
+    n_chunks = max(1, -(-n_rows // chunk_rows))
+    next_invoice = 489434
+
+    for chunk in range(n_chunks):
+        chunk_rng = np.random.default_rng([seed, chunk])
+        rows = min(chunk_rows, n_rows - chunk * chunk_rows)
+        n_invoices = max(1, rows // LINES_PER_INVOICE)
+
+        # Invoice level: date, customer, cancellation flag
+        lo, hi = chunk / n_chunks, (chunk + 1) / n_chunks
+        seconds = np.sort(chunk_rng.uniform(lo, hi, size=n_invoices)) * span_seconds
+
+        mid_day = (lo + hi) / 2 * span_seconds / 86400
+        weights = activity * ((active_from <= mid_day) & (active_to >= mid_day))
+        if weights.sum() == 0:
+            weights = activity
+        invoice_customer = customer_ids[chunk_rng.choice(n_customers, size=n_invoices, p=weights / weights.sum())]
+        invoice_customer[chunk_rng.random(n_invoices) < null_customer_rate] = np.nan
+        cancelled = chunk_rng.random(n_invoices) < cancel_rate
+        country = COUNTRIES[chunk_rng.choice(len(COUNTRIES), size=n_invoices, p=COUNTRY_WEIGHTS)]
+
+        # Line level: lines per invoice drawn so the chunk has exactly `rows` lines
+        lines = chunk_rng.multinomial(rows - n_invoices, np.full(n_invoices, 1 / n_invoices)) + 1
+        invoice_idx = np.repeat(np.arange(n_invoices), lines)
+        product = chunk_rng.choice(n_products, size=rows, p=popularity)
+        quantity = np.ceil(chunk_rng.lognormal(mean=1.3, sigma=1.1, size=rows)).astype(np.int64)
+        quantity[cancelled[invoice_idx]] *= -1
+
+        invoice_numbers = (next_invoice + np.arange(n_invoices)).astype(str).astype(object)
+        invoice_numbers[cancelled] = 'C' + invoice_numbers[cancelled]
+        next_invoice += n_invoices
+
+        yield pd.DataFrame({
+            'Invoice': invoice_numbers[invoice_idx],
+            'StockCode': codes[product],
+            'Description': descriptions[product],
+            'Quantity': quantity,
+            'InvoiceDate': (START_DATE + pd.to_timedelta(np.floor(seconds / 60) * 60, unit='s'))[invoice_idx],
+            'Price': prices[product],
+            'Customer ID': invoice_customer[invoice_idx],
+            'Country': country[invoice_idx],
+        }, columns=COLUMNS)
+
+
+def generate_transactions(n_rows: int, seed: int = 42, **kwargs) -> pd.DataFrame:
+    """Generate a synthetic transaction table in memory."""
+    return pd.concat(generate_chunks(n_rows, seed, **kwargs), ignore_index=True)
+
+
+def write_transactions(file_path: str, n_rows: int, seed: int = 42, **kwargs) -> str:
+    """Stream a synthetic transaction table to a .parquet or .csv file chunk by chunk."""
+    try:
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        if file_path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            writer = None
+            for df in generate_chunks(n_rows, seed, **kwargs):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                writer = writer or pq.ParquetWriter(file_path, table.schema)
+                writer.write_table(table)
+            writer.close()
+        else:
+            for i, df in enumerate(generate_chunks(n_rows, seed, **kwargs)):
+                df.to_csv(file_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        logging.info('Synthetic data with %d rows saved to %s', n_rows, file_path)
+        return file_path
+    except Exception as e:
+        logging.error('Failed to write synthetic data: %s', e)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Online-Retail-shaped synthetic transactions.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    parser.add_argument('--out', default='data/synthetic/transactions.parquet')
+    args = parser.parse_args()
+    write_transactions(args.out, args.rows, args.seed, chunk_rows=args.chunk_rows)
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
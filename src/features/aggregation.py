@@ -0,0 +1,352 @@
+"""NumPy aggregation backend for the customer features in build_features.
+
+`Customer ID` is factorized once (sorted, like groupby) and every feature
+is computed from the integer codes with `bincount` and `ufunc.at`, so the
+rows never have to be sorted: min/max date, integer quantity sums/means
+(exact while the sums stay below 2**53), and distinct invoices from the
+unique (invoice, customer) code pairs.
+
+Two results have to match pandas bit for bit although pandas computes
+them with sequential per-group loops:
+
+* `unit_price_std` (Welford's update in pandas) is only used rounded to two
+  decimals. A vectorized two-pass std is within a few ulps of Welford, so
+  it rounds the same except when it lies next to a rounding boundary;
+  those few groups are recomputed with Welford's update in Python floats.
+* The target sum (Kahan summation in pandas) is used unrounded. It is
+  reproduced exactly by sorting the rows by customer and stepping through
+  position-in-group: step k applies the Kahan update to element k of every
+  group that still has one, as a single vectorized operation. Once only a
+  few large groups remain, their rest is finished in Python floats, which
+  round exactly like the Cython loop.
+"""
+import numpy as np
+import pandas as pd
+
+# Below this many active groups a Python loop beats a vectorized step
+TAIL_GROUPS = 32
+
+EXACT_INT = 2 ** 53
+EPS = np.finfo(float).eps
+
+
+class GroupLayout:
+    """Rows sorted by group plus the position-in-group schedule for sequential kernels."""
+
+    def __init__(self, codes: np.ndarray, n_groups: int):
+        # Stable argsort is a radix sort for 16-bit keys, timsort otherwise
+        key = codes.astype(np.uint16) if n_groups <= np.iinfo(np.uint16).max else codes
+        self.order = np.argsort(key, kind="stable")
+        self.sizes = np.bincount(codes, minlength=n_groups)
+        self.starts = np.concatenate([[0], np.cumsum(self.sizes)[:-1]]).astype(np.int64)
+        self.n_groups = n_groups
+
+        # Groups ranked by size (largest first) so the groups still active at
+        # step k are always a prefix of the ranking
+        self.ranked = np.argsort(-self.sizes, kind="stable")
+        ranked_sizes = self.sizes[self.ranked]
+        max_size = ranked_sizes[0] if n_groups else 0
+        self.active = np.searchsorted(-ranked_sizes, -np.arange(max_size), side="left")
+        self.n_steps = int(np.searchsorted(-self.active, -TAIL_GROUPS, side="left"))
+        self.tail = self.ranked[:self.active[self.n_steps]] if self.n_steps < max_size else self.ranked[:0]
+
+        # Row index for the vectorized steps: for step k, element k of each
+        # active group, in ranking order, as one contiguous block
+        counts = self.active[:self.n_steps]
+        self.block_starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        step = np.repeat(np.arange(self.n_steps), counts)
+        rank = np.arange(self.block_starts[-1]) - self.block_starts[step]
+        self.schedule = self.order[self.starts[self.ranked][rank] + step]
+
+    def steps(self, values: np.ndarray):
+        """Yield (n_active, block) for the vectorized steps."""
+        scheduled = values[self.schedule]
+        for k in range(self.n_steps):
+            yield self.active[k], scheduled[self.block_starts[k]:self.block_starts[k + 1]]
+
+    def tail_values(self, values: np.ndarray):
+        """Yield (rank, remaining values) for the groups finished in Python."""
+        for rank, group in enumerate(self.tail):
+            start = self.starts[group]
+            yield rank, values[self.order[start + self.n_steps:start + self.sizes[group]]].tolist()
+
+    def unrank(self, ranked_values: np.ndarray) -> np.ndarray:
+        out = np.empty_like(ranked_values)
+        out[self.ranked] = ranked_values
+        return out
+
+
+def kahan_sum(codes: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    """Per-group float sum, identical to pandas' Kahan-compensated group_sum."""
+    layout = GroupLayout(codes, n_groups)
+    total = np.zeros(n_groups)
+    compensation = np.zeros(n_groups)
+    with np.errstate(invalid="ignore"):
+        for n, block in layout.steps(values):
+            y = block - compensation[:n]
+            t = total[:n] + y
+            compensation[:n] = t - total[:n] - y
+            # An infinite value makes the compensation NaN; pandas resets it to 0
+            compensation[:n][compensation[:n] != compensation[:n]] = 0
+            total[:n] = t
+
+    for rank, rest in layout.tail_values(values):
+        s, c = float(total[rank]), float(compensation[rank])
+        for value in rest:
+            y = value - c
+            t = s + y
+            c = t - s - y
+            if c != c:
+                c = 0.0
+            s = t
+        total[rank] = s
+    return layout.unrank(total)
+
+
+def welford_std(values: list) -> float:
+    """Sample std of one group, with the exact operation order of pandas' group_var."""
+    mean = m2 = 0.0
+    nobs = 0
+    for value in values:
+        nobs += 1
+        old_mean = mean
+        mean += (value - old_mean) / nobs
+        m2 += (value - mean) * (value - old_mean)
+    return np.sqrt(m2 / (nobs - 1)) if nobs > 1 else np.nan
+
+
+def _valid(codes: np.ndarray, values: np.ndarray) -> tuple:
+    """Drop NaN values, which groupby skips."""
+    if values.dtype.kind == "f":
+        valid = ~np.isnan(values)
+        if not valid.all():
+            return codes[valid], values[valid]
+    return codes, values
+
+
+def _is_exact_int(values: np.ndarray) -> bool:
+    return values.dtype.kind in "iub" and np.abs(values).sum() < EXACT_INT
+
+
+def _group_sum(codes: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    """Per-group sum ignoring NaN, as groupby().sum() computes it."""
+    if _is_exact_int(values):
+        # Every partial sum is an exactly representable integer
+        return np.bincount(codes, weights=values, minlength=n_groups).astype(np.int64)
+    if values.dtype.kind in "iub":
+        # Wrap around on overflow like pandas does
+        sums = np.zeros(n_groups, dtype=np.int64)
+        np.add.at(sums, codes, values.astype(np.int64))
+        return sums
+    codes, values = _valid(codes, values)
+    return kahan_sum(codes, n_groups, values)
+
+
+def _group_mean(codes: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    """Per-group mean of float values ignoring NaN; pandas Kahan-sums, then divides."""
+    codes, values = _valid(codes, values.astype(float))
+    return kahan_sum(codes, n_groups, values) / np.bincount(codes, minlength=n_groups)
+
+
+def _group_std_rounded(codes: np.ndarray, n_groups: int, values: np.ndarray, decimals: int) -> np.ndarray:
+    """Per-group sample std rounded to `decimals`, equal to pandas' rounded std."""
+    codes, values = _valid(codes, values.astype(float))
+    sizes = np.bincount(codes, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(codes, weights=values, minlength=n_groups) / sizes
+        m2 = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=n_groups)
+        std = np.sqrt(m2 / (sizes - 1))
+        std[sizes < 2] = np.nan
+
+        # Both algorithms have a relative error of order n * eps * condition
+        # number; a std whose scaled fraction is not within that distance of
+        # .5 rounds identically either way. A zero std (condition number inf)
+        # is always recomputed.
+        condition = 1 + np.abs(mean) / std
+        scaled = std * 10 ** decimals
+        ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) <= 8 * sizes * EPS * condition * (scaled + 1)
+
+    flagged = np.flatnonzero(ambiguous)
+    if flagged.size:
+        marked = np.zeros(n_groups, dtype=bool)
+        marked[flagged] = True
+        rows = np.flatnonzero(marked[codes])
+        rows = rows[np.argsort(codes[rows], kind="stable")]
+        bounds = np.cumsum(sizes[flagged])[:-1]
+        for group, group_rows in zip(flagged, np.split(rows, bounds)):
+            std[group] = welford_std(values[group_rows].tolist())
+    return np.round(std, decimals)
+
+
+def _group_dates(codes: np.ndarray, n_groups: int, dates: np.ndarray) -> tuple:
+    """Per-group min and max of datetime64[ns] values, skipping NaT."""
+    nat = np.iinfo(np.int64).min
+    values = dates.view(np.int64)
+    first = np.full(n_groups, np.iinfo(np.int64).max)
+    last = np.full(n_groups, nat)
+    np.minimum.at(first, codes, np.where(values == nat, np.iinfo(np.int64).max, values))
+    np.maximum.at(last, codes, values)
+    first[first == np.iinfo(np.int64).max] = nat
+    return first.view("datetime64[ns]"), last.view("datetime64[ns]")
+
+
+def _customer_features(codes: np.ndarray, n_groups: int, dates: np.ndarray, invoice_codes: np.ndarray,
+                       quantity: np.ndarray, price: np.ndarray, decimals: int) -> tuple:
+    """Feature columns for every customer code and the mask of codes that have rows."""
+    sizes = np.bincount(codes, minlength=n_groups)
+    first, last = _group_dates(codes, n_groups, dates)
+
+    # Distinct (invoice, customer) pairs, counted per customer
+    has_invoice = invoice_codes >= 0
+    pairs = pd.unique(invoice_codes[has_invoice].astype(np.int64) * n_groups + codes[has_invoice])
+    unique_invoices = np.bincount(pairs % n_groups, minlength=n_groups)
+
+    total_quantity = _group_sum(codes, n_groups, quantity)
+    if _is_exact_int(quantity):
+        # pandas Kahan-sums the float64 values, which is the exact integer sum here
+        with np.errstate(invalid="ignore"):
+            avg_quantity = total_quantity / sizes
+    else:
+        avg_quantity = _group_mean(codes, n_groups, quantity)
+
+    columns = {
+        "first_purchase_date": first,
+        "last_purchase_date": last,
+        "unique_invoices": unique_invoices,
+        "total_quantity": total_quantity,
+        "avg_quantity_per_order": avg_quantity,
+        "unit_price_std": _group_std_rounded(codes, n_groups, price, decimals),
+    }
+    return columns, sizes > 0
+
+
+def _frame(columns: dict, uniques, present: np.ndarray, decimals: int) -> pd.DataFrame:
+    index = pd.Index(uniques[present], name="Customer ID")
+    return pd.DataFrame({name: values[present] for name, values in columns.items()}, index=index).round(decimals)
+
+
+def aggregate_customers(df: pd.DataFrame, decimals: int = 2) -> pd.DataFrame:
+    """Same frame as the groupby("Customer ID").agg(...).round(decimals) in build_features."""
+    codes, uniques = pd.factorize(df["Customer ID"], sort=True)
+    invoice_codes, _ = pd.factorize(df["Invoice"])
+    rows = codes >= 0
+    columns, present = _customer_features(
+        codes[rows], len(uniques), df["InvoiceDate"].to_numpy(dtype="datetime64[ns]")[rows],
+        invoice_codes[rows], df["Quantity"].to_numpy()[rows], df["Price"].to_numpy()[rows], decimals)
+    return _frame(columns, uniques, present, decimals)
+
+
+def customer_sum(df: pd.DataFrame, column: str) -> pd.Series:
+    """Same as df.groupby("Customer ID")[column].sum()."""
+    codes, uniques = pd.factorize(df["Customer ID"], sort=True)
+    rows = codes >= 0
+    return pd.Series(_group_sum(codes[rows], len(uniques), df[column].to_numpy()[rows]),
+                     index=pd.Index(uniques, name="Customer ID"), name=column)
+
+
+def window_aggregates(df: pd.DataFrame, cutoff_date, decimals: int = 2, end_date=None) -> tuple:
+    """Customer features for rows up to `cutoff_date` and the "Total Amount"
+    sum of the rows after it (up to `end_date`, if given), as build_features
+    computes them with groupby.
+
+    Customer ID and Invoice are factorized once for both windows, and the
+    windows are boolean masks over the column arrays instead of DataFrame
+    copies (which would copy every object column as well).
+    """
+    codes, uniques = pd.factorize(df["Customer ID"], sort=True)
+    invoice_codes, _ = pd.factorize(df["Invoice"])
+    n_groups = len(uniques)
+    dates = df["InvoiceDate"].to_numpy(dtype="datetime64[ns]")
+    cutoff = np.datetime64(pd.Timestamp(cutoff_date), "ns")
+
+    # NaT compares False on both sides, as in the DataFrame filters
+    in_features = np.flatnonzero((dates <= cutoff) & (codes >= 0))
+    after = dates > cutoff
+    if end_date is not None:
+        after &= dates <= np.datetime64(pd.Timestamp(end_date), "ns")
+    in_target = np.flatnonzero(after & (codes >= 0))
+
+    columns, present = _customer_features(
+        codes[in_features], n_groups, dates[in_features], invoice_codes[in_features],
+        df["Quantity"].to_numpy()[in_features], df["Price"].to_numpy()[in_features], decimals)
+    customer_features = _frame(columns, uniques, present, decimals)
+
+    target_codes = codes[in_target]
+    target = _group_sum(target_codes, n_groups, df["Total Amount"].to_numpy()[in_target])
+    has_target = np.bincount(target_codes, minlength=n_groups) > 0
+    clv = pd.Series(target[has_target], index=pd.Index(uniques[has_target], name="Customer ID"),
+                    name="Total Amount")
+    return customer_features, clv
+
+
+def derive_features(first: np.ndarray, last: np.ndarray, unique_invoices: np.ndarray,
+                    unit_price_std: np.ndarray, cutoff_date) -> dict:
+    """The date-based features and ratios of build_features, from per-customer aggregates."""
+    cutoff = np.datetime64(pd.Timestamp(cutoff_date), "ns")
+    day = np.timedelta64(1, "D")
+    # Floor division, like Timedelta.days
+    customer_age_days = (cutoff - first) // day
+    return {
+        "customer_age_days": customer_age_days,
+        "days_since_last_purchase": (cutoff - last) // day,
+        "average_days_between_purchase": customer_age_days / unique_invoices,
+        "is_onetime_buyer": (unique_invoices == 1).astype(int),
+        "unit_price_std": np.where(np.isnan(unit_price_std), 0.0, unit_price_std),
+    }
+
+
+def _std_rounded(values: np.ndarray, decimals: int) -> float:
+    """_group_std_rounded for a single group."""
+    values = values[~np.isnan(values)]
+    n = len(values)
+    if n < 2:
+        return np.nan
+    mean = values.sum() / n
+    std = np.sqrt(((values - mean) ** 2).sum() / (n - 1))
+    scaled = std * 10 ** decimals
+    if std == 0 or abs(scaled - np.floor(scaled) - 0.5) <= 8 * n * EPS * (1 + abs(mean) / std) * (scaled + 1):
+        std = welford_std(values.tolist())
+    return np.round(std, decimals)
+
+
+def customer_features(invoices, dates, quantity, price, as_of, decimals: int = 2) -> dict:
+    """Features of one customer's raw transaction lines as of `as_of`.
+
+    The same values as the customer's row of build_snapshot(preprocessing(lines), as_of=as_of):
+    cancelled invoices are dropped, the lines after `as_of` are ignored and
+    the rest is aggregated like the kernels above do for one group.
+    Raises ValueError when no purchase is left.
+    """
+    invoices = np.asarray(invoices, dtype=object)
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    keep = dates <= np.datetime64(pd.Timestamp(as_of), "ns")
+    # Lines share invoices, so only the distinct ones are checked for cancellations
+    cancelled = [invoice for invoice in set(invoices.tolist()) if str(invoice).startswith("C")]
+    if cancelled:
+        keep &= ~np.isin(invoices, cancelled)
+    n = int(keep.sum())
+    if n == 0:
+        raise ValueError(f"No purchases up to {as_of}")
+    dates, quantity = dates[keep], np.asarray(quantity)[keep]
+
+    unique_invoices = len(set(invoices[keep].tolist()))
+    if _is_exact_int(quantity):
+        total_quantity = int(quantity.sum())
+        avg_quantity = total_quantity / n
+    else:
+        codes = np.zeros(n, dtype=np.intp)
+        total_quantity = np.round(_group_sum(codes, 1, quantity)[0], decimals)
+        avg_quantity = _group_mean(codes, 1, quantity)[0]
+
+    derived = derive_features(dates.min(keepdims=True), dates.max(keepdims=True), np.array([unique_invoices]),
+                              np.array([_std_rounded(np.asarray(price, dtype=float)[keep], decimals)]), as_of)
+    features = {
+        "unique_invoices": unique_invoices,
+        "total_quantity": total_quantity,
+        "avg_quantity_per_order": np.round(avg_quantity, decimals),
+        **{name: values[0] for name, values in derived.items()},
+    }
+    order = ("unique_invoices", "total_quantity", "avg_quantity_per_order", "unit_price_std", "customer_age_days",
+             "days_since_last_purchase", "average_days_between_purchase", "is_onetime_buyer")
+    return {name: features[name].item() if isinstance(features[name], np.generic) else features[name]
+            for name in order}
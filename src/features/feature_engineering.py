@@ -1,30 +1,79 @@
+import json
 import pandas as pd
 import numpy as np
 from datetime import timedelta
-from src.logger import logging
+from src.logger import logging, configure_logger
 import os
-from src.utils import load_data, load_params
-from sklearn.model_selection import train_test_split
+from src.utils import load_data, load_params, matrix_paths
+from src.perf import stage, track, save_stage
+from src.serving.drift import REFERENCE_PATH, build_profile, save_profile
 
 
 
-def build_features(df: pd.DataFrame) -> pd.DataFrame:
+def derived_features(customer_features: pd.DataFrame, cutoff_date) -> pd.DataFrame:
+    """Add the date-based features and ratios to the per-customer aggregates, in place.
+
+    The formulas live in src.features.aggregation.derive_features, which the
+    app's single-customer path (customer_features) uses as well.
     """
-    Build customer-level features for CLV modeling using
-    a rolling 90-day cutoff window.
+    from src.features.aggregation import derive_features
+
+    derived = derive_features(
+        customer_features["first_purchase_date"].to_numpy(dtype="datetime64[ns]"),
+        customer_features["last_purchase_date"].to_numpy(dtype="datetime64[ns]"),
+        customer_features["unique_invoices"].to_numpy(),
+        customer_features["unit_price_std"].to_numpy(dtype=float),
+        cutoff_date,
+    )
+    for name, values in derived.items():
+        customer_features[name] = values
+    return customer_features
+
+
+def customer_table(customer_features: pd.DataFrame, clv_totals: pd.Series, cutoff_date) -> pd.DataFrame:
+    """
+    Turn the per-customer aggregates (indexed by Customer ID) and the
+    target-window spend into the final feature table.
     """
+    customer_features = derived_features(customer_features, cutoff_date)
 
-    try:
-        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-        cutoff_date = df["InvoiceDate"].max() - timedelta(days=90)
+    #caluclate target clv
+    clv_data = clv_totals.reset_index()
+    clv_data.columns = ['Customer ID', 'target_clv']
 
-        logging.info("Using cutoff date: %s", cutoff_date.date())
+    #Merge caluclated clv to customer features
+    customer_data = customer_features.reset_index().merge(clv_data,on='Customer ID',how='inner')
+
+    #Log transform target clv
+    customer_data['target_clv'] = np.log1p(customer_data['target_clv'])
+
+    # DROP FEATURES NOT USED IN FINAL MODEL
+
+    customer_data = customer_data.drop(
+        columns=[
+            "first_purchase_date",
+            "last_purchase_date",
+            "Customer ID"
+        ]
+    )
 
-        # Feature window
-        df_features = df[df["InvoiceDate"] <= cutoff_date].copy()
-        df_clv = df[df['InvoiceDate'] > cutoff_date]
+    return customer_data
 
-        # Aggregate customer-level features
+
+def aggregate_customers(df: pd.DataFrame, cutoff_date, end_date, backend: str = 'pandas') -> tuple:
+    """Per-customer aggregates of the rows up to `cutoff_date` and the
+    "Total Amount" spend in (cutoff_date, end_date]."""
+    if backend == 'numpy':
+        from src.features.aggregation import window_aggregates
+        with track('build_features.groupby'):
+            return window_aggregates(df, cutoff_date, end_date=end_date)
+
+    # Feature window
+    df_features = df[df["InvoiceDate"] <= cutoff_date].copy()
+    df_clv = df[(df['InvoiceDate'] > cutoff_date) & (df['InvoiceDate'] <= end_date)]
+
+    # Aggregate customer-level features
+    with track('build_features.groupby'):
         customer_features = df_features.groupby("Customer ID").agg(
             first_purchase_date=("InvoiceDate", "min"),
             last_purchase_date=("InvoiceDate", "max"),
@@ -33,46 +82,40 @@ def build_features(df: pd.DataFrame) -> pd.DataFrame:
             avg_quantity_per_order=("Quantity", "mean"),
             unit_price_std=("Price", "std"),
         ).round(2)
+    clv_totals = df_clv.groupby('Customer ID')['Total Amount'].sum()
+    return customer_features, clv_totals
 
-        # Time-based features
-        customer_features["customer_age_days"] = (
-            cutoff_date - customer_features["first_purchase_date"]
-        ).dt.days
-
-        customer_features['days_since_last_purchase'] = (cutoff_date - customer_features['last_purchase_date']).dt.days
-
-
-        # Behavioral ratios
-
-        customer_features['average_days_between_purchase'] = customer_features['customer_age_days'] / customer_features['unique_invoices']
-
-        customer_features['is_onetime_buyer'] = (customer_features['unique_invoices']==1).astype(int)
 
+def build_features(df, backend: str = 'pandas', cutoff_date=None, horizon_days: int = 90) -> pd.DataFrame:
+    """
+    Build customer-level features for CLV modeling using
+    a rolling 90-day cutoff window.
 
-        # Handle NaNs
-        customer_features["unit_price_std"] = (
-            customer_features["unit_price_std"].fillna(0)
-        )
+    Features use the transactions up to `cutoff_date` and the target is the
+    spend in the `horizon_days` after it. The default cutoff is the last
+    invoice date minus `horizon_days`; the backtest passes earlier ones.
 
-        #caluclate target clv
-        clv_data = df_clv.groupby('Customer ID')['Total Amount'].sum().reset_index()
-        clv_data.columns = ['Customer ID', 'target_clv']
+    backend='numpy' computes the per-customer aggregates with
+    src.features.aggregation instead of groupby; the result is identical.
+    backend='duckdb' runs preprocessing and aggregation as one SQL query
+    (see src.features.sql_features).
+    """
 
-        #Merge caluclated clv to customer features
-        customer_data = customer_features.reset_index().merge(clv_data,on='Customer ID',how='inner')
+    try:
+        if backend == 'duckdb':
+            from src.features.sql_features import build_features_sql
+            return build_features_sql(df, cutoff_date=cutoff_date, horizon_days=horizon_days)
 
-        #Log transform target clv
-        customer_data['target_clv'] = np.log1p(customer_data['target_clv'])
+        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+        if cutoff_date is None:
+            cutoff_date = df["InvoiceDate"].max() - timedelta(days=horizon_days)
+        cutoff_date = pd.Timestamp(cutoff_date)
+        end_date = cutoff_date + timedelta(days=horizon_days)
 
-        # DROP FEATURES NOT USED IN FINAL MODEL
+        logging.info("Using cutoff date: %s", cutoff_date.date())
 
-        customer_data = customer_data.drop(
-            columns=[
-                "first_purchase_date",
-                "last_purchase_date",
-                "Customer ID"
-            ]
-        )
+        customer_features, clv_totals = aggregate_customers(df, cutoff_date, end_date, backend)
+        customer_data = customer_table(customer_features, clv_totals, cutoff_date)
 
         logging.info(
             "Feature engineering completed. Shape: %s | Columns: %s",
@@ -86,6 +129,26 @@ def build_features(df: pd.DataFrame) -> pd.DataFrame:
         logging.error("Feature engineering failed: %s", e)
         raise
 
+def build_snapshot(df, backend: str = 'pandas', as_of=None) -> pd.DataFrame:
+    """
+    Features of every customer as of `as_of` (default: the last invoice
+    date), with their Customer ID and without a target. These are the rows
+    the served model scores for known customers.
+
+    The duckdb backend is not used here; it falls back to numpy.
+    """
+    try:
+        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+        as_of = pd.Timestamp(df["InvoiceDate"].max() if as_of is None else as_of)
+        customer_features, _ = aggregate_customers(df, as_of, as_of, 'numpy' if backend == 'duckdb' else backend)
+        snapshot = derived_features(customer_features, as_of).reset_index()
+        snapshot = snapshot.drop(columns=["first_purchase_date", "last_purchase_date"])
+        logging.info("Customer snapshot as of %s: %d customers", as_of.date(), len(snapshot))
+        return snapshot
+    except Exception as e:
+        logging.error("Building the customer snapshot failed: %s", e)
+        raise
+
 def save_data(df: pd.DataFrame, file_path: str) -> None:
     """Save the dataframe to a CSV file."""
     try:
@@ -96,25 +159,84 @@ def save_data(df: pd.DataFrame, file_path: str) -> None:
         logging.error('Unexpected error occurred while saving the data: %s', e)
         raise
 
-def main():
+def save_matrix(df: pd.DataFrame, file_path: str, target: str = 'target_clv') -> None:
+    """Save the features as a C-contiguous float32 .npy and the target as float64 .npy, with a JSON sidecar.
+
+    float32 is what the forest converts its input to, so training on the
+    matrix gives the same model as training on `df` itself (the CSV round
+    trip is not exact). The target stays float64 as sklearn uses it.
+    src.utils.load_matrix maps both back.
+    """
     try:
+        X_path, y_path, meta_path = matrix_paths(file_path)
+        os.makedirs(os.path.dirname(X_path), exist_ok=True)
+        X = df.drop(columns=[target])
+        np.save(X_path, np.ascontiguousarray(X.to_numpy(dtype=np.float32)))
+        np.save(y_path, np.ascontiguousarray(df[target].to_numpy(dtype=np.float64)))
+        meta = {
+            'rows': len(df),
+            'columns': list(X.columns),
+            'target': target,
+            'dtypes': {'X': 'float32', 'y': 'float64'},
+            # Column dtypes before the cast, for readers that want them back
+            'source_dtypes': {column: str(dtype) for column, dtype in df.dtypes.items()},
+        }
+        with open(meta_path, 'w') as file:
+            json.dump(meta, file, indent=4)
+        logging.info('Feature matrix saved to %s', file_path)
+    except Exception as e:
+        logging.error('Unexpected error occurred while saving the feature matrix: %s', e)
+        raise
 
+def split_data(df: pd.DataFrame, test_size: float) -> tuple:
+    """Split the engineered customer table into train and test sets."""
+    from sklearn.model_selection import train_test_split
+    train_df, test_df = train_test_split(df, test_size=test_size, random_state=42)
+    return train_df, test_df
+
+def save_reference_profile(train_df: pd.DataFrame, file_path: str = REFERENCE_PATH) -> None:
+    """Save the training feature histograms used for drift monitoring in the app.
+
+    The prediction reference depends on the model and is written by the
+    evaluation stage (src.model.model_evaluation.save_prediction_profile).
+    """
+    try:
+        features = [column for column in train_df.columns if column != 'target_clv']
+        save_profile(build_profile(train_df, features), file_path)
+        logging.info('Reference profile saved to %s', file_path)
+    except Exception as e:
+        logging.error('Failed to save the reference profile: %s', e)
+        raise
+
+def main():
+    try:
 
-        data = load_data('./data/interim/data.csv')
 
-        df_engineered  = build_features(data)
+        with stage('feature_engineering'):
+            params = load_params('params.yaml')
+            test_size = params['feature_engineering']['test_size']
+            backend = params['feature_engineering'].get('backend', 'pandas')
 
-        params = load_params('params.yaml')
-        test_size = params['feature_engineering']['test_size']
+            if backend == 'duckdb':
+                # DuckDB scans the CSV itself, no need to load it into pandas first
+                df_engineered = build_features(os.path.join('./data', 'interim', 'data.csv'), backend)
+            else:
+                data = load_data('./data/interim/data.csv')
+                df_engineered  = build_features(data, backend)
 
-        train_df, test_df = train_test_split(df_engineered, test_size=test_size, random_state=42)
+            train_df, test_df = split_data(df_engineered, test_size)
 
-        save_data(train_df, os.path.join("./data", "processed", "train_data.csv"))
-        save_data(test_df, os.path.join("./data", "processed", "test_data.csv"))
+            save_data(train_df, os.path.join("./data", "processed", "train_data.csv"))
+            save_data(test_df, os.path.join("./data", "processed", "test_data.csv"))
+            save_matrix(train_df, os.path.join("./data", "processed", "train"))
+            save_matrix(test_df, os.path.join("./data", "processed", "test"))
+            save_reference_profile(train_df)
+        save_stage('feature_engineering')
         logging.info("Engineered features with train and test data saved successfully")
     except Exception as e:
         logging.error('Failed to complete the feature engineering process: %s', e)
         print(f"Error: {e}")
 
 if __name__ == '__main__':
+    configure_logger()
     main()
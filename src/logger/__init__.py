@@ -1,40 +1,151 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import sys
 from datetime import datetime
 from pathlib import Path
 
-#constants 
+#constants
 LOG_DIR = 'logs'
-LOG_FILE = f"{datetime.now().strftime('%d_%m_%y_%H_%M_%S')}.log"
 MAX_LOG_SIZE = 5 * 1024 * 1024
+LOG_FORMAT = "[ %(asctime)s ] %(name)s - %(levelname)s - %(message)s"
 
 #log file path
 root_dir = Path(__file__).parent.parent.absolute()
 log_dir_path = os.path.join(root_dir, LOG_DIR)
-os.makedirs(log_dir_path, exist_ok=True)
-log_file_path = os.path.join(log_dir_path, LOG_FILE)
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket: lets through `rate` records per second with bursts up to `burst`.
+
+    Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.dropped += 1
+            return False
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random `fraction` of the records below WARNING."""
+
+    def __init__(self, fraction: float):
+        super().__init__()
+        self.fraction = fraction
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.fraction
+
+
+def limit_logger(name: str, rate: float = None, sample: float = None) -> logging.Logger:
+    """Attach rate limiting and/or sampling to a named logger for hot loops."""
+    logger = logging.getLogger(name)
+    if rate is not None:
+        logger.addFilter(RateLimitFilter(rate))
+    if sample is not None:
+        logger.addFilter(SamplingFilter(sample))
+    return logger
+
 
 #configure log
-def configure_logger():
+def configure_logger(mode: str = None, json_format: bool = None, level: int = logging.INFO):
+    """Configure the root logger with a rotating file and a stdout handler.
+
+    mode='queue' (default) puts records on an in-memory queue from which a
+    single background listener thread does the file and console I/O, so log
+    calls never block on disk. mode='sync' attaches the handlers directly.
+    Defaults come from the LOG_MODE and LOG_FORMAT=json environment variables.
+    Calling it again is a no-op.
+    """
+    global _listener
+
     logger = logging.getLogger()
+    if getattr(logger, "_src_configured", False):
+        return logger
+
+    mode = mode or os.getenv("LOG_MODE", "queue")
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "text") == "json"
+
     logger.setLevel(logging.DEBUG)
 
-    formatter = logging.Formatter("[ %(asctime)s ] %(name)s - %(levelname)s - %(message)s")
-    
+    formatter = JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT)
+
+    os.makedirs(log_dir_path, exist_ok=True)
+    log_file_path = os.path.join(log_dir_path, f"{datetime.now().strftime('%d_%m_%y_%H_%M_%S')}.log")
+
     #set file handler
     file_handler = RotatingFileHandler(log_file_path, maxBytes=MAX_LOG_SIZE, encoding="utf-8")
     file_handler.setFormatter(formatter)
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(level)
 
     #console hadler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(level)
+
+    if mode == "queue":
+        queue_handler = QueueHandler(queue.SimpleQueue())
+        queue_handler.setLevel(level)
+        _listener = QueueListener(queue_handler.queue, file_handler, console_handler,
+                                  respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logger)
+        logger.addHandler(queue_handler)
+    elif mode == "sync":
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
+    else:
+        raise ValueError(f"Unknown log mode: {mode}")
 
+    logger._src_configured = True
+    return logger
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
 
-configure_logger()
\ No newline at end of file
+def shutdown_logger():
+    """Flush the queue and stop the background listener."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
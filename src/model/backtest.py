@@ -0,0 +1,180 @@
+"""Rolling-origin backtest of the CLV model over historical forecast dates.
+
+For every cutoff c the model is trained on the feature table built at
+c - horizon, whose targets end at c, so training only uses what was known
+on the forecast date. It is then evaluated on the table built at c, i.e.
+on the spend in the `horizon_days` after c. Cutoffs step back from the
+latest possible one (last invoice date - horizon) by `step_days`.
+
+Feature tables are cached under CACHE_DIR, keyed by a hash of the
+transactions, the feature code, the cutoff, the horizon and the backend,
+so re-running with more folds or different model params only builds the
+tables it has not seen. When `step_days` equals the horizon, the training
+table of one fold is the test table of the previous one and is built once.
+The folds train and evaluate in parallel, one process per fold.
+
+    python -m src.model.backtest     # settings under `backtest` in params.yaml
+"""
+import glob
+import hashlib
+import json
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from src.logger import logging, configure_logger
+from src.utils import load_params, load_data
+from src.perf import stage, track, save_stage
+
+CACHE_DIR = '.cache/backtest'
+REPORT_PATH = 'reports/backtest.json'
+FEATURE_CODE = 'src/features/*.py'
+
+
+def data_hash(df: pd.DataFrame) -> str:
+    """Content hash of a transaction table (values and dtypes, not the index)."""
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(str(list(df.dtypes.astype(str))).encode())
+    return digest.hexdigest()
+
+
+def code_hash(pattern: str = FEATURE_CODE) -> str:
+    """Hash of the feature engineering sources, so code changes invalidate the cache."""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def fold_cutoffs(df: pd.DataFrame, n_folds: int, step_days: int, horizon_days: int) -> list:
+    """Forecast dates of the folds, oldest first."""
+    first, last = df['InvoiceDate'].min(), df['InvoiceDate'].max() - timedelta(days=horizon_days)
+    cutoffs = [last - timedelta(days=step_days * k) for k in reversed(range(n_folds))]
+    if cutoffs[0] - timedelta(days=horizon_days) <= first:
+        raise ValueError(
+            f"{n_folds} folds {step_days} days apart need transactions from before {cutoffs[0] - timedelta(days=horizon_days)}")
+    return cutoffs
+
+
+def cached_features(df: pd.DataFrame, key: str, cutoff, horizon_days: int, backend: str,
+                    cache_dir: str = CACHE_DIR) -> pd.DataFrame:
+    """build_features at `cutoff`, read from `cache_dir` when it was built before."""
+    from src.features.feature_engineering import build_features
+
+    cutoff = pd.Timestamp(cutoff)
+    path = os.path.join(cache_dir, f"{key}_{cutoff:%Y%m%dT%H%M%S}_{horizon_days}d_{backend}.pkl")
+    if os.path.exists(path):
+        logging.info('Feature table for %s read from %s', cutoff, path)
+        return pd.read_pickle(path)
+
+    table = build_features(df, backend, cutoff_date=cutoff, horizon_days=horizon_days)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written under a temporary name first so an interrupted run never leaves a partial table
+    table.to_pickle(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return table
+
+
+def run_fold(train_df: pd.DataFrame, test_df: pd.DataFrame, params: dict) -> dict:
+    """Train on `train_df` and return the evaluation metrics on `test_df`."""
+    from src.model.model_building import model_traing
+    from src.model.model_evaluation import evaluate_model
+
+    rf_model = model_traing(train_df.drop(columns=['target_clv']), train_df['target_clv'], params)
+    metrics = evaluate_model(rf_model, test_df)
+    metrics['n_train'] = len(train_df)
+    metrics['n_test'] = len(test_df)
+    return metrics
+
+
+def stability(folds: list) -> dict:
+    """Mean, std, min, max and coefficient of variation of every metric across folds."""
+    summary = {}
+    for name in folds[0]:
+        if name in ('cutoff', 'train_cutoff', 'n_train', 'n_test'):
+            continue
+        values = np.array([fold[name] for fold in folds], dtype=float)
+        mean = float(values.mean())
+        std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+        summary[name] = {
+            'mean': mean, 'std': std, 'min': float(values.min()), 'max': float(values.max()),
+            'cv': std / abs(mean) if mean else None,
+        }
+    return summary
+
+
+def run_backtest(df: pd.DataFrame, params: dict, n_folds: int = 6, step_days: int = 90,
+                 horizon_days: int = 90, n_jobs: int = -1, backend: str = 'numpy',
+                 cache_dir: str = CACHE_DIR) -> dict:
+    """Per-fold metrics and their stability across folds."""
+    try:
+        df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
+        cutoffs = fold_cutoffs(df, n_folds, step_days, horizon_days)
+
+        with track('backtest.features'):
+            key = hashlib.sha256((data_hash(df) + code_hash()).encode()).hexdigest()[:16]
+            dates = sorted({c - timedelta(days=horizon_days) for c in cutoffs} | set(cutoffs))
+            tables = {c: cached_features(df, key, c, horizon_days, backend, cache_dir) for c in dates}
+
+        pairs = [(tables[c - timedelta(days=horizon_days)], tables[c]) for c in cutoffs]
+        workers = min(os.cpu_count() if n_jobs == -1 else n_jobs, n_folds)
+        with track('backtest.folds'):
+            if workers <= 1:
+                results = [run_fold(train_df, test_df, params) for train_df, test_df in pairs]
+            else:
+                # spawn, not fork: a forked child would inherit the transaction table for nothing
+                with ProcessPoolExecutor(max_workers=workers,
+                                         mp_context=multiprocessing.get_context('spawn')) as executor:
+                    futures = [executor.submit(run_fold, train_df, test_df, params) for train_df, test_df in pairs]
+                    results = [future.result() for future in futures]
+
+        folds = [
+            {'cutoff': str(c), 'train_cutoff': str(c - timedelta(days=horizon_days)), **metrics}
+            for c, metrics in zip(cutoffs, results)
+        ]
+        for fold in folds:
+            logging.info('Fold %s: rmse_log %.4f, r2 %.4f', fold['cutoff'], fold['rmse_log'], fold['r2'])
+        return {'horizon_days': horizon_days, 'step_days': step_days, 'folds': folds, 'stability': stability(folds)}
+    except Exception as e:
+        logging.error('Backtest failed: %s', e)
+        raise
+
+
+def save_report(report: dict, file_path: str = REPORT_PATH) -> None:
+    """Save the backtest report to a JSON file."""
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'w') as file:
+            json.dump(report, file, indent=4)
+        logging.info('Backtest report saved to %s', file_path)
+    except Exception as e:
+        logging.error('Error occurred while saving the backtest report: %s', e)
+        raise
+
+
+def main():
+    try:
+        with stage('backtest'):
+            params = load_params('params.yaml')
+            settings = params.get('backtest', {})
+            data = load_data('./data/interim/data.csv')
+            report = run_backtest(
+                data, params,
+                n_folds=settings.get('folds', 6),
+                step_days=settings.get('step_days', 90),
+                horizon_days=settings.get('horizon_days', 90),
+                n_jobs=settings.get('n_jobs', -1),
+                backend=params['feature_engineering'].get('backend', 'pandas'),
+            )
+            save_report(report)
+        save_stage('backtest')
+    except Exception as e:
+        logging.error('Failed to complete the backtest: %s', e)
+        print(f"Error: {e}")
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
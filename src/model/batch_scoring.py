@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from src.logger import logging, configure_logger
+from src.utils import load_params, load_data, load_model, model_fingerprint
+from src.perf import stage, track, save_stage
+from src.features.feature_engineering import build_snapshot
+from src.serving.inference import AdaptivePredictor
+from src.serving.prediction_store import STORE_PATH, write_store
+from src.serving.ranking import Ranking, segment_values
+
+RANKING_PATH = 'models/ranking.npz'
+
+
+def score_customers(rf_model, snapshot: pd.DataFrame, store_path: str = STORE_PATH,
+                    ranking_path: str = RANKING_PATH, model_version: str = '',
+                    runtime: str = 'sklearn', onnx_path: str = None) -> int:
+    """Score every customer of the snapshot once and write the prediction store and the top-K ranking.
+
+    runtime='sklearn' walks the forest's trees through AdaptivePredictor,
+    across all CPUs for a snapshot this size. runtime='onnx' predicts with
+    the exported model at `onnx_path` (default models/rf_model.onnx)
+    instead; it must have been exported from `rf_model`.
+    """
+    try:
+        X = snapshot.drop(columns=['Customer ID'])
+        customer_ids = snapshot['Customer ID'].to_numpy().astype(np.int64)
+        fingerprint = model_fingerprint(rf_model)
+
+        with track('predict'):
+            if runtime == 'onnx':
+                from src.model.onnx_model import ONNX_PATH, OnnxRegressor
+                onnx_path = onnx_path or ONNX_PATH
+                onnx_model = OnnxRegressor(onnx_path)
+                if onnx_model.fingerprint != fingerprint:
+                    raise ValueError(f"{onnx_path} was not exported from this model")
+                preds_log = onnx_model.predict(X[onnx_model.feature_names].to_numpy(dtype=np.float32))
+            elif runtime == 'sklearn':
+                preds_log = AdaptivePredictor(rf_model).predict(X)
+            else:
+                raise ValueError(f"Unknown runtime: {runtime}")
+
+        with track('write_store'):
+            write_store(store_path, customer_ids, preds_log, fingerprint, model_version)
+        Ranking(customer_ids, np.expm1(preds_log), segment_values(snapshot), fingerprint, model_version).save(ranking_path)
+        logging.info('Scored %d customers into %s and %s', len(customer_ids), store_path, ranking_path)
+        return len(customer_ids)
+    except Exception as e:
+        logging.error('Batch scoring failed: %s', e)
+        raise
+
+
+def main():
+    try:
+        with stage('batch_scoring'):
+            params = load_params('params.yaml')
+            backend = params['feature_engineering'].get('backend', 'pandas')
+            rf_model = load_model('./models/rf_model.pkl')
+            data = load_data('./data/interim/data.csv')
+
+            snapshot = build_snapshot(data, backend)
+            score_customers(rf_model, snapshot, runtime=params.get('batch_scoring', {}).get('runtime', 'sklearn'))
+        save_stage('batch_scoring')
+    except Exception as e:
+        logging.error('Failed to complete the batch scoring: %s', e)
+        raise
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
@@ -0,0 +1,147 @@
+"""Permutation importance and per-segment error analysis for the holdout set.
+
+Permutation importance shuffles one feature column at a time and reports
+how much the log-scale RMSE grows. The feature x repeat tasks run in a
+process pool; the test matrix is written once as a float32 .npy file (the
+dtype the forest predicts on) and every worker maps it read-only, so the
+pool holds one copy of it in the page cache instead of one per worker.
+When X is already a float32 matrix mapped from a .npy file (see
+src.utils.load_matrix), the workers map that file instead. Each task
+copies the matrix only for the duration of its own predict.
+
+Segment metrics compute `evaluate_regression` for every segment of every
+segmentation at once: segment codes of all segmentations are stacked and
+the sums behind RMSE, MAE and R^2 are taken with np.bincount.
+"""
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Upper edges (days) of the customer tenure buckets, from customer_age_days
+TENURE_BUCKETS = (90, 180, 365, 730)
+
+_shared = {}
+
+
+def _rmse(y_true: np.ndarray, y_pred: np.ndarray) -> float:
+    return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
+
+
+def _permuted_rmse(model, X: np.ndarray, y: np.ndarray, columns: list, feature: int, seed: list) -> float:
+    work = np.array(X)
+    rng = np.random.default_rng(seed)
+    work[:, feature] = work[rng.permutation(len(work)), feature]
+    return _rmse(y, model.predict(pd.DataFrame(work, columns=columns, copy=False)))
+
+
+def _npy_file(matrix: np.ndarray):
+    """Path of the .npy file `matrix` is the whole memory-mapped array of, or None."""
+    base = matrix
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    if base is None or not str(base.filename or "").endswith(".npy") or not matrix.flags.c_contiguous:
+        return None
+    same = base.shape == matrix.shape and base.dtype == matrix.dtype and np.byte_bounds(base) == np.byte_bounds(matrix)
+    return str(base.filename) if same else None
+
+
+def _init_worker(model, matrix_path: str, y: np.ndarray, columns: list) -> None:
+    _shared.update(model=model, X=np.load(matrix_path, mmap_mode="r"), y=y, columns=columns)
+
+
+def _task(feature: int, seed: list) -> float:
+    return _permuted_rmse(_shared["model"], _shared["X"], _shared["y"], _shared["columns"], feature, seed)
+
+
+def permutation_importance(model, X: pd.DataFrame, y, n_repeats: int = 5,
+                           n_jobs: int = -1, random_state: int = 42) -> dict:
+    """Increase in log-scale RMSE when each feature is shuffled, over `n_repeats` shuffles.
+
+    Shuffles are seeded by (random_state, feature, repeat), so the result
+    does not depend on `n_jobs`; -1 uses every CPU.
+    """
+    columns = list(X.columns)
+    matrix = np.ascontiguousarray(X.to_numpy(dtype=np.float32))
+    y = np.asarray(y, dtype=float)
+    baseline = _rmse(y, model.predict(X))
+    tasks = [(feature, [random_state, feature, repeat])
+             for feature in range(len(columns)) for repeat in range(n_repeats)]
+    workers = min(os.cpu_count() if n_jobs == -1 else n_jobs, len(tasks))
+
+    if workers <= 1:
+        scores = [_permuted_rmse(model, matrix, y, columns, feature, seed) for feature, seed in tasks]
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            matrix_path = _npy_file(matrix)
+            if matrix_path is None:
+                matrix_path = os.path.join(tmp, "X_test.npy")
+                np.save(matrix_path, matrix)
+            del matrix
+            # spawn, not fork: the pipeline runner saves stage outputs from threads
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model, matrix_path, y, columns),
+            ) as executor:
+                scores = list(executor.map(_task, *zip(*tasks)))
+
+    scores = np.array(scores).reshape(len(columns), n_repeats) - baseline
+    return {
+        "baseline_rmse_log": baseline,
+        "n_repeats": n_repeats,
+        "features": {
+            column: {"importance_mean": float(row.mean()), "importance_std": float(row.std())}
+            for column, row in zip(columns, scores)
+        },
+    }
+
+
+def segment_labels(X: pd.DataFrame) -> pd.DataFrame:
+    """Buyer type (one-time vs repeat) and tenure bucket of every customer."""
+    edges = (-np.inf,) + TENURE_BUCKETS + (np.inf,)
+    names = [f"<{TENURE_BUCKETS[0]}d"]
+    names += [f"{low}-{high}d" for low, high in zip(TENURE_BUCKETS, TENURE_BUCKETS[1:])]
+    names += [f">={TENURE_BUCKETS[-1]}d"]
+    return pd.DataFrame({
+        "buyer_type": np.where(X["is_onetime_buyer"] == 1, "onetime", "repeat"),
+        "tenure": pd.cut(X["customer_age_days"], edges, right=False, labels=names),
+    }, index=X.index)
+
+
+def segment_metrics(segments: pd.DataFrame, y_true, y_pred) -> dict:
+    """`evaluate_regression` metrics plus row counts for every segment of every column of `segments`."""
+    y_true = np.asarray(y_true, dtype=float)
+    errors = y_true - np.asarray(y_pred, dtype=float)
+
+    # One code per (segmentation, segment), stacked over all segmentations
+    codes, keys, offset = [], [], 0
+    for name in segments.columns:
+        column_codes, uniques = pd.factorize(segments[name], sort=True)
+        codes.append(column_codes + offset)
+        keys += [(name, str(value)) for value in uniques]
+        offset += len(uniques)
+    codes = np.concatenate(codes)
+    repeats = len(segments.columns)
+    errors, y_true = np.tile(errors, repeats), np.tile(y_true, repeats)
+
+    count = np.bincount(codes, minlength=offset)
+    sse = np.bincount(codes, errors ** 2, minlength=offset)
+    sae = np.bincount(codes, np.abs(errors), minlength=offset)
+    mean = np.bincount(codes, y_true, minlength=offset) / count
+    sst = np.bincount(codes, (y_true - mean[codes]) ** 2, minlength=offset)
+    # r2_score's convention for a constant target: 1 for a perfect fit, else 0
+    r2 = np.where(sst > 0, 1 - sse / np.where(sst > 0, sst, 1), np.where(sse == 0, 1.0, 0.0))
+
+    result = {}
+    for i, (name, value) in enumerate(keys):
+        result.setdefault(name, {})[value] = {
+            "n": int(count[i]),
+            "rmse_log": float(np.sqrt(sse[i] / count[i])),
+            "mae_log": float(sae[i] / count[i]),
+            "r2": float(r2[i]),
+        }
+    return result
@@ -0,0 +1,165 @@
+"""Distil the forest into a small surrogate model for latency-sensitive endpoints.
+
+The student is trained on the forest's log-scale predictions rather than
+on the targets. Its training set is the training features plus synthetic
+rows: training rows whose features are each, with probability
+`swap_prob`, replaced by the same feature of another random row. The
+synthetic rows cover feature combinations the training set lacks, where
+the student would otherwise have to extrapolate the teacher.
+
+The report compares both models on the holdout with evaluate_regression
+and spearman_rank, the student's agreement with the teacher (fidelity)
+and the single-row predict time of each.
+"""
+import json
+import time
+import numpy as np
+import pandas as pd
+from src.logger import logging, configure_logger
+from src.utils import load_params, load_model, load_matrix, split_target, evaluate_regression, spearman_rank, \
+    model_fingerprint
+from src.perf import stage, track, save_stage
+
+SURROGATE_PATH = 'models/surrogate_model.pkl'
+SURROGATE_METRICS_PATH = 'reports/surrogate_metrics.json'
+SURROGATE_MODEL_NAME = 'my_model_surrogate'
+
+
+def augment_features(X: pd.DataFrame, n_samples: int, swap_prob: float, random_state: int = 42) -> pd.DataFrame:
+    """Training rows plus `n_samples` rows with features swapped in from other rows."""
+    rng = np.random.default_rng(random_state)
+    synthetic = X.iloc[rng.integers(0, len(X), n_samples)].reset_index(drop=True)
+    for column in X.columns:
+        swap = rng.random(n_samples) < swap_prob
+        values = synthetic[column].to_numpy(copy=True)
+        values[swap] = X[column].to_numpy()[rng.integers(0, len(X), swap.sum())]
+        synthetic[column] = values
+    return pd.concat([X.reset_index(drop=True), synthetic], ignore_index=True)
+
+
+def make_student(settings: dict):
+    """A shallow gradient boosting model ('gbm') or a single pruned tree ('tree')."""
+    if settings.get('model', 'gbm') == 'tree':
+        from sklearn.tree import DecisionTreeRegressor
+        return DecisionTreeRegressor(
+            max_depth=settings.get('max_depth', 8),
+            min_samples_leaf=settings.get('min_samples_leaf', 20),
+            random_state=settings.get('random_state', 42),
+        )
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    return HistGradientBoostingRegressor(
+        max_iter=settings.get('max_iter', 100),
+        max_leaf_nodes=settings.get('max_leaf_nodes', 15),
+        learning_rate=settings.get('learning_rate', 0.1),
+        random_state=settings.get('random_state', 42),
+    )
+
+
+def distill_model(teacher, X_train: pd.DataFrame, params: dict):
+    """Fit a student on the teacher's predictions over augmented training features."""
+    try:
+        settings = params.get('distillation', {})
+        X = augment_features(X_train, settings.get('n_samples', 50_000), settings.get('swap_prob', 0.3),
+                             settings.get('random_state', 42))
+        with track('teacher_predict'):
+            y = teacher.predict(X)
+        student = make_student(settings)
+        with track('student_fit'):
+            student.fit(X, y)
+        # The app only routes to a surrogate distilled from the model it serves
+        student.teacher_fingerprint_ = model_fingerprint(teacher)
+        logging.info('Distilled %s on %d rows', type(student).__name__, len(X))
+        return student
+    except Exception as e:
+        logging.error('Error while distilling the model: %s', e)
+        raise
+
+
+def single_row_latency(model, X: pd.DataFrame, repeats: int = 50) -> float:
+    """Median milliseconds to predict one row, as a request would."""
+    row = X.iloc[:1]
+    model.predict(row)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times) * 1000)
+
+
+def evaluate_surrogate(student, teacher, test_data) -> dict:
+    """Holdout metrics of both models, the surrogate's loss against the teacher and its fidelity."""
+    X_test, y_test = split_target(test_data)
+
+    teacher_pred = teacher.predict(X_test)
+    student_pred = student.predict(X_test)
+    metrics = {}
+    for name, y_pred in (('teacher', teacher_pred), ('surrogate', student_pred)):
+        scores = evaluate_regression(y_test, y_pred)
+        scores['spearman_rank'] = spearman_rank(y_test, y_pred)
+        metrics.update({f'{name}_{key}': float(value) for key, value in scores.items()})
+    # Positive means the surrogate is worse
+    for key in ('rmse_log', 'mae_log'):
+        metrics[f'{key}_loss'] = metrics[f'surrogate_{key}'] - metrics[f'teacher_{key}']
+    for key in ('r2', 'spearman_rank'):
+        metrics[f'{key}_loss'] = metrics[f'teacher_{key}'] - metrics[f'surrogate_{key}']
+    metrics['fidelity_rmse_log'] = float(evaluate_regression(teacher_pred, student_pred)['rmse_log'])
+    metrics['fidelity_spearman_rank'] = float(spearman_rank(teacher_pred, student_pred))
+    metrics['teacher_latency_ms'] = single_row_latency(teacher, X_test)
+    metrics['surrogate_latency_ms'] = single_row_latency(student, X_test)
+    return metrics
+
+
+def save_model(model, file_path: str = SURROGATE_PATH) -> None:
+    import pickle
+
+    with open(file_path, 'wb') as file:
+        pickle.dump(model, file)
+    logging.info('Surrogate model saved to %s', file_path)
+
+
+def save_metrics(metrics: dict, file_path: str = SURROGATE_METRICS_PATH) -> None:
+    with open(file_path, 'w') as file:
+        json.dump(metrics, file, indent=4)
+
+
+def log_surrogate(student, metrics: dict, metrics_path: str = SURROGATE_METRICS_PATH) -> None:
+    """Log the surrogate to the active MLflow run and register it as its own model."""
+    import mlflow
+    import mlflow.sklearn
+
+    with track('mlflow.upload'):
+        mlflow.log_metrics(metrics)
+        mlflow.log_params({f'surrogate_{key}': value for key, value in student.get_params().items()})
+        mlflow.sklearn.log_model(student, artifact_path="surrogate", registered_model_name=SURROGATE_MODEL_NAME)
+        mlflow.log_artifact(metrics_path)
+
+
+def main():
+    import mlflow
+    from src.model.model_evaluation import setup_tracking
+
+    try:
+        with stage('distillation'):
+            params = load_params('params.yaml')
+            teacher = load_model('./models/rf_model.pkl')
+            X_train, _ = load_matrix('./data/processed/train')
+            test_data = load_matrix('./data/processed/test')
+
+            student = distill_model(teacher, X_train, params)
+            metrics = evaluate_surrogate(student, teacher, test_data)
+            save_model(student)
+            save_metrics(metrics)
+
+            setup_tracking()
+            mlflow.set_experiment("pipeline")
+            with mlflow.start_run(run_name="surrogate"):
+                log_surrogate(student, metrics)
+        save_stage('distillation')
+    except Exception as e:
+        logging.error('Failed to complete the distillation: %s', e)
+        raise
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
@@ -0,0 +1,230 @@
+"""Path-dependent TreeSHAP for the served random forest.
+
+Each leaf l of a tree is reached through a set P_l of distinct split
+features. For a row x, a_j is 1 when x_j falls inside the leaf's interval
+for feature j, and r_j is the training-cover fraction along the leaf's path
+for j. The leaf's contribution to the path-dependent value function is a
+product game over the players in P_l, whose Shapley value for i is
+
+    value_l * (a_i - r_i) / r_i * H_l(A \\ {i}),
+    H_l(B) = sum over S subset of B of  w(|S|) * prod_{j in P_l, j not in S} r_j
+
+where A is the set of path features that x satisfies. H_l depends on x only
+through A, so it is tabulated once per leaf (2^|P_l| entries, at most
+2^n_features) when the explainer is built, as in Fast TreeSHAP v2.
+Explaining a batch then takes a bounds check, an index computation and one
+table gather per (row, leaf, path feature), all vectorized over leaves.
+
+Batch mode writes per-row contributions and the mean |SHAP| per feature:
+
+    python -m src.model.explain --data data/processed/test_data.csv --out reports/shap_values.csv
+"""
+import argparse
+import json
+import math
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from src.logger import logging, configure_logger
+from src.perf import track
+
+# Rows per vectorized chunk are chosen so that the (rows, leaf path features)
+# work arrays stay around this many elements.
+CHUNK_ELEMENTS = 4_000_000
+
+
+def _floor32(bounds: np.ndarray) -> np.ndarray:
+    """Largest float32 <= each bound, so that float32 features compare exactly
+    as they would against the float64 split thresholds."""
+    rounded = bounds.astype(np.float32)
+    return np.where(rounded > bounds, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+class TreeExplainer:
+    """Per-feature contributions of a fitted sklearn tree or tree ensemble.
+
+    `explain(X)` returns (n_rows, n_features) contributions that add up to
+    prediction - expected_value. Rows already explained are served from an
+    LRU of `cache_size` rows; an explainer is built per model version, so the
+    cache never mixes versions.
+    """
+
+    def __init__(self, model, version: str = None, cache_size: int = 4096):
+        trees = [e.tree_ for e in getattr(model, "estimators_", [model])]
+        self.version = version
+        self.n_features = int(model.n_features_in_)
+        self.feature_names = [str(name) for name in getattr(model, "feature_names_in_", range(self.n_features))]
+        self.expected_value = float(np.mean([tree.value[0, 0, 0] for tree in trees]))
+        self._build_tables(trees)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def _build_tables(self, trees: list) -> None:
+        m = self.n_features
+        lo, hi, cover, on_path, value = [], [], [], [], []
+        for tree in trees:
+            left, right = tree.children_left, tree.children_right
+            n = tree.node_count
+            t_lo = np.full((n, m), -np.inf)
+            t_hi = np.full((n, m), np.inf)
+            t_cover = np.ones((n, m))
+            t_path = np.zeros((n, m), dtype=bool)
+            weight = tree.weighted_n_node_samples
+            # Push bounds down one level at a time; node ids are assigned depth first,
+            # so every level only depends on the one above
+            level = np.array([0])
+            while len(level):
+                level = level[left[level] != -1]
+                feature, threshold = tree.feature[level], tree.threshold[level]
+                for children, bound in ((left[level], t_hi), (right[level], t_lo)):
+                    t_lo[children], t_hi[children] = t_lo[level], t_hi[level]
+                    t_cover[children] = t_cover[level]
+                    t_path[children] = t_path[level]
+                    t_path[children, feature] = True
+                    t_cover[children, feature] *= weight[children] / weight[level]
+                    if bound is t_hi:
+                        t_hi[children, feature] = np.minimum(t_hi[children, feature], threshold)
+                    else:
+                        t_lo[children, feature] = np.maximum(t_lo[children, feature], threshold)
+                level = np.concatenate([left[level], right[level]])
+            leaves = left == -1
+            lo.append(t_lo[leaves])
+            hi.append(t_hi[leaves])
+            cover.append(t_cover[leaves])
+            on_path.append(t_path[leaves])
+            value.append(tree.value[leaves, 0, 0])
+
+        lo, hi = np.concatenate(lo), np.concatenate(hi)
+        on_path = np.concatenate(on_path)
+        self.n_leaves = len(on_path)
+        cover = np.concatenate(cover)
+        value = np.concatenate(value) / len(trees)
+
+        # Bit of each path feature in the leaf's own table index
+        rank = np.cumsum(on_path, axis=1) - 1
+        bits = np.where(on_path, 1 << np.maximum(rank, 0), 0).astype(np.int64)
+        depth = on_path.sum(axis=1)
+        sizes = 1 << depth
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self.tables = np.zeros(int(sizes.sum()))
+        for d in np.unique(depth):
+            rows = np.nonzero(depth == d)[0]
+            self._fill_tables(rows, int(d), cover[rows][on_path[rows]].reshape(len(rows), d))
+
+        # Explanation works on the (leaf, path feature) pairs, in leaf order.
+        # phi_i += value * (a_i - cover_i) / cover_i * H = (a_i * coef_i - value) * H
+        leaf, feature = np.nonzero(on_path)
+        pair = np.arange(len(leaf))
+        self.pair_feature = feature
+        self.pair_lo = _floor32(lo[leaf, feature])[:, None]
+        self.pair_hi = _floor32(hi[leaf, feature])[:, None]
+        self.pair_bit = bits[leaf, feature].astype(np.int32)[:, None]
+        self.pair_leaf = leaf
+        self.leaf_offset = self.offsets[:, None]
+        shape = (m, len(leaf))
+        # Sparse 0/1 and weight matrices turn the per-leaf and per-feature sums into products
+        self.leaf_of_pair = sparse.csr_matrix((np.ones(len(leaf), dtype=np.int32), (leaf, pair)),
+                                              shape=(self.n_leaves, len(leaf)))
+        self.coef_of_pair = sparse.csr_matrix((value[leaf] / cover[leaf, feature], (feature, pair)), shape=shape)
+        self.value_of_pair = sparse.csr_matrix((value[leaf], (feature, pair)), shape=shape)
+
+    def _fill_tables(self, rows: np.ndarray, d: int, cover: np.ndarray) -> None:
+        """H tables for leaves with `d` path features (cover compacted to (rows, d))."""
+        subsets = np.arange(1 << d)
+        members = (subsets[:, None] >> np.arange(d)) & 1 == 1
+        size = members.sum(axis=1)
+        # Shapley weight |S|! (d - |S| - 1)! / d!; S = P_l never occurs since i is excluded
+        weight = np.array([math.factorial(s) * math.factorial(d - s - 1) / math.factorial(d) if s < d else 0.0
+                           for s in size])
+        table = weight * np.where(members, 1.0, cover[:, None, :]).prod(axis=2)
+        # Sum over subsets, one bit at a time
+        for k in range(d):
+            view = table.reshape(len(rows), -1, 2, 1 << k)
+            view[:, :, 1, :] += view[:, :, 0, :]
+        index = self.offsets[rows, None] + subsets
+        self.tables[index] = table
+
+    def _explain(self, X: np.ndarray) -> np.ndarray:
+        phi = np.zeros((len(X), self.n_features))
+        if not len(self.pair_leaf):
+            return phi
+        step = max(1, CHUNK_ELEMENTS // len(self.pair_leaf))
+        for start in range(0, len(X), step):
+            # Pairs along the first axis, rows along the second
+            values = X[start:start + step].T[self.pair_feature]
+            inside = (values > self.pair_lo) & (values <= self.pair_hi)
+            bits = inside * self.pair_bit
+            index = self.leaf_of_pair @ bits + self.leaf_offset
+            # Table entry for A \ {i}: the leaf's index with the pair's own bit cleared
+            gathered = self.tables[index[self.pair_leaf] - bits]
+            phi[start:start + step] = (self.coef_of_pair @ (gathered * inside) - self.value_of_pair @ gathered).T
+        return phi
+
+    def explain(self, X) -> np.ndarray:
+        """SHAP values for a batch of rows (columns in training order)."""
+        # Trees compare float32 features against their thresholds
+        X = np.asarray(X, dtype=np.float32)
+        keys = [row.tobytes() for row in X]
+        phi = np.empty((len(X), self.n_features))
+        with self._lock:
+            missing = []
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(key)
+                    phi[i] = cached
+        if missing:
+            phi[missing] = self._explain(X[missing])
+            with self._lock:
+                for i in missing:
+                    self._cache[keys[i]] = phi[i]
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return phi
+
+
+def explain_frame(explainer: TreeExplainer, X: pd.DataFrame) -> pd.DataFrame:
+    """SHAP values as a frame with one column per feature."""
+    columns = explainer.feature_names if set(explainer.feature_names) <= set(X.columns) else list(X.columns)
+    return pd.DataFrame(explainer.explain(X[columns]), columns=columns, index=X.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch SHAP explanations for the trained model.")
+    parser.add_argument('--model', default='models/rf_model.pkl')
+    parser.add_argument('--data', default='data/processed/test_data.csv')
+    parser.add_argument('--out', default='reports/shap_values.csv')
+    parser.add_argument('--importance', default='reports/shap_importance.json')
+    args = parser.parse_args()
+
+    try:
+        with open(args.model, 'rb') as file:
+            model = pickle.load(file)
+        X = pd.read_csv(args.data).drop(columns=['target_clv'], errors='ignore')
+
+        with track('shap.build'):
+            explainer = TreeExplainer(model, version=args.model)
+        with track('shap.explain'):
+            shap_values = explain_frame(explainer, X)
+
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        shap_values.assign(expected_value=explainer.expected_value).to_csv(args.out, index=False)
+        importance = shap_values.abs().mean().sort_values(ascending=False)
+        os.makedirs(os.path.dirname(args.importance) or '.', exist_ok=True)
+        with open(args.importance, 'w') as file:
+            json.dump(importance.to_dict(), file, indent=4)
+        logging.info('SHAP values for %d rows saved to %s', len(X), args.out)
+    except Exception as e:
+        logging.error('Failed to explain the model: %s', e)
+        raise
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
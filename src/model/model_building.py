@@ -1,29 +1,32 @@
 import pandas as pd
-from src.logger import logging
+from src.logger import logging, configure_logger
 from sklearn.ensemble import RandomForestRegressor
-from src.utils import load_params, load_data
+from src.utils import load_params, load_matrix
+from src.perf import stage, track, save_stage
+from src.model.quantiles import LeafQuantiles
 import pickle
 
-params = load_params('params.yaml')
-n_estimators = params['random_forest']['n_estimators']
-max_depth = params['random_forest']['max_depth']
-min_samples_leaf = params['random_forest']['min_samples_leaf']
-max_features = params['random_forest']['max_features']
-random_state = params['random_forest']['random_state']
-min_samples_split = params['random_forest']['min_samples_split']
-
-def model_traing(X_train: pd.DataFrame, y_train: pd.DataFrame) -> RandomForestRegressor:
+def model_traing(X_train: pd.DataFrame, y_train: pd.DataFrame, params: dict = None) -> RandomForestRegressor:
     '''Train Random Forest model'''
     try:
+        # params.yaml is read when training starts, not when the module is imported
+        if params is None:
+            params = load_params('params.yaml')
+        rf_params = params['random_forest']
+
         rf = RandomForestRegressor(
-            n_estimators=n_estimators,
-            max_depth=max_depth,
-            min_samples_leaf=min_samples_leaf,
-            max_features=max_features,
-            min_samples_split=min_samples_split,
-            random_state=random_state
+            n_estimators=rf_params['n_estimators'],
+            max_depth=rf_params['max_depth'],
+            min_samples_leaf=rf_params['min_samples_leaf'],
+            max_features=rf_params['max_features'],
+            min_samples_split=rf_params['min_samples_split'],
+            random_state=rf_params['random_state']
         )
-        rf.fit(X_train,y_train)
+        with track('rf.fit'):
+            rf.fit(X_train,y_train)
+        # Target sketches per leaf, for prediction intervals at serving time
+        with track('leaf_quantiles'):
+            rf.leaf_quantiles_ = LeafQuantiles(rf, X_train, y_train)
         logging.info("Model training completed")
         return rf
     except Exception as e:
@@ -42,16 +45,18 @@ def save_model(model, file_path: str) -> None:
 
 def main():
     try:
-        train_data = load_data('./data/processed/train_data.csv')
-        X_train = train_data.drop(columns=['target_clv'])
-        y_train = train_data['target_clv']
+        with stage('model_building'):
+            # Memory-mapped float32 features, passed to sklearn without a copy
+            X_train, y_train = load_matrix('./data/processed/train')
 
-        rf = model_traing(X_train, y_train)
+            rf = model_traing(X_train, y_train)
 
-        save_model(rf, 'models/rf_model.pkl')
+            save_model(rf, 'models/rf_model.pkl')
+        save_stage('model_building')
     except Exception as e:
         logging.error("Error building model: %s", e)
         raise
 
 if __name__ == '__main__':
+    configure_logger()
     main()
\ No newline at end of file
@@ -1,30 +1,42 @@
 import json
 import logging
 import os
-import mlflow
-import mlflow.sklearn
-import dagshub
-from src.logger import logging
-from src.utils import load_model, load_data, evaluate_regression, inverse_rmse, spearman_rank
+import pandas as pd
+from src.logger import logging, configure_logger
+from src.utils import (load_params, load_model, load_matrix, split_target, evaluate_regression, inverse_rmse,
+                       spearman_rank, model_fingerprint)
+from src.perf import stage, track, save_stage
+from src.model.quantiles import interval_coverage
+from src.model.diagnostics import permutation_importance, segment_labels, segment_metrics
+from src.serving.drift import PREDICTION_PROFILE_PATH, build_profile, save_profile
 
 
-#For local use 
-# dagshub.init(repo_owner='shashi-hue', repo_name='Mlops-Forward-Customer-Value', mlflow=True)
+def setup_tracking() -> None:
+    """Point MLflow at the DagsHub tracking server.
 
-#For production use
-dagshub_token = os.getenv("CAPSTONE_TEST")
-if not dagshub_token:
-    raise EnvironmentError("CAPSTONE_TEST env variable not set")
+    Done on demand rather than at import so that importing this module (e.g.
+    from the pipeline runner or tests) needs neither credentials nor network.
+    """
+    import mlflow
 
-os.environ["MLFLOW_TRACKING_USERNAME"] = dagshub_token
-os.environ["MLFLOW_TRACKING_PASSWORD"] = dagshub_token
+    #For local use
+    # import dagshub
+    # dagshub.init(repo_owner='shashi-hue', repo_name='Mlops-Forward-Customer-Value', mlflow=True)
 
-dagshub_url = "https://dagshub.com"
-repo_owner = "shashi-hue"
-repo_name = "Mlops-Forward-Customer-Value"
+    #For production use
+    dagshub_token = os.getenv("CAPSTONE_TEST")
+    if not dagshub_token:
+        raise EnvironmentError("CAPSTONE_TEST env variable not set")
 
-# Set up MLflow tracking URI
-mlflow.set_tracking_uri(f'{dagshub_url}/{repo_owner}/{repo_name}.mlflow')
+    os.environ["MLFLOW_TRACKING_USERNAME"] = dagshub_token
+    os.environ["MLFLOW_TRACKING_PASSWORD"] = dagshub_token
+
+    dagshub_url = "https://dagshub.com"
+    repo_owner = "shashi-hue"
+    repo_name = "Mlops-Forward-Customer-Value"
+
+    # Set up MLflow tracking URI
+    mlflow.set_tracking_uri(f'{dagshub_url}/{repo_owner}/{repo_name}.mlflow')
 
 
 
@@ -49,44 +61,109 @@ def save_metrics(metrics: dict, file_path: str) -> None:
 #         logging.error('Error occurred while saving the model info: %s', e)
 #         raise
 
-def main():
-    mlflow.set_experiment("pipeline")
-    with mlflow.start_run() as run:  # Start an MLflow run
-        try:
-            rf_model = load_model('./models/rf_model.pkl')
-            test_data = load_data('./data/processed/test_data.csv')
-            X_test = test_data.drop(columns=['target_clv'])
-            y_test = test_data['target_clv']
+def evaluate_model(rf_model, test_data) -> dict:
+    """Score the model on the holdout set (an (X, y) matrix or a frame with the target) and compute the metrics."""
+    X_test, y_test = split_target(test_data)
+
+    with track('predict'):
+        y_pred = rf_model.predict(X_test)
+
+    metrics = evaluate_regression(y_test, y_pred)
+    metrics["rmse_currency"] = inverse_rmse(y_test, y_pred)
+    metrics["spearman_rank"] = spearman_rank(y_test, y_pred)
+    if hasattr(rf_model, 'leaf_quantiles_'):
+        with track('predict_quantiles'):
+            metrics["interval_coverage_80"] = interval_coverage(rf_model, X_test, y_test)
+    return metrics
+
+def diagnose_model(rf_model, test_data, params: dict) -> tuple:
+    """Permutation importance and per-segment metrics on the holdout set."""
+    X_test, y_test = split_target(test_data)
+    settings = params.get('model_evaluation', {})
+
+    with track('permutation_importance'):
+        importance = permutation_importance(
+            rf_model, X_test, y_test,
+            n_repeats=settings.get('permutation_repeats', 5),
+            n_jobs=settings.get('n_jobs', -1),
+        )
+    with track('segment_metrics'):
+        segments = segment_metrics(segment_labels(X_test), y_test, rf_model.predict(X_test))
+    return importance, segments
+
+def save_prediction_profile(rf_model, test_data, file_path: str = PREDICTION_PROFILE_PATH) -> None:
+    """Save the histogram of the model's holdout predictions, the app's reference for prediction drift.
+
+    The profile carries the forest's fingerprint, so the app only compares
+    live predictions against the profile of the model it serves.
+    """
+    try:
+        X_test, _ = split_target(test_data)
+        with track('prediction_profile'):
+            profile = build_profile(X_test, [], predictions=rf_model.predict(X_test))
+        profile['fingerprint'] = model_fingerprint(rf_model)
+        save_profile(profile, file_path)
+        logging.info('Prediction profile saved to %s', file_path)
+    except Exception as e:
+        logging.error('Failed to save the prediction profile: %s', e)
+        raise
 
-            y_pred = rf_model.predict(X_test)
+def log_run(rf_model, metrics: dict, metrics_path: str, artifact_paths: tuple = ()) -> None:
+    """Log metrics, params, the model and the report files to the active MLflow run."""
+    import mlflow
+    import mlflow.sklearn
 
-            metrics = evaluate_regression(y_test, y_pred)
-            metrics["rmse_currency"] = inverse_rmse(y_test, y_pred)
-            metrics["spearman_rank"] = spearman_rank(y_test, y_pred)
+    with track('mlflow.upload'):
+        for metric_name, metric_value in metrics.items():
+            mlflow.log_metric(metric_name, metric_value)
 
-            for metric_name, metric_value in metrics.items():
-                mlflow.log_metric(metric_name, metric_value)
+        if hasattr(rf_model, 'get_params'):
+            params = rf_model.get_params()
+            for param_name, param_value in params.items():
+                mlflow.log_param(param_name, param_value)
 
-            save_metrics(metrics, 'reports/metrics.json')
+        mlflow.sklearn.log_model(
+            rf_model,
+            artifact_path="model",
+            registered_model_name="my_model"
+        )
 
-            if hasattr(rf_model, 'get_params'):
-                params = rf_model.get_params()
-                for param_name, param_value in params.items():
-                    mlflow.log_param(param_name, param_value)
 
-            mlflow.sklearn.log_model(
-                rf_model,
-                artifact_path="model",
-                registered_model_name="my_model"
-            )
+        # save_model_info(run.info.run_id, "model", 'reports/experiment_info.json')
+
+        mlflow.log_artifact(metrics_path)
+        for artifact_path in artifact_paths:
+            mlflow.log_artifact(artifact_path)
+
+def main():
+    import mlflow
+
+    setup_tracking()
+    mlflow.set_experiment("pipeline")
+    with mlflow.start_run() as run:  # Start an MLflow run
+        try:
+            with stage('model_evaluation'):
+                rf_model = load_model('./models/rf_model.pkl')
+                test_data = load_matrix('./data/processed/test')
+
+                params = load_params('params.yaml')
 
+                metrics = evaluate_model(rf_model, test_data)
+                importance, segments = diagnose_model(rf_model, test_data, params)
 
-            # save_model_info(run.info.run_id, "model", 'reports/experiment_info.json')
+                save_metrics(metrics, 'reports/metrics.json')
+                save_metrics(importance, 'reports/permutation_importance.json')
+                save_metrics(segments, 'reports/segment_metrics.json')
+                save_prediction_profile(rf_model, test_data)
 
-            mlflow.log_artifact('reports/metrics.json')
+                log_run(rf_model, metrics, 'reports/metrics.json',
+                        ('reports/permutation_importance.json', 'reports/segment_metrics.json',
+                         PREDICTION_PROFILE_PATH))
+            save_stage('model_evaluation')
         except Exception as e:
             logging.error('Failed to complete the model evaluation process: %s', e)
             print(f"Error: {e}")
 
 if __name__ == '__main__':
+    configure_logger()
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""ONNX export of the trained forest and an ONNX Runtime predictor.
+
+The export stage converts models/rf_model.pkl with skl2onnx into a single
+TreeEnsembleRegressor node and checks that ONNX Runtime reproduces the
+sklearn predictions on the test split. sklearn casts inputs to float32
+before walking the trees and skl2onnx stores float32 thresholds, so both
+take the same branches; only the sum over the trees is done in float32,
+which keeps the log-scale difference around 1e-6.
+
+OnnxRegressor runs the exported file on a float32 array with the CPU
+execution provider, without pandas or sklearn. The forest's fingerprint
+(src.utils.model_fingerprint) and feature order are stored in the model
+metadata, so a file exported from another model version is refused.
+"""
+import json
+import numpy as np
+from src.logger import logging, configure_logger
+from src.utils import load_params, load_matrix, load_model, split_target, model_fingerprint
+from src.perf import stage, track, save_stage
+
+ONNX_PATH = 'models/rf_model.onnx'
+PARITY_PATH = 'reports/onnx_parity.json'
+
+
+def export_onnx(rf_model, feature_names: list, file_path: str = ONNX_PATH, target_opset: int = 17) -> None:
+    """Convert a fitted forest to ONNX with a float32 [n, n_features] input."""
+    try:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+
+        with track('convert'):
+            onx = convert_sklearn(
+                rf_model, initial_types=[('input', FloatTensorType([None, len(feature_names)]))],
+                target_opset={'': target_opset, 'ai.onnx.ml': 3},
+            )
+        for key, value in (('fingerprint', model_fingerprint(rf_model)),
+                           ('feature_names', json.dumps(list(feature_names)))):
+            meta = onx.metadata_props.add()
+            meta.key, meta.value = key, value
+        with open(file_path, 'wb') as file:
+            file.write(onx.SerializeToString())
+        logging.info('ONNX model saved to %s', file_path)
+    except Exception as e:
+        logging.error('Error while exporting the model to ONNX: %s', e)
+        raise
+
+
+class OnnxRegressor:
+    """Log-scale predictions of an exported forest with CPU ONNX Runtime.
+
+    `threads` is ONNX Runtime's intra-op thread count per call. The session
+    is safe to call from several threads, but not across a fork, so each
+    process opens its own.
+    """
+
+    def __init__(self, file_path: str = ONNX_PATH, threads: int = 1):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        self.session = ort.InferenceSession(file_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.fingerprint = metadata.get('fingerprint')
+        self.feature_names = json.loads(metadata.get('feature_names', '[]'))
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predictions for a [n, n_features] array (cast to float32 if needed)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.session.run(None, {self.input_name: X})[0].ravel().astype(np.float64)
+
+
+def check_parity(rf_model, onnx_model: OnnxRegressor, X, tolerance: float) -> dict:
+    """Compare sklearn and ONNX Runtime predictions; raises ValueError past `tolerance`."""
+    with track('predict_sklearn'):
+        expected = rf_model.predict(X)
+    with track('predict_onnx'):
+        actual = onnx_model.predict(X.to_numpy(dtype=np.float32))
+    diff = np.abs(actual - expected)
+    report = {
+        'rows': int(len(diff)),
+        'max_abs_diff': float(diff.max()) if len(diff) else 0.0,
+        'mean_abs_diff': float(diff.mean()) if len(diff) else 0.0,
+        'rows_over_tolerance': int((diff > tolerance).sum()),
+        'tolerance': tolerance,
+    }
+    if report['rows_over_tolerance']:
+        raise ValueError(f"ONNX predictions differ from sklearn by up to {report['max_abs_diff']:.3g} "
+                         f"on {report['rows_over_tolerance']} rows (tolerance {tolerance:g})")
+    return report
+
+
+def export_and_verify(rf_model, test_data, params: dict, file_path: str = ONNX_PATH) -> dict:
+    """Export the forest and check it against sklearn on the test split."""
+    try:
+        onnx_params = params.get('onnx', {})
+        X_test, _ = split_target(test_data)
+        export_onnx(rf_model, list(X_test.columns), file_path, onnx_params.get('target_opset', 17))
+        report = check_parity(rf_model, OnnxRegressor(file_path), X_test, onnx_params.get('tolerance', 1e-4))
+        logging.info('ONNX parity on %d rows: max |diff| %.3g', report['rows'], report['max_abs_diff'])
+        return report
+    except Exception as e:
+        logging.error('ONNX export failed: %s', e)
+        raise
+
+
+def save_report(report: dict, file_path: str = PARITY_PATH) -> None:
+    with open(file_path, 'w') as file:
+        json.dump(report, file, indent=4)
+
+
+def main():
+    try:
+        with stage('onnx_export'):
+            params = load_params('params.yaml')
+            rf_model = load_model('./models/rf_model.pkl')
+            test_data = load_matrix('./data/processed/test')
+
+            report = export_and_verify(rf_model, test_data, params)
+            save_report(report)
+        save_stage('onnx_export')
+    except Exception as e:
+        logging.error('Failed to complete the ONNX export: %s', e)
+        raise
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
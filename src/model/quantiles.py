@@ -0,0 +1,112 @@
+"""Quantile regression forest predictions from precomputed leaf sketches.
+
+A quantile regression forest (Meinshausen, 2006) predicts the conditional
+distribution of y at x as the average over trees of the empirical
+distribution of the training targets in the leaf x falls into. Instead of
+keeping every training row per leaf, LeafQuantiles stores a sketch of at
+most `sketch_size` targets per leaf: all of them (weight 1/n each) when
+the leaf is small, otherwise its n-quantiles at the midpoints
+(k + 0.5) / sketch_size (weight 1/sketch_size each). Sketch values are
+stored as ranks into the sorted distinct training targets, so combining
+a row's leaves is one bincount over (trees x sketch_size) ranks followed
+by a cumulative sum; no training data is needed at inference.
+"""
+import numpy as np
+
+SKETCH_SIZE = 32
+
+# Upper bound on the quantiles served per request, which keeps the work
+# per row fixed at one cumulative distribution and MAX_QUANTILES lookups.
+MAX_QUANTILES = 9
+
+# Rows combined per bincount, which bounds the scratch arrays at
+# CHUNK_ROWS * n_trees * SKETCH_SIZE atoms (2M for 1000 trees).
+CHUNK_ROWS = 64
+
+
+def parse_quantiles(text: str) -> np.ndarray:
+    """'0.1,0.5,0.9' -> array([0.1, 0.5, 0.9]); raises ValueError for bad input."""
+    quantiles = np.array([float(item) for item in text.split(",") if item.strip()])
+    if not 0 < len(quantiles) <= MAX_QUANTILES:
+        raise ValueError(f"Between 1 and {MAX_QUANTILES} quantiles are supported")
+    if np.any((quantiles <= 0) | (quantiles >= 1)):
+        raise ValueError("Quantiles must be strictly between 0 and 1")
+    return quantiles
+
+
+class LeafQuantiles:
+    """Per-leaf target sketches for a fitted RandomForestRegressor.
+
+    Built once after training and pickled with the model as
+    `leaf_quantiles_`; `predict(model, X, quantiles)` returns the point
+    prediction and the requested quantiles from a single `model.apply`.
+    """
+
+    def __init__(self, model, X, y, sketch_size: int = SKETCH_SIZE):
+        trees = [e.tree_ for e in model.estimators_]
+        self.n_trees = len(trees)
+        self.sketch_size = sketch_size
+        self.values, codes = np.unique(np.asarray(y, dtype=float), return_inverse=True)
+        node_counts = np.array([tree.node_count for tree in trees])
+        self.node_offset = np.concatenate([[0], np.cumsum(node_counts)[:-1]])
+        self.node_value = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+
+        # Global node id of every (row, tree) pair, sorted by node and then target
+        nodes = (model.apply(X) + self.node_offset).ravel()
+        codes = np.repeat(codes, self.n_trees)
+        order = np.lexsort((codes, nodes))
+        nodes, codes = nodes[order], codes[order]
+        used, starts, counts = np.unique(nodes, return_index=True, return_counts=True)
+
+        k = np.arange(sketch_size)
+        small = counts[:, None] <= sketch_size
+        position = np.where(small, k, ((k + 0.5) * counts[:, None] / sketch_size).astype(np.int64))
+        valid = k < np.minimum(counts, sketch_size)[:, None]
+        rank_dtype = np.uint16 if len(self.values) <= np.iinfo(np.uint16).max else np.int32
+        # One extra all-zero sketch for leaves no training row reached
+        self.ranks = np.zeros((len(used) + 1, sketch_size), dtype=rank_dtype)
+        self.weights = np.zeros((len(used) + 1, sketch_size), dtype=np.float32)
+        self.ranks[:-1] = np.where(valid, codes[starts[:, None] + np.where(valid, position, 0)], 0)
+        self.weights[:-1] = np.where(valid, 1.0 / np.minimum(counts, sketch_size)[:, None], 0.0)
+        self.node_sketch = np.full(int(node_counts.sum()), len(used), dtype=np.int32)
+        self.node_sketch[used] = np.arange(len(used))
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ranks.nbytes + self.weights.nbytes + self.node_sketch.nbytes
+                   + self.node_value.nbytes + self.values.nbytes)
+
+    def predict(self, model, X, quantiles) -> tuple:
+        """(point prediction, (n_rows, n_quantiles) quantiles), both on the target scale."""
+        quantiles = np.asarray(quantiles, dtype=float)
+        nodes = model.apply(X) + self.node_offset
+        # Summed tree by tree, in the same order as RandomForestRegressor.predict
+        point = np.cumsum(self.node_value[nodes], axis=1)[:, -1] / self.n_trees
+
+        result = np.empty((len(nodes), len(quantiles)))
+        for start in range(0, len(nodes), CHUNK_ROWS):
+            result[start:start + CHUNK_ROWS] = self._quantiles(nodes[start:start + CHUNK_ROWS], quantiles)
+        return point, result
+
+    def _quantiles(self, nodes: np.ndarray, quantiles: np.ndarray) -> np.ndarray:
+        n_rows, n_values = len(nodes), len(self.values)
+        sketches = self.node_sketch[nodes]
+        index = self.ranks[sketches].astype(np.intp)
+        index += (np.arange(n_rows) * n_values)[:, None, None]
+        mass = np.bincount(index.ravel(), self.weights[sketches].ravel(), minlength=n_rows * n_values)
+        cdf = np.cumsum(mass.reshape(n_rows, n_values), axis=1)
+        cdf /= cdf[:, -1:]
+        # Rows are laid end to end as r + F_r, which keeps the flat array sorted,
+        # so one searchsorted finds the smallest value with F_r >= q for every row
+        flat = (cdf + np.arange(n_rows)[:, None]).ravel()
+        targets = np.arange(n_rows)[:, None] + quantiles
+        position = np.searchsorted(flat, targets.ravel()).reshape(targets.shape)
+        position = np.minimum(position - np.arange(n_rows)[:, None] * n_values, n_values - 1)
+        return self.values[position]
+
+
+def interval_coverage(model, X, y, lower: float = 0.1, upper: float = 0.9) -> float:
+    """Share of rows whose target falls inside the [lower, upper] quantile interval."""
+    _, bounds = model.leaf_quantiles_.predict(model, X, [lower, upper])
+    y = np.asarray(y, dtype=float)
+    return float(np.mean((y >= bounds[:, 0]) & (y <= bounds[:, 1])))
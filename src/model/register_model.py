@@ -1,22 +1,26 @@
 import json
-import mlflow
 import logging
-from src.logger import logging
+from src.logger import logging, configure_logger
 import os
-import dagshub
 from src.utils import load_model_info
 
 import warnings
 warnings.simplefilter("ignore", UserWarning)
 warnings.filterwarnings("ignore")
 
-dagshub.init(repo_owner='shashi-hue', repo_name='Mlops-Forward-Customer-Value', mlflow=True)
+
+def setup_tracking() -> None:
+    """Connect MLflow to the DagsHub registry (only when registering)."""
+    import dagshub
+    dagshub.init(repo_owner='shashi-hue', repo_name='Mlops-Forward-Customer-Value', mlflow=True)
 
 
 def register_model(model_name: str, model_info: dict, alias: str = "candidate"):
     """
     Register a model in MLflow Model Registry and assign an alias.
     """
+    import mlflow
+
     try:
         model_uri = f"runs:/{model_info['run_id']}/{model_info['model_path']}"
 
@@ -52,6 +56,8 @@ def main():
         model_info_path = 'reports/experiment_info.json'
         model_info = load_model_info(model_info_path)
 
+        setup_tracking()
+
         model_name = "my_model"
         register_model(model_name, model_info, alias="candidate")
 
@@ -61,4 +67,5 @@ def main():
 
 
 if __name__ == '__main__':
+    configure_logger()
     main()
\ No newline at end of file
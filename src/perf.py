@@ -0,0 +1,168 @@
+import contextvars
+import glob
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from src.logger import logging, configure_logger
+
+PERF_DIR = 'reports/perf'
+PERF_PATH = 'reports/perf.json'
+
+# RSS is sampled this often while a tracked block is open
+RSS_SAMPLE_INTERVAL = 0.01
+
+_records = {}
+_lock = threading.Lock()
+_current_stage = contextvars.ContextVar('perf_stage', default=None)
+
+_windows = {}
+_rss_lock = threading.Lock()
+_sampler = None
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def rss_mb():
+    """Current resident set size of this process in MB, or None without /proc (e.g. macOS)."""
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def _sample_rss() -> None:
+    global _sampler
+    while True:
+        with _rss_lock:
+            if not _windows:
+                _sampler = None
+                return
+            rss = rss_mb()
+            for window in _windows.values():
+                window[1] = max(window[1], rss)
+        time.sleep(RSS_SAMPLE_INTERVAL)
+
+
+def _open_window():
+    """Start following the RSS for one block: [RSS at start, peak so far]."""
+    global _sampler
+    rss = rss_mb()
+    if rss is None:
+        return None
+    window = [rss, rss]
+    with _rss_lock:
+        _windows[id(window)] = window
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_rss, name='perf-rss', daemon=True)
+            _sampler.start()
+    return window
+
+
+def _close_window(window):
+    if window is not None:
+        with _rss_lock:
+            del _windows[id(window)]
+            window[1] = max(window[1], rss_mb())
+    return window
+
+
+def _record(stage: str, name: str, wall: float, cpu: float, window) -> None:
+    with _lock:
+        entry = _records.setdefault(stage, {'steps': {}})
+        if name != stage:
+            entry = entry['steps'].setdefault(name, {})
+        entry['calls'] = entry.get('calls', 0) + 1
+        entry['wall_s'] = round(entry.get('wall_s', 0.0) + wall, 4)
+        entry['cpu_s'] = round(entry.get('cpu_s', 0.0) + cpu, 4)
+        if window is None:
+            # Not measurable per block here, so this is the peak of the whole process
+            entry['process_peak_rss_mb'] = round(max(entry.get('process_peak_rss_mb', 0.0), peak_rss_mb()), 1)
+        else:
+            start, peak = window
+            entry['peak_rss_mb'] = round(max(entry.get('peak_rss_mb', 0.0), peak), 1)
+            entry['rss_growth_mb'] = round(max(entry.get('rss_growth_mb', 0.0), peak - start), 1)
+
+
+@contextmanager
+def track(name: str, stage: str = None):
+    """Record wall time, CPU time and RSS of a block (or, as a decorator, a function).
+
+    Steps are attributed to `stage`, or to the enclosing `stage()` block.
+    The RSS is sampled while the block runs: `peak_rss_mb` is its highest
+    value and `rss_growth_mb` how far that is above the RSS at the start.
+    CPU time and RSS are process-wide, so they include other threads running
+    at the same time. Without /proc only `process_peak_rss_mb`, the peak of
+    the whole process so far, is recorded.
+    """
+    stage = stage or _current_stage.get() or name
+    wall, cpu = time.perf_counter(), time.process_time()
+    window = _open_window()
+    try:
+        yield
+    finally:
+        _record(stage, name, time.perf_counter() - wall, time.process_time() - cpu, _close_window(window))
+
+
+@contextmanager
+def stage(name: str):
+    """Track a pipeline stage; `track()` blocks inside it become its steps."""
+    token = _current_stage.set(name)
+    try:
+        with track(name, name):
+            yield
+    finally:
+        _current_stage.reset(token)
+
+
+def get_records() -> dict:
+    with _lock:
+        return json.loads(json.dumps(_records))
+
+
+def save_stage(name: str, perf_dir: str = PERF_DIR) -> None:
+    """Write one stage's measurements to reports/perf/<stage>.json."""
+    try:
+        os.makedirs(perf_dir, exist_ok=True)
+        file_path = os.path.join(perf_dir, f'{name}.json')
+        with open(file_path, 'w') as file:
+            json.dump(get_records().get(name, {}), file, indent=4)
+        logging.info('Perf metrics saved to %s', file_path)
+    except Exception as e:
+        logging.error('Error occurred while saving perf metrics: %s', e)
+        raise
+
+
+def merge(perf_dir: str = PERF_DIR, file_path: str = PERF_PATH) -> dict:
+    """Combine the per-stage files into the reports/perf.json DVC metric."""
+    report = {}
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    for stage_path in sorted(glob.glob(os.path.join(perf_dir, '*.json'))):
+        with open(stage_path, 'r') as file:
+            report[os.path.splitext(os.path.basename(stage_path))[0]] = json.load(file)
+    with open(file_path, 'w') as file:
+        json.dump(report, file, indent=4)
+    logging.info('Perf report saved to %s', file_path)
+    return report
+
+
+def main():
+    try:
+        merge()
+    except Exception as e:
+        logging.error('Failed to build the perf report: %s', e)
+        raise
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
@@ -0,0 +1,417 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional
+
+import pandas as pd
+from src.logger import logging, configure_logger
+from src.utils import load_params, load_data, load_matrix, load_model, split_target
+from src import perf
+
+STATE_PATH = '.pipeline_state.json'
+PARAMS_PATH = 'params.yaml'
+
+# MLflow keeps the active run in one process-wide stack, so stages that log
+# from parallel threads (distillation, model_evaluation) take turns.
+_mlflow_lock = threading.Lock()
+
+
+@dataclass
+class Stage:
+    """One node of the pipeline DAG.
+
+    `run` receives the upstream outputs (keyed by stage name) and the loaded
+    params and returns this stage's output. `module` is the stage's source
+    file and is part of its cache key. `save` persists the output to the DVC
+    outs listed in `outs`, `load` reads it back when the stage is skipped.
+    `param_deps` are upstream stages that are only needed for some params:
+    each maps to a predicate on the params and is a dep when it holds.
+    """
+    name: str
+    run: Callable
+    module: str = ''
+    deps: list = field(default_factory=list)
+    param_deps: dict = field(default_factory=dict)
+    files: list = field(default_factory=list)
+    params: list = field(default_factory=list)
+    outs: list = field(default_factory=list)
+    save: Optional[Callable] = None
+    load: Optional[Callable] = None
+    intermediate: bool = False
+
+
+def _ingest(inputs, params):
+    from src.data.data_ingestion import DATA_PATH
+    return load_data(DATA_PATH)
+
+def _save_raw(df):
+    from src.data.data_ingestion import save_data
+    save_data(df, './data')
+
+def _preprocess(inputs, params):
+    from src.data.data_preprocessing import preprocessing
+    return preprocessing(inputs['data_ingestion'])
+
+def _save_interim(df):
+    from src.data.data_preprocessing import save_data
+    save_data(df, './data')
+
+def _engineer(inputs, params):
+    from src.features.feature_engineering import build_features, split_data
+    backend = params['feature_engineering'].get('backend', 'pandas')
+    df_engineered = build_features(inputs['data_preprocessing'], backend)
+    return split_data(df_engineered, params['feature_engineering']['test_size'])
+
+def _save_processed(splits):
+    from src.features.feature_engineering import save_data, save_matrix, save_reference_profile
+    train_df, test_df = splits
+    save_data(train_df, os.path.join("./data", "processed", "train_data.csv"))
+    save_data(test_df, os.path.join("./data", "processed", "test_data.csv"))
+    save_matrix(train_df, os.path.join("./data", "processed", "train"))
+    save_matrix(test_df, os.path.join("./data", "processed", "test"))
+    save_reference_profile(train_df)
+
+def _load_processed():
+    # (X, y) matrices mapped from disk; downstream stages take either form via split_target
+    return load_matrix('./data/processed/train'), load_matrix('./data/processed/test')
+
+def _train(inputs, params):
+    from src.model.model_building import model_traing
+    train_data, _ = inputs['feature_engineering']
+    X_train, y_train = split_target(train_data)
+    return model_traing(X_train, y_train, params)
+
+def _save_model(model):
+    from src.model.model_building import save_model
+    save_model(model, 'models/rf_model.pkl')
+
+@contextmanager
+def _tracked_run(**kwargs):
+    """An MLflow run in the "pipeline" experiment, holding the MLflow lock until it ends."""
+    import mlflow
+    from src.model.model_evaluation import setup_tracking
+    with _mlflow_lock:
+        setup_tracking()
+        mlflow.set_experiment("pipeline")
+        with mlflow.start_run(**kwargs) as run:
+            yield run
+
+def _distill(inputs, params):
+    from src.model.distillation import distill_model, evaluate_surrogate, log_surrogate, save_model, save_metrics
+    train_data, test_data = inputs['feature_engineering']
+    teacher = inputs['model_building']
+
+    student = distill_model(teacher, split_target(train_data)[0], params)
+    metrics = evaluate_surrogate(student, teacher, test_data)
+    save_model(student)
+    save_metrics(metrics)
+
+    with _tracked_run(run_name="surrogate"):
+        log_surrogate(student, metrics)
+    return student
+
+def _export_onnx(inputs, params):
+    from src.model.onnx_model import export_and_verify, save_report
+    _, test_df = inputs['feature_engineering']
+    report = export_and_verify(inputs['model_building'], test_df, params)
+    save_report(report)
+    return report
+
+def _load_parity():
+    from src.model.onnx_model import PARITY_PATH
+    with open(PARITY_PATH, 'r') as file:
+        return json.load(file)
+
+def _evaluate(inputs, params):
+    from src.model.model_evaluation import diagnose_model, evaluate_model, log_run, save_metrics, save_prediction_profile
+    from src.serving.drift import PREDICTION_PROFILE_PATH
+    _, test_df = inputs['feature_engineering']
+    rf_model = inputs['model_building']
+
+    metrics = evaluate_model(rf_model, test_df)
+    importance, segments = diagnose_model(rf_model, test_df, params)
+    save_metrics(metrics, 'reports/metrics.json')
+    save_metrics(importance, 'reports/permutation_importance.json')
+    save_metrics(segments, 'reports/segment_metrics.json')
+    save_prediction_profile(rf_model, test_df)
+
+    with _tracked_run():
+        log_run(rf_model, metrics, 'reports/metrics.json',
+                ('reports/permutation_importance.json', 'reports/segment_metrics.json', PREDICTION_PROFILE_PATH))
+    return metrics
+
+def _score(inputs, params):
+    from src.features.feature_engineering import build_snapshot
+    from src.model.batch_scoring import score_customers
+    backend = params['feature_engineering'].get('backend', 'pandas')
+    snapshot = build_snapshot(inputs['data_preprocessing'].copy(), backend)
+    runtime = params.get('batch_scoring', {}).get('runtime', 'sklearn')
+    return score_customers(inputs['model_building'], snapshot, runtime=runtime)
+
+
+# Mirrors the stages in dvc.yaml. Stage outputs are handed to downstream
+# stages in memory; `outs` are only written so that DVC sees the artifacts.
+STAGES = [
+    Stage('data_ingestion', _ingest, 'src/data/data_ingestion.py',
+          files=['notebooks/retail-data.csv'],
+          outs=['data/raw/data.csv'],
+          save=_save_raw, load=lambda: load_data('./data/raw/data.csv'),
+          intermediate=True),
+    Stage('data_preprocessing', _preprocess, 'src/data/data_preprocessing.py',
+          deps=['data_ingestion'],
+          outs=['data/interim/data.csv'],
+          save=_save_interim, load=lambda: load_data('./data/interim/data.csv'),
+          intermediate=True),
+    Stage('feature_engineering', _engineer, 'src/features/feature_engineering.py',
+          deps=['data_preprocessing'],
+          files=['src/features/aggregation.py', 'src/features/sql_features.py', 'src/serving/drift.py'],
+          params=['feature_engineering'],
+          outs=['data/processed/train_data.csv', 'data/processed/test_data.csv',
+                'data/processed/train_X.npy', 'data/processed/train_y.npy', 'data/processed/train_matrix.json',
+                'data/processed/test_X.npy', 'data/processed/test_y.npy', 'data/processed/test_matrix.json',
+                'data/processed/reference_profile.json'],
+          save=_save_processed, load=_load_processed),
+    Stage('model_building', _train, 'src/model/model_building.py',
+          deps=['feature_engineering'],
+          files=['src/model/quantiles.py'],
+          params=['random_forest'],
+          outs=['models/rf_model.pkl'],
+          save=_save_model, load=lambda: load_model('models/rf_model.pkl')),
+    Stage('distillation', _distill, 'src/model/distillation.py',
+          deps=['feature_engineering', 'model_building'],
+          params=['distillation'],
+          outs=['models/surrogate_model.pkl', 'reports/surrogate_metrics.json']),
+    Stage('onnx_export', _export_onnx, 'src/model/onnx_model.py',
+          deps=['feature_engineering', 'model_building'],
+          params=['onnx'],
+          outs=['models/rf_model.onnx', 'reports/onnx_parity.json'],
+          load=_load_parity),
+    Stage('model_evaluation', _evaluate, 'src/model/model_evaluation.py',
+          deps=['feature_engineering', 'model_building'],
+          files=['src/model/diagnostics.py', 'src/serving/drift.py'],
+          params=['model_evaluation'],
+          outs=['reports/metrics.json', 'reports/permutation_importance.json',
+                'reports/segment_metrics.json', 'models/prediction_profile.json']),
+    Stage('batch_scoring', _score, 'src/model/batch_scoring.py',
+          deps=['data_preprocessing', 'model_building'],
+          param_deps={'onnx_export': lambda params: params.get('batch_scoring', {}).get('runtime') == 'onnx'},
+          files=['src/features/feature_engineering.py', 'src/features/aggregation.py',
+                 'src/model/diagnostics.py', 'src/serving/inference.py', 'src/serving/prediction_store.py',
+                 'src/serving/ranking.py'],
+          params=['feature_engineering', 'batch_scoring'],
+          outs=['models/predictions.sqlite', 'models/ranking.npz']),
+]
+
+
+def load_state(file_path: str) -> dict:
+    """Load the runner state (stage keys and cached file digests)."""
+    if not os.path.exists(file_path):
+        return {'stages': {}, 'files': {}}
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+def save_state(state: dict, file_path: str) -> None:
+    """Write the runner state atomically."""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file, indent=4)
+    os.replace(tmp_path, file_path)
+
+def file_digest(file_path: str, state: dict) -> str:
+    """md5 of a file, reusing the cached digest while size and mtime match."""
+    if not os.path.exists(file_path):
+        return 'missing'
+    stat = os.stat(file_path)
+    cached = state['files'].get(file_path)
+    if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+        return cached['md5']
+
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            md5.update(chunk)
+    state['files'][file_path] = {
+        'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'md5': md5.hexdigest()
+    }
+    return md5.hexdigest()
+
+def stage_keys(stages: list, params: dict, state: dict) -> dict:
+    """Content hash per stage: code + params + input files + upstream keys."""
+    keys = {}
+    for stage in stages:
+        digest = hashlib.sha256(stage.name.encode())
+        digest.update(file_digest(stage.module, state).encode())
+        for key in stage.params:
+            digest.update(json.dumps(params.get(key), sort_keys=True).encode())
+        for path in stage.files:
+            digest.update(file_digest(path, state).encode())
+        for dep in stage.deps:
+            digest.update(keys[dep].encode())
+        keys[stage.name] = digest.hexdigest()
+    return keys
+
+def resolve_deps(stages: list, params: dict) -> list:
+    """The stages with the `param_deps` that hold for `params` added to their deps."""
+    return [replace(stage, deps=stage.deps + [dep for dep, needed in stage.param_deps.items() if needed(params)])
+            if stage.param_deps else stage for stage in stages]
+
+def plan(stages: list, keys: dict, state: dict, persist_intermediate: bool = True) -> set:
+    """Return the names of the stages that have to run.
+
+    A stage runs when its key changed or its outs are missing. A skipped
+    upstream stage is pulled back in when a running stage needs its output
+    and it cannot be loaded from disk.
+    """
+    by_name = {stage.name: stage for stage in stages}
+
+    def on_disk(stage):
+        return all(os.path.exists(path) for path in stage.outs)
+
+    def persisted(stage):
+        return persist_intermediate or not stage.intermediate
+
+    to_run = set()
+    for stage in stages:
+        stale = state['stages'].get(stage.name) != keys[stage.name]
+        if stale or (persisted(stage) and not on_disk(stage)):
+            to_run.add(stage.name)
+
+    changed = True
+    while changed:
+        changed = False
+        for name in list(to_run):
+            for dep in by_name[name].deps:
+                if dep not in to_run and not (by_name[dep].load and on_disk(by_name[dep])):
+                    to_run.add(dep)
+                    changed = True
+    return to_run
+
+
+class PipelineRunner:
+    """Run the pipeline stages as a DAG inside one process.
+
+    Stages whose dependencies are satisfied run concurrently on a thread pool,
+    and writing a stage's outs overlaps with the downstream stages that
+    consume the same output from memory.
+    """
+
+    def __init__(self, stages: list = None, params_path: str = PARAMS_PATH,
+                 state_path: str = STATE_PATH, max_workers: int = 4,
+                 persist_intermediate: bool = True):
+        self.stages = stages or STAGES
+        self.by_name = {stage.name: stage for stage in self.stages}
+        self.params_path = params_path
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.persist_intermediate = persist_intermediate
+        self.outputs = {}
+        self._lock = threading.Lock()
+
+    def _input(self, name: str):
+        """Upstream output from memory, falling back to the persisted outs."""
+        with self._lock:
+            if name not in self.outputs:
+                logging.info("Loading output of skipped stage '%s' from disk", name)
+                self.outputs[name] = self.by_name[name].load()
+            value = self.outputs[name]
+        # Shallow copies keep column assignments in a consumer from leaking
+        # into the frame another thread is still writing to disk.
+        if isinstance(value, pd.DataFrame):
+            return value.copy(deep=False)
+        if isinstance(value, tuple):
+            return tuple(v.copy(deep=False) if isinstance(v, pd.DataFrame) else v for v in value)
+        return value
+
+    def _run_stage(self, stage: Stage, params: dict):
+        inputs = {dep: self._input(dep) for dep in stage.deps}
+        logging.info("Running stage '%s'", stage.name)
+        with perf.stage(stage.name):
+            output = stage.run(inputs, params)
+        with self._lock:
+            self.outputs[stage.name] = output
+        return output
+
+    def _save_stage(self, stage: Stage, output) -> None:
+        with perf.track('save_outs', stage.name):
+            stage.save(output)
+
+    def run(self, until: str = None) -> dict:
+        """Run every stale stage (up to and including `until`)."""
+        params = load_params(self.params_path)
+        state = load_state(self.state_path)
+
+        stages = resolve_deps(self.stages, params)
+        if until:
+            names = [stage.name for stage in stages]
+            stages = stages[:names.index(until) + 1]
+
+        keys = stage_keys(stages, params, state)
+        to_run = plan(stages, keys, state, self.persist_intermediate)
+        for stage in stages:
+            if stage.name not in to_run:
+                logging.info("Stage '%s' is up to date, skipping", stage.name)
+
+        done, running, saves = set(), {}, {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while len(done) < len(to_run):
+                for stage in stages:
+                    if stage.name in to_run and stage.name not in done and stage.name not in running \
+                            and all(dep in done or dep not in to_run for dep in stage.deps):
+                        running[stage.name] = pool.submit(self._run_stage, stage, params)
+
+                finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name, future in list(running.items()):
+                    if future not in finished:
+                        continue
+                    output = future.result()
+                    del running[name]
+                    done.add(name)
+
+                    stage = self.by_name[name]
+                    if stage.save and (self.persist_intermediate or not stage.intermediate):
+                        saves[name] = pool.submit(self._save_stage, stage, output)
+                    else:
+                        state['stages'][name] = keys[name]
+
+            for name, future in saves.items():
+                future.result()
+                state['stages'][name] = keys[name]
+
+        save_state(state, self.state_path)
+        for name in done:
+            perf.save_stage(name)
+        perf.merge()
+        logging.info("Pipeline finished, ran stages: %s", sorted(done))
+        return {name: self.outputs[name] for name in done}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the DVC pipeline stages in one process.")
+    parser.add_argument('--until', choices=[stage.name for stage in STAGES],
+                        help="Stop after this stage.")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="Threads used for concurrent stages and writes.")
+    parser.add_argument('--no-intermediate', action='store_true',
+                        help="Do not write data/raw and data/interim.")
+    parser.add_argument('--force', action='store_true',
+                        help="Ignore the stage cache and rerun everything.")
+    args = parser.parse_args()
+
+    try:
+        if args.force and os.path.exists(STATE_PATH):
+            os.remove(STATE_PATH)
+        runner = PipelineRunner(max_workers=args.workers,
+                                persist_intermediate=not args.no_intermediate)
+        runner.run(until=args.until)
+    except Exception as e:
+        logging.error("Pipeline run failed: %s", e)
+        raise
+
+if __name__ == '__main__':
+    configure_logger()
+    main()
@@ -0,0 +1,189 @@
+"""Admission control for the prediction endpoints of one worker.
+
+Requests are split into two lanes by size. Interactive requests (at most
+`batch_rows` rows) are predicted in one piece. Batch requests are
+predicted in chunks of `chunk_rows`, and each chunk waits while an
+interactive request is queued or running, so a large batch delays a small
+request by one chunk at most and does not compete with it for the CPU.
+A chunk that has yielded for `batch_yield` seconds goes ahead anyway, so
+batches keep a share of the worker under steady interactive load. At most `max_rows` rows are
+predicted at once, and at most `max_batches` batch requests are admitted.
+
+The controller keeps running estimates of the fixed cost of a prediction
+and its cost per row. A request is rejected before any work is done in
+three cases:
+
+* 503 when `max_queue` requests are already waiting;
+* 503 when an interactive request's expected wait is over `max_wait`;
+* 429 when the batch lane is full.
+
+Both responses carry a Retry-After header. A request whose chunk is still
+queued after `queue_timeout` seconds is also shed with 503.
+"""
+import math
+import threading
+import time
+import numpy as np
+
+# Weight of the newest observation in the cost estimates
+COST_SMOOTHING = 0.1
+
+
+class Rejected(Exception):
+    """A request shed by admission control; maps to an HTTP error with Retry-After."""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(f"Server busy ({reason}), retry after {math.ceil(retry_after)}s")
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """Caps rows in flight per worker and gives small requests priority over batches.
+
+    `on_shed(reason)` and `on_wait(lane, seconds)` are called for every
+    rejected request and every admitted chunk, `on_rows(rows)` whenever the
+    rows in flight change; the app points them at Prometheus metrics.
+    """
+
+    def __init__(self, max_rows: int = 5000, batch_rows: int = 1000, chunk_rows: int = 250,
+                 max_batches: int = 1, max_queue: int = 64, max_wait: float = 5.0,
+                 batch_yield: float = 0.25, queue_timeout: float = 30.0, on_shed=None, on_wait=None, on_rows=None):
+        self.max_rows = max_rows
+        self.batch_rows = batch_rows
+        self.chunk_rows = chunk_rows
+        self.max_batches = max_batches
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.batch_yield = batch_yield
+        self.queue_timeout = queue_timeout
+        self.on_shed = on_shed
+        self.on_wait = on_wait
+        self.on_rows = on_rows
+
+        # Seconds per prediction call and per row; refined from observed chunks
+        self.overhead = 0.05
+        self.per_row = 0.0005
+
+        self._cond = threading.Condition()
+        self._rows_in_flight = 0
+        self._cost_in_flight = 0.0
+        self._waiting = {"interactive": 0, "batch": 0}
+        self._running = {"interactive": 0, "batch": 0}
+        self._queued_cost = {"interactive": 0.0, "batch": 0.0}
+        self._batches = 0
+        self._batch_cost = 0.0
+
+    def cost(self, rows: int, chunks: int = 1) -> float:
+        return chunks * self.overhead + rows * self.per_row
+
+    def predict(self, X, predict_fn):
+        """Run `predict_fn` on `X` under admission control.
+
+        Batches are split into chunks; the chunk results are concatenated
+        (element-wise when `predict_fn` returns a tuple of arrays). Raises
+        Rejected when the request is shed.
+        """
+        rows = len(X)
+        if rows <= self.batch_rows:
+            self._admit(rows, "interactive")
+            return self._run_chunk(X, predict_fn, "interactive")
+
+        # Work this batch still has to do, counted in the Retry-After of other batches
+        remaining = self._admit(rows, "batch")
+        try:
+            parts = []
+            for start in range(0, rows, self.chunk_rows):
+                chunk = X.iloc[start:start + self.chunk_rows]
+                parts.append(self._run_chunk(chunk, predict_fn, "batch"))
+                with self._cond:
+                    done = min(remaining, self.cost(len(chunk)))
+                    self._batch_cost -= done
+                    remaining -= done
+            if isinstance(parts[0], tuple):
+                return tuple(np.concatenate(column) for column in zip(*parts))
+            return np.concatenate(parts)
+        finally:
+            with self._cond:
+                self._batches -= 1
+                self._batch_cost -= remaining
+                self._cond.notify_all()
+
+    def _shed(self, status: int, reason: str, retry_after: float):
+        if self.on_shed is not None:
+            self.on_shed(reason)
+        raise Rejected(status, reason, retry_after)
+
+    def _admit(self, rows: int, lane: str) -> float:
+        with self._cond:
+            waiting = self._waiting["interactive"] + self._waiting["batch"]
+            ahead = self._cost_in_flight + self._queued_cost["interactive"]
+            if waiting >= self.max_queue:
+                self._shed(503, "queue_full", ahead)
+            if lane == "interactive" and ahead > self.max_wait:
+                self._shed(503, "expected_wait", ahead)
+            if lane == "batch":
+                if self._batches >= self.max_batches:
+                    self._shed(429, "batch_lane_full", self._batch_cost + ahead)
+                planned = self.cost(rows, math.ceil(rows / self.chunk_rows))
+                self._batches += 1
+                self._batch_cost += planned
+                return planned
+            return self.cost(rows)
+
+    def _run_chunk(self, X, predict_fn, lane: str):
+        rows = len(X)
+        cost = self.cost(rows)
+        with self._cond:
+            self._waiting[lane] += 1
+            self._queued_cost[lane] += cost
+            queued_at = time.monotonic()
+            try:
+                while not self._may_start(rows, lane, time.monotonic() - queued_at):
+                    remaining = self.queue_timeout - (time.monotonic() - queued_at)
+                    if remaining <= 0:
+                        self._shed(503, "queue_timeout", self._cost_in_flight)
+                    # Batch chunks re-check when they have yielded long enough
+                    self._cond.wait(min(remaining, self.batch_yield) if lane == "batch" else remaining)
+            finally:
+                self._waiting[lane] -= 1
+                self._queued_cost[lane] -= cost
+            self._rows_in_flight += rows
+            self._cost_in_flight += cost
+            self._running[lane] += 1
+            self._report_rows()
+        waited = time.monotonic() - queued_at
+        if self.on_wait is not None:
+            self.on_wait(lane, waited)
+
+        start = time.perf_counter()
+        try:
+            return predict_fn(X)
+        finally:
+            self._finish(rows, cost, lane, time.perf_counter() - start)
+
+    def _may_start(self, rows: int, lane: str, waited: float) -> bool:
+        fits = self._rows_in_flight == 0 or self._rows_in_flight + rows <= self.max_rows
+        busy = self._waiting["interactive"] + self._running["interactive"]
+        if lane == "batch" and busy and waited < self.batch_yield:
+            return False
+        return fits
+
+    def _report_rows(self) -> None:
+        if self.on_rows is not None:
+            self.on_rows(self._rows_in_flight)
+
+    def _finish(self, rows: int, cost: float, lane: str, seconds: float) -> None:
+        with self._cond:
+            self._rows_in_flight -= rows
+            self._cost_in_flight -= cost
+            self._running[lane] -= 1
+            self._report_rows()
+            if rows <= self.batch_rows // 10:
+                overhead = max(0.0, seconds - rows * self.per_row)
+                self.overhead += COST_SMOOTHING * (overhead - self.overhead)
+            else:
+                per_row = max(0.0, seconds - self.overhead) / rows
+                self.per_row += COST_SMOOTHING * (per_row - self.per_row)
+            self._cond.notify_all()
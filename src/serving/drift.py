@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import numpy as np
+
+REFERENCE_PATH = os.path.join("data", "processed", "reference_profile.json")
+PREDICTION_PROFILE_PATH = os.path.join("models", "prediction_profile.json")
+PREDICTION = "prediction"
+
+# Proportions are floored at EPS so that an empty bin gives a large but
+# finite PSI term instead of inf.
+EPS = 1e-4
+
+# Batches up to this many rows are binned with a single broadcast comparison,
+# which beats nine separate searchsorted calls when per-call overhead dominates.
+SMALL_BATCH = 16
+
+
+def build_profile(df, features: list, predictions=None, n_bins: int = 20) -> dict:
+    """Fixed-bin reference histograms for `features` (and the model's predictions).
+
+    Bin edges are the training quantiles, so every bin holds about the same
+    share of training rows; features with few distinct values (e.g.
+    is_onetime_buyer) collapse to one bin per value. `predictions` are the
+    model's log-scale predictions for the rows of `df`, the reference for
+    live predictions. NaN values are left out.
+    """
+    columns = {name: df[name].to_numpy(dtype=float) for name in features}
+    if predictions is not None:
+        columns[PREDICTION] = np.asarray(predictions, dtype=float)
+
+    profile = {"rows": int(len(df)), "features": {}}
+    for name, values in columns.items():
+        values = values[~np.isnan(values)]
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+        profile["features"][name] = {
+            "edges": edges.tolist(),
+            "reference": (counts / max(counts.sum(), 1)).tolist(),
+        }
+    return profile
+
+
+def save_profile(profile: dict, file_path: str = REFERENCE_PATH) -> None:
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(file_path, "w") as file:
+        json.dump(profile, file, indent=4)
+
+
+def load_profile(file_path: str = REFERENCE_PATH) -> dict:
+    with open(file_path, "r") as file:
+        return json.load(file)
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Population stability index between two binned distributions."""
+    expected = np.maximum(expected, EPS)
+    actual = np.maximum(actual, EPS)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Kolmogorov-Smirnov distance evaluated at the bin edges."""
+    return float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual))))
+
+
+class DriftMonitor:
+    """Streaming histograms of live inputs and predictions against a reference profile.
+
+    Memory is fixed at one int64 counter per bin, kept in a single flat
+    array. `observe` bins a small batch with one broadcast comparison against
+    the padded edge matrix, larger batches with one searchsorted per feature,
+    followed by a single bincount either way; NaN values are not counted, as
+    in the reference. Counts are
+    halved whenever `window` rows have been seen since the last halving, so
+    scores follow recent traffic (about the last 2 * window rows) rather
+    than everything since the worker started. Scores are recomputed every
+    `publish_every` rows, not on every request.
+    """
+
+    def __init__(self, profile: dict, features: list, window: int = 10000,
+                 publish_every: int = 500, on_publish=None):
+        self.features = list(features)
+        self.names = self.features + ([PREDICTION] if PREDICTION in profile["features"] else [])
+        self.edges = [np.asarray(profile["features"][name]["edges"]) for name in self.names]
+        self.reference = [np.asarray(profile["features"][name]["reference"]) for name in self.names]
+        sizes = [len(ref) for ref in self.reference]
+        self.offsets = [int(o) for o in np.concatenate([[0], np.cumsum(sizes)[:-1]])]
+        # Edges padded with +inf to a (features, max_edges) matrix for the broadcast path
+        self._edge_matrix = np.full((len(self.edges), max(sizes) - 1), np.inf)
+        for row, edges in zip(self._edge_matrix, self.edges):
+            row[:len(edges)] = edges
+        self._flat = np.zeros(sum(sizes), dtype=np.int64)
+        # Per-feature views into the flat counter array
+        self.counts = [self._flat[o:o + n] for o, n in zip(self.offsets, sizes)]
+        self.window = window
+        self.publish_every = publish_every
+        self.on_publish = on_publish
+        self.rows = 0
+        self._since_halving = 0
+        self._since_publish = 0
+        self._lock = threading.Lock()
+
+    def observe(self, X, predictions) -> None:
+        """Add a batch of feature rows (columns in `features` order) and its log-scale predictions."""
+        # DataFrame.to_numpy is much cheaper than np.asarray(df) for one-row frames
+        X = X.to_numpy(dtype=float) if hasattr(X, "to_numpy") else np.asarray(X, dtype=float)
+        if len(self.names) > len(self.features):
+            X = np.column_stack([X, np.asarray(predictions, dtype=float)])
+
+        if len(X) <= SMALL_BATCH:
+            # Number of edges <= value, i.e. searchsorted(side="right")
+            bins = (X[:, :, None] >= self._edge_matrix).sum(axis=2) + self.offsets
+            missing = np.isnan(X)
+        else:
+            bins = np.stack([
+                edges.searchsorted(values, side="right") + offset
+                for edges, values, offset in zip(self.edges, X.T, self.offsets)
+            ])
+            missing = np.isnan(X.T)
+        # NaN goes to a spare slot past the last bin, which is dropped
+        bins[missing] = len(self._flat)
+        binned = np.bincount(bins.ravel(), minlength=len(self._flat) + 1)[:-1]
+        with self._lock:
+            self._flat += binned
+            self.rows += len(X)
+            self._since_halving += len(X)
+            self._since_publish += len(X)
+            if self._since_halving >= self.window:
+                self._flat //= 2
+                self._since_halving = 0
+            publish = self._since_publish >= self.publish_every
+            if publish:
+                self._since_publish = 0
+        if publish and self.on_publish is not None:
+            self.on_publish(self.scores())
+
+    def scores(self) -> dict:
+        """{name: (psi, ks)} for every tracked feature with at least one observation."""
+        with self._lock:
+            counts = [c.copy() for c in self.counts]
+        result = {}
+        for name, reference, current in zip(self.names, self.reference, counts):
+            total = current.sum()
+            if total:
+                actual = current / total
+                result[name] = (psi(reference, actual), ks(reference, actual))
+        return result
@@ -0,0 +1,156 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, multiprocess,
+)
+
+# Under gunicorn every worker is a separate process. When PROMETHEUS_MULTIPROC_DIR
+# is set (see flask_app/gunicorn.conf.py) each worker writes its samples to
+# mmap'd files in that directory and /metrics aggregates all of them, so the
+# answer no longer depends on which worker served the scrape.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# 100us .. 2min: single-row predictions are sub-millisecond per phase,
+# 100k-row batches take seconds.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+# |candidate - production| on the log1p scale; 0.1 is roughly a 10% difference in CLV
+DELTA_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+registry = CollectorRegistry()
+
+REQUEST_COUNT = Counter(
+    "app_request_count", "total number of requests to the app", ["method", "endpoint"], registry=registry)
+
+REQUEST_LATENCY = Histogram(
+    "app_request_latency_seconds", "Latency of requests in seconds", ["endpoint"],
+    buckets=LATENCY_BUCKETS, registry=registry)
+
+PHASE_LATENCY = Histogram(
+    "app_request_phase_seconds", "Latency of each request phase (decode, validate, predict, drift, encode)",
+    ["endpoint", "phase"], buckets=LATENCY_BUCKETS, registry=registry)
+
+BATCH_SIZE = Histogram(
+    "app_batch_size_rows", "Rows per prediction request", ["endpoint"],
+    buckets=BATCH_SIZE_BUCKETS, registry=registry)
+
+PREDICTION_ROWS = Counter(
+    "app_prediction_rows", "Rows answered from the prediction store (store), by the model (live) or by its surrogate",
+    ["source"], registry=registry)
+
+# Admission control (src/serving/admission.py)
+ADMISSION_SHED = Counter(
+    "app_admission_shed", "Requests rejected by admission control", ["reason"], registry=registry)
+
+QUEUE_TIME = Histogram(
+    "app_admission_queue_seconds", "Time a prediction chunk waited for admission", ["lane"],
+    buckets=LATENCY_BUCKETS, registry=registry)
+
+ROWS_IN_FLIGHT = Gauge(
+    "app_admission_rows_in_flight", "Rows admitted and being predicted",
+    multiprocess_mode="livesum", registry=registry)
+
+# Strategy chosen per prediction by src/serving/inference.py
+INFERENCE_STRATEGY = Counter(
+    "app_inference_strategy", "Predictions by execution strategy (inline, trees or rows)", ["strategy"],
+    registry=registry)
+
+INFERENCE_THREADS = Gauge(
+    "app_inference_threads", "Threads available to parallel inference in each worker",
+    multiprocess_mode="liveall", registry=registry)
+
+IN_FLIGHT = Gauge(
+    "app_requests_in_flight", "Requests currently being handled", ["endpoint"],
+    multiprocess_mode="livesum", registry=registry)
+
+MODEL_MEMORY = Gauge(
+    "app_model_memory_bytes", "Bytes held by the loaded model's tree arrays",
+    multiprocess_mode="liveall", registry=registry)
+
+# Drift scores are computed per worker from that worker's share of traffic
+FEATURE_DRIFT_PSI = Gauge(
+    "app_feature_drift_psi", "PSI of live inputs/predictions against the training profile", ["feature"],
+    multiprocess_mode="liveall", registry=registry)
+
+FEATURE_DRIFT_KS = Gauge(
+    "app_feature_drift_ks", "Binned KS distance of live inputs/predictions against the training profile",
+    ["feature"], multiprocess_mode="liveall", registry=registry)
+
+DRIFT_ROWS = Counter(
+    "app_drift_observed_rows", "Rows added to the drift sketches", registry=registry)
+
+# Prediction log (src/serving/prediction_log.py)
+PREDICTION_LOG_ROWS = Counter(
+    "app_prediction_log_rows", "Rows written to the prediction log", registry=registry)
+
+PREDICTION_LOG_DROPPED = Counter(
+    "app_prediction_log_dropped", "Rows not written to the prediction log", ["reason"], registry=registry)
+
+# Shadow scoring of the candidate model (src/serving/shadow.py)
+SHADOW_LATENCY = Histogram(
+    "app_shadow_latency_seconds", "Candidate model predict time per shadow-scored batch",
+    buckets=LATENCY_BUCKETS, registry=registry)
+
+SHADOW_DELTA = Histogram(
+    "app_shadow_prediction_delta", "Absolute difference between candidate and production log1p predictions per row",
+    buckets=DELTA_BUCKETS, registry=registry)
+
+SHADOW_ROWS = Counter(
+    "app_shadow_rows", "Rows scored by the candidate model", registry=registry)
+
+SHADOW_SKIPPED = Counter(
+    "app_shadow_skipped", "Sampled batches not shadow-scored", ["reason"], registry=registry)
+
+
+@contextmanager
+def phase(endpoint: str, name: str):
+    """Observe the duration of one request phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_LATENCY.labels(endpoint=endpoint, phase=name).observe(time.perf_counter() - start)
+
+
+def model_nbytes(model) -> int:
+    """Size of the node/value arrays of a fitted sklearn forest (0 if unknown)."""
+    total = 0
+    for estimator in getattr(model, "estimators_", []):
+        tree = estimator.tree_
+        state = tree.__getstate__()
+        total += state["nodes"].nbytes + state["values"].nbytes
+    return total
+
+
+def publish_drift(scores: dict) -> None:
+    """Set the drift gauges from DriftMonitor.scores()."""
+    for feature, (psi, ks) in scores.items():
+        FEATURE_DRIFT_PSI.labels(feature=feature).set(psi)
+        FEATURE_DRIFT_KS.labels(feature=feature).set(ks)
+
+
+def record_shadow(production, candidate, seconds: float) -> None:
+    """Observe one shadow-scored batch (log-scale predictions of both models)."""
+    SHADOW_LATENCY.observe(seconds)
+    for prod, cand in zip(production, candidate):
+        SHADOW_DELTA.observe(abs(float(cand) - float(prod)))
+    SHADOW_ROWS.inc(len(production))
+
+
+def generate_metrics() -> tuple:
+    """Body and content type for /metrics, aggregated across workers when multiprocess."""
+    if MULTIPROC_DIR:
+        scrape_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(scrape_registry)
+        return generate_latest(scrape_registry), CONTENT_TYPE_LATEST
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop a dead worker's live gauges (called from gunicorn's child_exit hook)."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,253 @@
+"""Log of served predictions for joining with realised CLV later.
+
+Every answered row (features, log-scale prediction, customer ID when
+sent, where the prediction came from, model version, endpoint and time)
+is copied into a preallocated columnar ring buffer. The request thread
+only pays for that copy: a background thread writes the buffered rows as
+row groups of a zstd-compressed Parquet file, every `flush_rows` rows or
+`flush_interval` seconds. When the buffer is full, rows are dropped and
+counted rather than making the request wait.
+
+Files are written as `<directory>/<YYYY-MM-DD>/predictions-<time>-<pid>.parquet.inprogress`
+and renamed to `.parquet` when they are rotated: after `rotate_seconds`, on
+a new UTC day, or when the log is closed. Readers only see complete files.
+A file holds rows from the day in its directory name and, at most, the
+first flush of the next day; read_prediction_logs accounts for that.
+"""
+import argparse
+import datetime as dt
+import glob
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.logger import logging
+
+SOURCES = ("live", "surrogate", "store")
+
+SUFFIX = ".parquet"
+IN_PROGRESS = ".inprogress"
+
+
+def _utc_date(timestamp: float) -> str:
+    return dt.datetime.fromtimestamp(timestamp, dt.timezone.utc).strftime("%Y-%m-%d")
+
+
+class PredictionLog:
+    """Buffer prediction rows in memory and write them to Parquet in a background thread.
+
+    `on_write(rows)` is called after rows reach disk and `on_drop(rows, reason)`
+    when rows are dropped, with reason "overflow" (buffer full) or "error"
+    (the write failed).
+    """
+
+    def __init__(self, directory: str, feature_names: list, capacity: int = 100_000,
+                 flush_rows: int = 10_000, flush_interval: float = 10.0, rotate_seconds: float = 3600.0,
+                 on_write=None, on_drop=None):
+        self.directory = directory
+        self.feature_names = list(feature_names)
+        self.capacity = capacity
+        self.flush_rows = min(flush_rows, capacity)
+        self.flush_interval = flush_interval
+        self.rotate_seconds = min(rotate_seconds, 86400.0)
+        self.on_write = on_write
+        self.on_drop = on_drop
+
+        self._features = np.empty((capacity, len(self.feature_names)))
+        self._prediction = np.empty(capacity)
+        self._customer_id = np.empty(capacity)
+        self._timestamp = np.empty(capacity)
+        self._source = np.empty(capacity, dtype=np.int8)
+        # Model versions and endpoints are stored as codes into _labels[column]
+        self._version = np.empty(capacity, dtype=np.int32)
+        self._endpoint = np.empty(capacity, dtype=np.int32)
+        self._labels = {"model_version": [], "endpoint": []}
+
+        # Rows [_tail, _tail + _size) modulo capacity are waiting to be written
+        self._tail = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+
+        self._writer = None
+        self._path = None
+        self._opened = 0.0
+        self._date = None
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+
+    def record(self, features, preds_log, model_version: str, endpoint: str, source: str = "live",
+               stored=None, customer_ids=None) -> bool:
+        """Queue one request's rows; returns False when they were dropped.
+
+        `features` has the feature_names columns (NaN for rows sent by
+        customer ID only); `stored` marks rows answered from the
+        prediction store, the others are attributed to `source`.
+        """
+        n = len(preds_log)
+        if n == 0:
+            return True
+        features = np.asarray(features, dtype=np.float64)
+        sources = np.full(n, SOURCES.index(source), dtype=np.int8)
+        if stored is not None:
+            sources[np.asarray(stored, dtype=bool)] = SOURCES.index("store")
+        customer_ids = np.full(n, np.nan) if customer_ids is None else \
+            pd.to_numeric(pd.Series(customer_ids), errors="coerce").to_numpy(dtype=np.float64)
+        now = time.time()
+
+        with self._lock:
+            if self._closed or self._size + n > self.capacity:
+                dropped = True
+            else:
+                dropped = False
+                version, endpoint = self._code("model_version", str(model_version)), self._code("endpoint", endpoint)
+                start = (self._tail + self._size) % self.capacity
+                first = min(n, self.capacity - start)
+                # The rows wrap around the end of the buffer in at most two slices
+                for target, rows in ((slice(start, start + first), slice(0, first)),
+                                     (slice(0, n - first), slice(first, n))):
+                    self._features[target] = features[rows]
+                    self._prediction[target] = preds_log[rows]
+                    self._customer_id[target] = customer_ids[rows]
+                    self._source[target] = sources[rows]
+                    self._timestamp[target] = now
+                    self._version[target] = version
+                    self._endpoint[target] = endpoint
+                self._size += n
+                if self._size >= self.flush_rows:
+                    self._wake.notify()
+        if dropped and self.on_drop is not None:
+            self.on_drop(n, "overflow")
+        return not dropped
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Write the buffered rows, complete the current file and stop the writer."""
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        self._thread.join(timeout)
+
+    def _code(self, column: str, label: str) -> int:
+        labels = self._labels[column]
+        if label not in labels:
+            labels.append(label)
+        return labels.index(label)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed and self._size < self.flush_rows:
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+                tail, size = self._tail, self._size
+                labels = {column: list(values) for column, values in self._labels.items()}
+            # Writers only fill rows outside [tail, tail + size), so these are read without the lock
+            if size:
+                self._flush(tail, size, labels)
+                with self._lock:
+                    self._tail = (tail + size) % self.capacity
+                    self._size -= size
+            if self._writer is not None and (closed or time.time() - self._opened >= self.rotate_seconds):
+                self._rotate()
+            if closed:
+                return
+
+    def _flush(self, tail: int, size: int, labels: dict) -> None:
+        rows = (np.arange(tail, tail + size) % self.capacity) if tail + size > self.capacity else \
+            slice(tail, tail + size)
+        try:
+            table = self._table(rows, labels)
+            date = _utc_date(self._timestamp[rows][0])
+            if self._writer is not None and date != self._date:
+                self._rotate()
+            if self._writer is None:
+                self._open(date, table.schema)
+            self._writer.write_table(table)
+        except Exception as e:
+            logging.error("Failed to write %d prediction log rows: %s", size, e)
+            if self.on_drop is not None:
+                self.on_drop(size, "error")
+            return
+        if self.on_write is not None:
+            self.on_write(size)
+
+    def _table(self, rows, labels: dict):
+        import pyarrow as pa
+
+        customer_id = self._customer_id[rows]
+        missing = np.isnan(customer_id)
+        columns = {
+            "timestamp": pa.array((self._timestamp[rows] * 1e6).astype(np.int64), pa.timestamp("us", tz="UTC")),
+            "model_version": pa.DictionaryArray.from_arrays(self._version[rows], labels["model_version"]),
+            "endpoint": pa.DictionaryArray.from_arrays(self._endpoint[rows], labels["endpoint"]),
+            "source": pa.DictionaryArray.from_arrays(self._source[rows], list(SOURCES)),
+            "customer_id": pa.array(np.where(missing, 0, customer_id).astype(np.int64), mask=missing),
+        }
+        features = self._features[rows]
+        for j, name in enumerate(self.feature_names):
+            columns[name] = pa.array(features[:, j])
+        columns["prediction_log"] = pa.array(self._prediction[rows])
+        return pa.table(columns)
+
+    def _open(self, date: str, schema) -> None:
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.join(self.directory, date), exist_ok=True)
+        stamp = dt.datetime.now(dt.timezone.utc).strftime("%H%M%S%f")
+        self._path = os.path.join(self.directory, date, f"predictions-{stamp}-{os.getpid()}{SUFFIX}")
+        self._writer = pq.ParquetWriter(self._path + IN_PROGRESS, schema, compression="zstd")
+        self._opened = time.time()
+        self._date = date
+
+    def _rotate(self) -> None:
+        try:
+            self._writer.close()
+            os.replace(self._path + IN_PROGRESS, self._path)
+        except Exception as e:
+            logging.error("Failed to complete prediction log %s: %s", self._path, e)
+        self._writer = None
+
+
+def read_prediction_logs(directory: str, start, end, columns: list = None) -> pd.DataFrame:
+    """Logged rows with start <= timestamp < end (dates or datetimes, naive ones are UTC)."""
+    import pyarrow.parquet as pq
+
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    start = start.tz_localize("UTC") if start.tzinfo is None else start.tz_convert("UTC")
+    end = end.tz_localize("UTC") if end.tzinfo is None else end.tz_convert("UTC")
+    # A file can run into the day after its directory's date
+    dates = pd.date_range(start.normalize() - pd.Timedelta(days=1), end.normalize()).strftime("%Y-%m-%d")
+    paths = sorted(path for date in dates for path in glob.glob(os.path.join(directory, date, f"*{SUFFIX}")))
+    if columns is not None and "timestamp" not in columns:
+        columns = ["timestamp", *columns]
+    tables = [pq.read_table(path, columns=columns) for path in paths]
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat([table.to_pandas() for table in tables], ignore_index=True)
+    df = df[(df["timestamp"] >= start) & (df["timestamp"] < end)]
+    return df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export logged predictions for a date range.")
+    parser.add_argument('--dir', default='logs/predictions', help="Prediction log directory (PREDICTION_LOG_DIR).")
+    parser.add_argument('--start', required=True, help="First date or time included, UTC.")
+    parser.add_argument('--end', required=True, help="First date or time excluded, UTC.")
+    parser.add_argument('--out', required=True, help="Output .parquet or .csv file.")
+    args = parser.parse_args()
+
+    df = read_prediction_logs(args.dir, args.start, args.end)
+    if args.out.endswith(".csv"):
+        df.to_csv(args.out, index=False)
+    else:
+        df.to_parquet(args.out, index=False)
+    logging.info("Wrote %d logged predictions to %s", len(df), args.out)
+
+
+if __name__ == '__main__':
+    from src.logger import configure_logger
+
+    configure_logger()
+    main()
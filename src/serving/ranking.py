@@ -0,0 +1,138 @@
+"""Top-K customers by predicted CLV.
+
+`build_ranking` scores the whole customer snapshot once per model and
+sorts the customers by predicted CLV. `Ranking` then answers top-K
+queries without touching the other rows: the sorted order is split once,
+when the ranking is loaded, into one presorted index per combination of
+segment filters (SEGMENTS), so a page of any query is a slice of one
+precomputed array.
+
+A ranking records the fingerprint of the model that scored it
+(src.utils.model_fingerprint). The app only serves a ranking whose
+fingerprint matches the served model, so deploying a new model version
+invalidates the old ranking.
+
+    python -m src.serving.ranking --model models/rf_model.pkl \
+        --data data/interim/data.csv --out models/ranking.npz
+"""
+import argparse
+import os
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from src.logger import logging, configure_logger
+
+# Filters a query can combine; values are strings ("0"/"1", tenure bucket names)
+SEGMENTS = ("is_onetime_buyer", "tenure")
+
+# Largest page a query can ask for
+MAX_K = 1000
+
+
+def segment_values(snapshot: pd.DataFrame) -> dict:
+    """SEGMENTS columns of a customer snapshot, as string arrays."""
+    from src.model.diagnostics import segment_labels
+
+    return {
+        "is_onetime_buyer": snapshot["is_onetime_buyer"].astype(int).astype(str).to_numpy(),
+        "tenure": segment_labels(snapshot)["tenure"].astype(str).to_numpy(),
+    }
+
+
+class Ranking:
+    """Customers sorted by predicted CLV, with presorted indexes per segment filter."""
+
+    def __init__(self, customer_ids, predictions, segments: dict, fingerprint: str, model_version: str = ""):
+        self.customer_ids = np.asarray(customer_ids)
+        self.predictions = np.asarray(predictions, dtype=float)
+        self.segments = {name: np.asarray(segments[name]).astype(str) for name in SEGMENTS}
+        self.fingerprint = fingerprint
+        self.model_version = model_version
+
+        # Highest CLV first; ties keep snapshot (Customer ID) order
+        order = np.argsort(-self.predictions, kind="stable")
+        self._index = {frozenset(): order}
+        for size in range(1, len(SEGMENTS) + 1):
+            for names in combinations(SEGMENTS, size):
+                keys = pd.MultiIndex.from_arrays([self.segments[name][order] for name in names])
+                codes, uniques = pd.factorize(keys)
+                # A stable sort by segment keeps each segment's rows in CLV order
+                grouped = order[np.argsort(codes, kind="stable")]
+                bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+                for values, index in zip(uniques, np.split(grouped, bounds)):
+                    self._index[frozenset(zip(names, values))] = index
+
+    def __len__(self) -> int:
+        return len(self.customer_ids)
+
+    def top(self, k: int, offset: int = 0, filters: dict = None) -> tuple:
+        """(page of up to `k` customers starting at rank `offset`, customers matching `filters`)."""
+        filters = filters or {}
+        unknown = set(filters) - set(SEGMENTS)
+        if unknown:
+            raise ValueError(f"Unknown filters: {sorted(unknown)}")
+        if not 0 < k <= MAX_K or offset < 0:
+            raise ValueError(f"k must be between 1 and {MAX_K} and offset non-negative")
+        key = frozenset((name, str(value)) for name, value in filters.items())
+        index = self._index.get(key, self._index[frozenset()][:0])
+        page = index[offset:offset + k]
+        customers = [
+            {"rank": offset + i + 1, "customer_id": customer_id, "predicted_clv": prediction}
+            for i, (customer_id, prediction) in enumerate(zip(self.customer_ids[page].tolist(),
+                                                              self.predictions[page].tolist()))
+        ]
+        return customers, len(index)
+
+    def save(self, file_path: str) -> None:
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        np.savez(file_path, customer_ids=self.customer_ids, predictions=self.predictions,
+                 fingerprint=np.array(self.fingerprint), model_version=np.array(self.model_version),
+                 **{f"segment_{name}": values for name, values in self.segments.items()})
+
+    @classmethod
+    def load(cls, file_path: str) -> "Ranking":
+        with np.load(file_path, allow_pickle=False) as data:
+            return cls(data["customer_ids"], data["predictions"],
+                       {name: data[f"segment_{name}"] for name in SEGMENTS},
+                       str(data["fingerprint"]), str(data["model_version"]))
+
+
+def build_ranking(model, snapshot: pd.DataFrame, model_version: str = "") -> Ranking:
+    """Score every customer of `snapshot` (build_snapshot output) with `model`."""
+    from src.utils import model_fingerprint
+
+    try:
+        X = snapshot.drop(columns=["Customer ID"])
+        predictions = np.expm1(model.predict(X))
+        customer_ids = snapshot["Customer ID"].to_numpy()
+        if np.all(customer_ids == np.round(customer_ids)):
+            customer_ids = customer_ids.astype(np.int64)
+        ranking = Ranking(customer_ids, predictions, segment_values(snapshot), model_fingerprint(model), model_version)
+        logging.info("Ranked %d customers", len(ranking))
+        return ranking
+    except Exception as e:
+        logging.error("Building the customer ranking failed: %s", e)
+        raise
+
+
+def main():
+    from src.utils import load_data, load_model, load_params
+    from src.features.feature_engineering import build_snapshot
+
+    parser = argparse.ArgumentParser(description="Score every customer once and save the top-K ranking.")
+    parser.add_argument("--model", default="models/rf_model.pkl")
+    parser.add_argument("--data", default="data/interim/data.csv", help="Preprocessed transactions.")
+    parser.add_argument("--out", default="models/ranking.npz")
+    parser.add_argument("--model-version", default="", help="Registry version, recorded for reference.")
+    args = parser.parse_args()
+
+    backend = load_params("params.yaml")["feature_engineering"].get("backend", "pandas")
+    snapshot = build_snapshot(load_data(args.data), backend)
+    ranking = build_ranking(load_model(args.model), snapshot, args.model_version)
+    ranking.save(args.out)
+    logging.info("Ranking saved to %s", args.out)
+
+
+if __name__ == "__main__":
+    configure_logger()
+    main()
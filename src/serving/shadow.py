@@ -0,0 +1,114 @@
+"""Shadow scoring of a candidate model next to the production model.
+
+A sampled share of the request batches that production already scored is
+sent to a single background process that holds the candidate model. The
+request thread only pays for a random draw and a queue put. Scoring runs
+in another process so that the candidate's predict never holds this
+worker's GIL, and that process is niced so the kernel schedules request
+handling first. At most `max_pending` batches are in flight; further
+samples are dropped rather than queued, so a slow candidate cannot build
+up a backlog.
+"""
+import os
+import pickle
+import random
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Scheduling priority of the scoring process (0 = same as the workers, 19 = lowest)
+NICENESS = 19
+
+_candidate = None
+
+
+def load_model(source: str):
+    """A pickled estimator (.pkl), an MLflow model directory or a models:/ URI."""
+    if source.endswith(".pkl"):
+        with open(source, "rb") as file:
+            return pickle.load(file)
+
+    import mlflow.pyfunc
+    return mlflow.pyfunc.load_model(source)
+
+
+def _init_worker(source: str, tracking_uri: str, niceness: int) -> None:
+    global _candidate
+    if niceness:
+        os.nice(niceness)
+    if tracking_uri:
+        import mlflow
+        mlflow.set_tracking_uri(tracking_uri)
+    _candidate = load_model(source)
+
+
+def _ready() -> bool:
+    return _candidate is not None
+
+
+def _score(X) -> tuple:
+    start = time.perf_counter()
+    predictions = _candidate.predict(X)
+    return predictions, time.perf_counter() - start
+
+
+class ShadowScorer:
+    """Score sampled batches with a candidate model off the response path.
+
+    `on_result(production, candidate, seconds)` is called with both log-scale
+    predictions once a batch is scored; `on_skip(reason)` when a sampled
+    batch is dropped ("busy") or fails ("error").
+    """
+
+    def __init__(self, source: str, sample_rate: float, max_pending: int = 2,
+                 tracking_uri: str = None, on_result=None, on_skip=None, niceness: int = NICENESS):
+        self.source = source
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.on_result = on_result
+        self.on_skip = on_skip
+        self._pending = 0
+        self._lock = threading.Lock()
+        # spawn, not fork: the serving process has threads and a loaded model
+        self._executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(source, tracking_uri, niceness),
+        )
+        # Start the process and load the candidate now rather than on the first sampled request
+        self._executor.submit(_ready)
+
+    def submit(self, X, production) -> bool:
+        """Maybe queue `X` for the candidate; returns whether it was queued."""
+        if random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                busy = True
+            else:
+                busy = False
+                self._pending += 1
+        if busy:
+            if self.on_skip is not None:
+                self.on_skip("busy")
+            return False
+        future = self._executor.submit(_score, X)
+        future.add_done_callback(lambda done: self._done(done, production))
+        return True
+
+    def _done(self, future, production) -> None:
+        with self._lock:
+            self._pending -= 1
+        try:
+            candidate, seconds = future.result()
+        except Exception:
+            if self.on_skip is not None:
+                self.on_skip("error")
+            return
+        if self.on_result is not None:
+            self.on_result(production, candidate, seconds)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 import pickle
 import json
+from src.perf import track
 
 def load_params(params_path: str) -> dict:
 
@@ -25,7 +26,8 @@ def load_params(params_path: str) -> dict:
 def load_data(file_path: str) -> pd.DataFrame:
     """Load data from a CSV file."""
     try:
-        df = pd.read_csv(file_path)
+        with track('csv_load'):
+            df = pd.read_csv(file_path)
         logging.info('Data loaded from %s', file_path)
         return df
     except pd.errors.ParserError as e:
@@ -35,6 +37,39 @@ def load_data(file_path: str) -> pd.DataFrame:
         logging.error('Unexpected error occurred while loading the data: %s', e)
         raise
 
+def matrix_paths(file_path: str) -> tuple:
+    """X, y and sidecar paths of the feature matrix saved under `file_path` (e.g. data/processed/train)."""
+    return f"{file_path}_X.npy", f"{file_path}_y.npy", f"{file_path}_matrix.json"
+
+def load_matrix(file_path: str) -> tuple:
+    """Load a feature matrix written by feature_engineering.save_matrix as (X, y).
+
+    The arrays are memory-mapped read-only and wrapped without copying, so
+    X is a float32 DataFrame (with the training column names) over the
+    mapped file and sklearn uses it as is.
+    """
+    try:
+        X_path, y_path, meta_path = matrix_paths(file_path)
+        with open(meta_path) as file:
+            meta = json.load(file)
+        with track('matrix_load'):
+            X = np.load(X_path, mmap_mode='r')
+            y = np.load(y_path, mmap_mode='r')
+        if X.shape != (meta['rows'], len(meta['columns'])) or y.shape != (meta['rows'],):
+            raise ValueError(f"{file_path} arrays do not match {meta_path}")
+        logging.info('Feature matrix loaded from %s: %d rows', file_path, meta['rows'])
+        return (pd.DataFrame(X, columns=meta['columns'], copy=False),
+                pd.Series(y, name=meta['target'], copy=False))
+    except Exception as e:
+        logging.error('Failed to load the feature matrix %s: %s', file_path, e)
+        raise
+
+def split_target(data, target: str = 'target_clv') -> tuple:
+    """(X, y) of a loaded feature matrix, or of a DataFrame that still has the target column."""
+    if isinstance(data, tuple):
+        return data
+    return data.drop(columns=[target]), data[target]
+
 def load_model(file_path: str):
     """Load the trained model from a file."""
     try:
@@ -50,9 +85,11 @@ def load_model(file_path: str):
         raise
 
 
-from sklearn.metrics import root_mean_squared_error, mean_absolute_error, r2_score
 # Helper functions
+# sklearn and scipy are imported inside the metric helpers so that stages
+# which never compute metrics (e.g. ingestion) do not pay for them at startup.
 def evaluate_regression(y_true, y_pred):
+    from sklearn.metrics import root_mean_squared_error, mean_absolute_error, r2_score
     return {
         "rmse_log": root_mean_squared_error(y_true, y_pred),
         "mae_log": mean_absolute_error(y_true, y_pred),
@@ -61,13 +98,13 @@ def evaluate_regression(y_true, y_pred):
 
 
 def inverse_rmse(y_true_log, y_pred_log):
+    from sklearn.metrics import root_mean_squared_error
     y_true = np.expm1(y_true_log)
     y_pred = np.expm1(y_pred_log)
     return root_mean_squared_error(y_true, y_pred)
 
-from scipy.stats import spearmanr
-
 def spearman_rank(y_true, y_pred):
+    from scipy.stats import spearmanr
     return spearmanr(y_true, y_pred).correlation
 
 
@@ -83,4 +120,21 @@ def load_model_info(file_path: str) -> dict:
         raise
     except Exception as e:
         logging.error('Unexpected error occurred while loading the model info: %s', e)
-        raise
\ No newline at end of file
+        raise
+
+def model_fingerprint(model) -> str:
+    """Content hash of a fitted forest's tree arrays.
+
+    The same for a model read from models/rf_model.pkl and from the MLflow
+    registry, so results computed offline can be matched to the served model.
+    """
+    import hashlib
+
+    if not hasattr(model, "estimators_"):
+        raise ValueError("Only fitted tree ensembles can be fingerprinted")
+    digest = hashlib.sha256()
+    for estimator in model.estimators_:
+        state = estimator.tree_.__getstate__()
+        digest.update(state["nodes"].tobytes())
+        digest.update(state["values"].tobytes())
+    return digest.hexdigest()
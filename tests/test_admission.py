@@ -0,0 +1,100 @@
+import threading
+import time
+import unittest
+import numpy as np
+import pandas as pd
+from src.serving.admission import AdmissionController, Rejected
+
+
+def frame(rows):
+    return pd.DataFrame({"x": np.arange(rows, dtype=float)})
+
+
+class AdmissionControllerTests(unittest.TestCase):
+
+    def test_batches_run_in_chunks(self):
+        sizes = []
+
+        def predict(X):
+            sizes.append(len(X))
+            return X["x"].to_numpy() * 2, X["x"].to_numpy()
+
+        controller = AdmissionController(batch_rows=100, chunk_rows=40)
+        preds, other = controller.predict(frame(100), predict)
+        self.assertEqual(sizes, [100])
+        preds, other = controller.predict(frame(250), predict)
+        self.assertEqual(sizes[1:], [40] * 6 + [10])
+        np.testing.assert_array_equal(preds, np.arange(250) * 2)
+        np.testing.assert_array_equal(other, np.arange(250))
+        self.assertEqual(controller._rows_in_flight, 0)
+        self.assertEqual(controller._batches, 0)
+        self.assertAlmostEqual(controller._batch_cost, 0.0)
+
+    def test_second_batch_is_shed_with_retry_after(self):
+        shed, started, release = [], threading.Event(), threading.Event()
+
+        def slow(X):
+            started.set()
+            release.wait(5)
+            return X["x"].to_numpy()
+
+        controller = AdmissionController(batch_rows=10, chunk_rows=10, on_shed=shed.append)
+        thread = threading.Thread(target=controller.predict, args=(frame(50), slow))
+        thread.start()
+        try:
+            started.wait(5)
+            with self.assertRaises(Rejected) as ctx:
+                controller.predict(frame(50), slow)
+            self.assertEqual(ctx.exception.status, 429)
+            self.assertGreaterEqual(ctx.exception.retry_after, 1)
+            # Small requests still get through
+            release.set()
+            np.testing.assert_array_equal(controller.predict(frame(3), slow), np.arange(3))
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(shed, ["batch_lane_full"])
+
+    def test_expected_wait_and_queue_limits(self):
+        controller = AdmissionController(max_wait=0.5)
+        controller._cost_in_flight = 1.0
+        with self.assertRaises(Rejected) as ctx:
+            controller.predict(frame(1), lambda X: X["x"].to_numpy())
+        self.assertEqual((ctx.exception.status, ctx.exception.reason), (503, "expected_wait"))
+
+        controller = AdmissionController(max_queue=2)
+        controller._waiting["batch"] = 2
+        with self.assertRaises(Rejected) as ctx:
+            controller.predict(frame(1), lambda X: X["x"].to_numpy())
+        self.assertEqual(ctx.exception.reason, "queue_full")
+
+    def test_interactive_overtakes_batch_chunks(self):
+        order, waits = [], []
+        controller = AdmissionController(max_rows=10, batch_rows=10, chunk_rows=10, batch_yield=5.0,
+                                         on_wait=lambda lane, seconds: waits.append(lane))
+        first_chunk, release = threading.Event(), threading.Event()
+
+        def predict(X):
+            order.append(len(X))
+            if len(X) == 10 and not first_chunk.is_set():
+                first_chunk.set()
+                release.wait(5)
+            return X["x"].to_numpy()
+
+        batch = threading.Thread(target=controller.predict, args=(frame(30), predict))
+        batch.start()
+        first_chunk.wait(5)
+        small = threading.Thread(target=controller.predict, args=(frame(2), predict))
+        small.start()
+        while not controller._waiting["interactive"]:
+            time.sleep(0.001)
+        release.set()
+        batch.join()
+        small.join()
+        # The small request runs after the chunk in flight, before the rest of the batch
+        self.assertEqual(order, [10, 2, 10, 10])
+        self.assertEqual(waits.count("interactive"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.data.synthetic import generate_transactions
+from src.data.data_preprocessing import preprocessing
+from src.features.aggregation import aggregate_customers, customer_sum, customer_features
+from src.features.feature_engineering import build_features, build_snapshot
+
+
+def groupby_features(df):
+    return df.groupby("Customer ID").agg(
+        first_purchase_date=("InvoiceDate", "min"),
+        last_purchase_date=("InvoiceDate", "max"),
+        unique_invoices=("Invoice", "nunique"),
+        total_quantity=("Quantity", "sum"),
+        avg_quantity_per_order=("Quantity", "mean"),
+        unit_price_std=("Price", "std"),
+    ).round(2)
+
+
+def skewed_transactions(seed=0, n=60_000):
+    """Heavy-tailed group sizes (so the Python tail runs), NaN ids/prices,
+    one-row and constant-price customers and awkward float values."""
+    rng = np.random.default_rng(seed)
+    customers = np.floor(rng.pareto(0.8, n) * 3).astype(float) + 12346
+    customers[rng.random(n) < 0.05] = np.nan
+    price = np.round(rng.lognormal(0.5, 2.0, n), 2)
+    price[rng.random(n) < 0.01] = np.nan
+    price[customers == 12346] = 2.55
+    df = pd.DataFrame({
+        "Invoice": rng.integers(0, n // 5, n).astype(str).astype(object),
+        "InvoiceDate": pd.Timestamp("2010-01-01") + pd.to_timedelta(rng.integers(0, 700 * 1440, n), unit="min"),
+        "Quantity": rng.integers(-5, 500, n),
+        "Price": price,
+        "Customer ID": customers,
+    })
+    df["Total Amount"] = df["Price"] * df["Quantity"] * (1 + rng.random(n) * 1e-7)
+    return df
+
+
+class AggregationTests(unittest.TestCase):
+
+    def test_matches_groupby_bit_for_bit(self):
+        df = skewed_transactions()
+        pd.testing.assert_frame_equal(aggregate_customers(df), groupby_features(df), check_exact=True)
+        pd.testing.assert_series_equal(customer_sum(df, "Total Amount"),
+                                       df.groupby("Customer ID")["Total Amount"].sum(), check_exact=True)
+
+    def test_inf_values_sum_like_pandas(self):
+        df = skewed_transactions(seed=1, n=5_000)
+        df.loc[df.index[::997], "Total Amount"] = np.inf
+        pd.testing.assert_series_equal(customer_sum(df, "Total Amount"),
+                                       df.groupby("Customer ID")["Total Amount"].sum(), check_exact=True)
+
+    def test_build_features_backends_agree(self):
+        df = preprocessing(generate_transactions(300_000, seed=11))
+        expected = build_features(df.copy(), backend="pandas")
+        pd.testing.assert_frame_equal(build_features(df.copy(), backend="numpy"), expected, check_exact=True)
+
+    def test_historical_cutoff_bounds_target_window(self):
+        df = preprocessing(generate_transactions(100_000, seed=12))
+        cutoff = pd.Timestamp("2011-03-01")
+        expected = build_features(df.copy(), backend="pandas", cutoff_date=cutoff, horizon_days=60)
+        pd.testing.assert_frame_equal(build_features(df.copy(), backend="numpy", cutoff_date=cutoff, horizon_days=60),
+                                      expected, check_exact=True)
+        # Spend after the horizon must not leak into the target
+        df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"])
+        window = df[(df["InvoiceDate"] > cutoff) & (df["InvoiceDate"] <= cutoff + pd.Timedelta(days=60))]
+        self.assertEqual(len(expected), len(set(window["Customer ID"]) & set(df.loc[df["InvoiceDate"] <= cutoff, "Customer ID"])))
+
+
+    def test_single_customer_matches_snapshot(self):
+        as_of = pd.Timestamp("2011-06-01")
+
+        def check(raw):
+            snapshot = build_snapshot(preprocessing(raw.copy()), as_of=as_of).set_index("Customer ID")
+            raw["InvoiceDate"] = pd.to_datetime(raw["InvoiceDate"])
+            for customer, lines in raw.groupby("Customer ID"):
+                args = (lines["Invoice"].tolist(), lines["InvoiceDate"].to_numpy(), lines["Quantity"].tolist(),
+                        lines["Price"].tolist(), as_of)
+                if customer not in snapshot.index:
+                    with self.assertRaises(ValueError):
+                        customer_features(*args)
+                else:
+                    self.assertEqual(customer_features(*args), snapshot.loc[customer].to_dict(), customer)
+
+        check(generate_transactions(100_000, seed=13))
+        # NaN, constant and single prices, and lines with no date
+        df = skewed_transactions(seed=2, n=5_000)
+        df["InvoiceDate"] = df["InvoiceDate"].where(np.arange(len(df)) % 50 > 0)
+        check(df)
+        # Fractional quantities, whose sums are rounded too
+        df = skewed_transactions(seed=3, n=5_000)
+        df["Quantity"] = np.round(df["Quantity"] / 7, 3)
+        check(df)
+
+if __name__ == "__main__":
+    unittest.main()
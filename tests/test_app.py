@@ -52,6 +52,52 @@ class FlaskAppTests(unittest.TestCase):
         self.assertEqual(len(data["predictions"]), 1)
         self.assertIsInstance(data["predictions"][0], float)
 
+    def test_explain_api_matches_predict(self):
+        payload = [
+            {
+                "unique_invoices": 5,
+                "total_quantity": 100,
+                "avg_quantity_per_order": 20.0,
+                "unit_price_std": 10.5,
+                "customer_age_days": 365,
+                "days_since_last_purchase": 30,
+                "average_days_between_purchase": 45.0,
+                "is_onetime_buyer": 0,
+            }
+        ]
+
+        explained = self.client.post("/explain", data=json.dumps(payload), content_type="application/json")
+        predicted = self.client.post("/predict", data=json.dumps(payload), content_type="application/json")
+
+        self.assertEqual(explained.status_code, 200)
+        data = explained.get_json()
+        self.assertEqual(set(data["contributions"][0]), set(payload[0]))
+        self.assertAlmostEqual(data["predictions"][0], predicted.get_json()["predictions"][0], places=6)
+
+    def test_predict_api_quantiles(self):
+        payload = [
+            {
+                "unique_invoices": 5,
+                "total_quantity": 100,
+                "avg_quantity_per_order": 20.0,
+                "unit_price_std": 10.5,
+                "customer_age_days": 365,
+                "days_since_last_purchase": 30,
+                "average_days_between_purchase": 45.0,
+                "is_onetime_buyer": 0,
+            }
+        ]
+
+        response = self.client.post("/predict?quantiles=0.1,0.9", data=json.dumps(payload),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertLessEqual(data["quantiles"]["0.1"][0], data["quantiles"]["0.9"][0])
+
+        response = self.client.post("/predict?quantiles=1.5", data=json.dumps(payload),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
     def test_predict_api_missing_features(self):
         payload = [
             {
@@ -73,6 +119,41 @@ class FlaskAppTests(unittest.TestCase):
 
 
 
+    def test_predict_transactions(self):
+        payload = {
+            "as_of": "2011-06-01",
+            "transactions": [
+                {"Invoice": "536365", "InvoiceDate": "2010-12-01 08:26:00", "Quantity": 6, "Price": 2.55},
+                {"Invoice": "536365", "InvoiceDate": "2010-12-01 08:26:00", "Quantity": 8, "Price": 3.39},
+                {"Invoice": "C536379", "InvoiceDate": "2010-12-01 09:41:00", "Quantity": -1, "Price": 27.5},
+                {"Invoice": "537126", "InvoiceDate": "2011-03-05 10:00:00", "Quantity": 12, "Price": 1.25},
+                {"Invoice": "581587", "InvoiceDate": "2011-12-09 12:50:00", "Quantity": 4, "Price": 4.15},
+            ],
+        }
+
+        response = self.client.post("/predict-transactions", data=json.dumps(payload),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["features"]["unique_invoices"], 2)
+        self.assertEqual(data["features"]["total_quantity"], 26)
+        self.assertEqual(data["features"]["customer_age_days"], 181)
+
+        # The same features through /predict give the same prediction
+        predicted = self.client.post("/predict", data=json.dumps([data["features"]]),
+                                     content_type="application/json")
+        self.assertAlmostEqual(data["prediction"], predicted.get_json()["predictions"][0], places=6)
+
+        payload["transactions"][1]["Quantity"] = None
+        payload["transactions"][2]["Price"] = "27.5"
+        payload["transactions"][0].pop("Price")
+        for body in (payload, [payload], "transactions", None, {"transactions": ["536365"]},
+                     {"transactions": [dict(payload["transactions"][1], Price=1.0)]},
+                     {"transactions": [dict(payload["transactions"][2], Price=27.5, Quantity=True)]}):
+            response = self.client.post("/predict-transactions", data=json.dumps(body),
+                                        content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+
     def test_predict_form_success(self):
         form_data = {
             "unique_invoices": "5",
@@ -91,6 +172,31 @@ class FlaskAppTests(unittest.TestCase):
         self.assertIn(b"Predicted", response.data)
 
 
+    def test_top_customers(self):
+        response = self.client.get("/top-customers?k=5&is_onetime_buyer=0")
+        if response.status_code == 501:
+            self.skipTest("No ranking for the served model (RANKING_PATH)")
+        self.assertEqual(response.status_code, 200)
+
+        data = response.get_json()
+        self.assertLessEqual(len(data["customers"]), 5)
+        values = [customer["predicted_clv"] for customer in data["customers"]]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+        response = self.client.get("/top-customers?k=0")
+        self.assertEqual(response.status_code, 400)
+
+    def test_predict_api_customer_id_lookup(self):
+        response = self.client.post(
+            "/predict",
+            data=json.dumps([{"customer_id": -1}]),
+            content_type="application/json"
+        )
+        if response.status_code == 400:
+            self.skipTest("No prediction store for the served model (PREDICTION_STORE_PATH)")
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("Unknown customers", response.get_json()["error"])
+
     def test_metrics_endpoint(self):
         response = self.client.get("/metrics")
         self.assertEqual(response.status_code, 200)
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+from src.data.synthetic import generate_transactions
+from src.data.data_preprocessing import preprocessing
+from src.model.backtest import fold_cutoffs, run_backtest, stability
+
+PARAMS = {"random_forest": {"n_estimators": 10, "max_depth": 6, "min_samples_leaf": 5,
+                            "max_features": 0.5, "min_samples_split": 10, "random_state": 42}}
+
+
+class BacktestTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = preprocessing(generate_transactions(100_000, seed=3))
+        cls.df["InvoiceDate"] = pd.to_datetime(cls.df["InvoiceDate"])
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def backtest(self, n_jobs=1, **kwargs):
+        return run_backtest(self.df.copy(), PARAMS, n_folds=3, step_days=90, horizon_days=90,
+                            n_jobs=n_jobs, cache_dir=self.cache_dir, **kwargs)
+
+    def test_cutoffs_step_back_from_latest(self):
+        cutoffs = fold_cutoffs(self.df, 3, 30, 90)
+        self.assertEqual(cutoffs[-1], self.df["InvoiceDate"].max() - pd.Timedelta(days=90))
+        self.assertEqual([b - a for a, b in zip(cutoffs, cutoffs[1:])], [pd.Timedelta(days=30)] * 2)
+        with self.assertRaises(ValueError):
+            fold_cutoffs(self.df, 20, 90, 90)
+
+    def test_report_and_cache(self):
+        report = self.backtest()
+        self.assertEqual(len(report["folds"]), 3)
+        for fold in report["folds"]:
+            self.assertEqual(pd.Timestamp(fold["cutoff"]) - pd.Timestamp(fold["train_cutoff"]), pd.Timedelta(days=90))
+            self.assertGreater(fold["n_train"], 0)
+        self.assertEqual(set(report["stability"]["rmse_log"]), {"mean", "std", "min", "max", "cv"})
+        # Adjacent folds share a table when the step equals the horizon
+        self.assertEqual(len(os.listdir(self.cache_dir)), 4)
+
+        with mock.patch("src.features.feature_engineering.build_features") as build:
+            cached = self.backtest()
+        build.assert_not_called()
+        self.assertEqual(cached, report)
+
+    def test_cache_key_changes_with_data(self):
+        self.backtest()
+        df = self.df.copy()
+        df.loc[df.index[0], "Quantity"] += 1
+        run_backtest(df, PARAMS, n_folds=3, step_days=90, horizon_days=90, n_jobs=1, cache_dir=self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 8)
+
+    def test_parallel_folds_match_serial(self):
+        self.assertEqual(self.backtest(n_jobs=2), self.backtest(n_jobs=1))
+
+    def test_stability(self):
+        summary = stability([{"cutoff": "a", "rmse_log": 1.0}, {"cutoff": "b", "rmse_log": 3.0}])
+        self.assertEqual(summary["rmse_log"]["mean"], 2.0)
+        self.assertAlmostEqual(summary["rmse_log"]["std"], 2 ** 0.5)
+        self.assertAlmostEqual(summary["rmse_log"]["cv"], 2 ** 0.5 / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from src.utils import evaluate_regression
+from src.model.diagnostics import permutation_importance, segment_labels, segment_metrics
+
+
+def holdout(seed=0, n=300):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "customer_age_days": rng.integers(0, 1000, n),
+        "is_onetime_buyer": rng.integers(0, 2, n),
+        "noise": rng.normal(size=n),
+    })
+    y = np.log1p(X["customer_age_days"] / 10 + 5 * (1 - X["is_onetime_buyer"]) + rng.gamma(2.0, 1.0, n))
+    return X, y
+
+
+class PermutationImportanceTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.X, cls.y = holdout()
+        cls.model = RandomForestRegressor(n_estimators=20, min_samples_leaf=5, random_state=0).fit(cls.X, cls.y)
+
+    def test_informative_features_rank_above_noise(self):
+        result = permutation_importance(self.model, self.X, self.y, n_repeats=3, n_jobs=1)
+        features = result["features"]
+        self.assertEqual(list(features), list(self.X.columns))
+        self.assertGreater(features["customer_age_days"]["importance_mean"], features["noise"]["importance_mean"])
+        self.assertGreater(features["is_onetime_buyer"]["importance_mean"], features["noise"]["importance_mean"])
+        self.assertAlmostEqual(result["baseline_rmse_log"], evaluate_regression(self.y, self.model.predict(self.X))["rmse_log"])
+
+    def test_process_pool_matches_serial(self):
+        serial = permutation_importance(self.model, self.X, self.y, n_repeats=2, n_jobs=1)
+        pooled = permutation_importance(self.model, self.X, self.y, n_repeats=2, n_jobs=2)
+        self.assertEqual(serial, pooled)
+
+
+class SegmentMetricsTests(unittest.TestCase):
+
+    def test_matches_evaluate_regression_per_segment(self):
+        X, y = holdout(seed=1)
+        y_pred = y + np.random.default_rng(2).normal(scale=0.3, size=len(y))
+        segments = segment_labels(X)
+        result = segment_metrics(segments, y, y_pred)
+
+        self.assertEqual(set(result), {"buyer_type", "tenure"})
+        self.assertEqual(set(result["buyer_type"]), {"onetime", "repeat"})
+        self.assertEqual(set(result["tenure"]), {"<90d", "90-180d", "180-365d", "365-730d", ">=730d"})
+        for name in segments.columns:
+            self.assertEqual(sum(row["n"] for row in result[name].values()), len(X))
+            for value, row in result[name].items():
+                mask = (segments[name] == value).to_numpy()
+                expected = evaluate_regression(y[mask], y_pred[mask])
+                for metric in ("rmse_log", "mae_log", "r2"):
+                    self.assertAlmostEqual(row[metric], expected[metric])
+
+    def test_tenure_bucket_edges(self):
+        X = pd.DataFrame({"customer_age_days": [0, 89, 90, 365, 729, 730], "is_onetime_buyer": [1] * 6})
+        labels = segment_labels(X)["tenure"].tolist()
+        self.assertEqual(labels, ["<90d", "<90d", "90-180d", "365-730d", "365-730d", ">=730d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
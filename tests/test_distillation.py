@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from src.utils import model_fingerprint
+from src.model.distillation import augment_features, distill_model, evaluate_surrogate
+
+
+def holdout(seed=0, n=600):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "customer_age_days": rng.integers(0, 1000, n),
+        "is_onetime_buyer": rng.integers(0, 2, n),
+        "noise": rng.normal(size=n),
+    })
+    y = np.log1p(X["customer_age_days"] / 10 + 5 * (1 - X["is_onetime_buyer"]) + rng.gamma(2.0, 1.0, n))
+    return X.assign(target_clv=y)
+
+
+class DistillationTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.train, cls.test = holdout(0), holdout(1, 300)
+        cls.X_train = cls.train.drop(columns=["target_clv"])
+        cls.teacher = RandomForestRegressor(n_estimators=30, min_samples_leaf=5, random_state=0).fit(
+            cls.X_train, cls.train["target_clv"])
+
+    def test_augmented_rows_reuse_observed_values(self):
+        augmented = augment_features(self.X_train, 1000, swap_prob=0.5, random_state=3)
+        self.assertEqual(len(augmented), len(self.X_train) + 1000)
+        pd.testing.assert_frame_equal(augmented.iloc[:len(self.X_train)], self.X_train)
+        self.assertEqual(list(augmented.dtypes), list(self.X_train.dtypes))
+        for column in self.X_train.columns:
+            self.assertTrue(augmented[column].isin(self.X_train[column]).all())
+        # Swapped features make combinations that are not training rows
+        synthetic = augmented.iloc[len(self.X_train):]
+        seen = set(map(tuple, self.X_train.to_numpy()))
+        self.assertGreater(sum(row not in seen for row in map(tuple, synthetic.to_numpy())), 300)
+
+    def test_surrogate_tracks_teacher(self):
+        for settings in ({"n_samples": 2000}, {"n_samples": 2000, "model": "tree", "max_depth": 6}):
+            with self.subTest(**settings):
+                student = distill_model(self.teacher, self.X_train, {"distillation": settings})
+                self.assertEqual(student.teacher_fingerprint_, model_fingerprint(self.teacher))
+
+                metrics = evaluate_surrogate(student, self.teacher, self.test)
+                self.assertLess(metrics["fidelity_rmse_log"], 0.25)
+                self.assertGreater(metrics["fidelity_spearman_rank"], 0.9)
+                self.assertAlmostEqual(metrics["rmse_log_loss"],
+                                       metrics["surrogate_rmse_log"] - metrics["teacher_rmse_log"])
+                self.assertLess(metrics["rmse_log_loss"], 0.1)
+                self.assertLess(metrics["surrogate_latency_ms"], metrics["teacher_latency_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
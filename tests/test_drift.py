@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from src.model.model_evaluation import save_prediction_profile
+from src.serving.drift import DriftMonitor, PREDICTION, build_profile, load_profile
+
+
+def make_features(rng, n, shift=0.0):
+    return pd.DataFrame({
+        "total_quantity": rng.lognormal(3 + shift, 1, n),
+        "is_onetime_buyer": (rng.random(n) < 0.3 + shift / 4).astype(int),
+        "target_clv": rng.normal(5 + shift, 1, n),
+    })
+
+
+class DriftMonitorTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.features = ["total_quantity", "is_onetime_buyer"]
+        reference = make_features(rng, 20000)
+        self.profile = build_profile(reference, self.features, predictions=reference["target_clv"])
+
+    def observe(self, monitor, df):
+        for start in range(0, len(df), 50):
+            batch = df.iloc[start:start + 50]
+            monitor.observe(batch[self.features], batch["target_clv"])
+
+    def test_profile_bins(self):
+        quantity = self.profile["features"]["total_quantity"]
+        self.assertEqual(len(quantity["edges"]), 19)
+        self.assertAlmostEqual(sum(quantity["reference"]), 1.0)
+        # Binary feature collapses to one bin per value (plus the underflow bin)
+        self.assertEqual(len(self.profile["features"]["is_onetime_buyer"]["reference"]), 3)
+
+    def test_same_distribution_scores_low_and_shift_scores_high(self):
+        rng = np.random.default_rng(1)
+        same = DriftMonitor(self.profile, self.features)
+        self.observe(same, make_features(rng, 5000))
+        shifted = DriftMonitor(self.profile, self.features)
+        self.observe(shifted, make_features(rng, 5000, shift=1.0))
+
+        for name in self.features + [PREDICTION]:
+            psi_same, ks_same = same.scores()[name]
+            psi_shift, ks_shift = shifted.scores()[name]
+            self.assertLess(psi_same, 0.05)
+            self.assertGreater(psi_shift, 0.2)
+            self.assertGreater(ks_shift, ks_same)
+
+    def test_small_and_large_batches_bin_alike(self):
+        df = make_features(np.random.default_rng(3), 64)
+        row_by_row = DriftMonitor(self.profile, self.features)
+        for i in range(len(df)):
+            row_by_row.observe(df[self.features].iloc[i:i + 1], df["target_clv"].iloc[i:i + 1])
+        batched = DriftMonitor(self.profile, self.features)
+        batched.observe(df[self.features], df["target_clv"])
+        np.testing.assert_array_equal(row_by_row._flat, batched._flat)
+
+    def test_nan_is_not_counted_in_either_path(self):
+        df = make_features(np.random.default_rng(4), 40)
+        df.loc[::3, "total_quantity"] = np.nan
+        row_by_row = DriftMonitor(self.profile, self.features)
+        for i in range(len(df)):
+            row_by_row.observe(df[self.features].iloc[i:i + 1], df["target_clv"].iloc[i:i + 1])
+        batched = DriftMonitor(self.profile, self.features)
+        batched.observe(df[self.features], df["target_clv"])
+
+        np.testing.assert_array_equal(row_by_row._flat, batched._flat)
+        self.assertEqual(batched.counts[0].sum(), df["total_quantity"].notna().sum())
+        self.assertEqual(batched.counts[1].sum(), len(df))
+
+    def test_counts_are_bounded_and_published(self):
+        published = []
+        monitor = DriftMonitor(self.profile, self.features, window=1000, publish_every=500,
+                               on_publish=published.append)
+        self.observe(monitor, make_features(np.random.default_rng(2), 5000))
+        self.assertEqual(monitor.rows, 5000)
+        self.assertLess(monitor.counts[0].sum(), 2000)
+        self.assertEqual(len(published), 10)
+        self.assertEqual(set(published[-1]), set(self.features + [PREDICTION]))
+
+    def test_prediction_reference_comes_from_the_model(self):
+        rng = np.random.default_rng(5)
+        df = make_features(rng, 8000)
+        df["target_clv"] = np.log1p(df["total_quantity"]) + rng.normal(0, 2, len(df))
+        train, test = df.iloc[:6000], df.iloc[6000:]
+        model = RandomForestRegressor(n_estimators=20, min_samples_leaf=5, random_state=0)
+        model.fit(train[self.features], train["target_clv"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prediction_profile.json")
+            save_prediction_profile(model, test, path)
+            profile = build_profile(train, self.features)
+            profile["features"][PREDICTION] = load_profile(path)["features"][PREDICTION]
+        from_target = build_profile(train, self.features, predictions=train["target_clv"])
+
+        # Replaying the training rows: the forest's predictions are much narrower than the targets
+        scores = {}
+        for name, reference in (("model", profile), ("target", from_target)):
+            monitor = DriftMonitor(reference, self.features, window=10 ** 9)
+            monitor.observe(train[self.features], model.predict(train[self.features]))
+            scores[name] = monitor.scores()[PREDICTION][0]
+        self.assertLess(scores["model"], 0.1)
+        self.assertGreater(scores["target"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import itertools
+import math
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from src.model.explain import TreeExplainer
+
+
+def expected_value(tree, x, subset, node=0):
+    """Path-dependent E[f(x) | x_S] (Lundberg et al., Algorithm 1)."""
+    if tree.children_left[node] == -1:
+        return tree.value[node, 0, 0]
+    left, right = tree.children_left[node], tree.children_right[node]
+    if tree.feature[node] in subset:
+        child = left if x[tree.feature[node]] <= tree.threshold[node] else right
+        return expected_value(tree, x, subset, child)
+    weight = tree.weighted_n_node_samples
+    return (weight[left] * expected_value(tree, x, subset, left)
+            + weight[right] * expected_value(tree, x, subset, right)) / weight[node]
+
+
+def brute_force_shap(model, x):
+    m = model.n_features_in_
+    x = x.astype(np.float32)
+
+    def v(subset):
+        return np.mean([expected_value(e.tree_, x, subset) for e in model.estimators_])
+
+    phi = np.zeros(m)
+    for i in range(m):
+        others = [j for j in range(m) if j != i]
+        for size in range(m):
+            weight = math.factorial(size) * math.factorial(m - size - 1) / math.factorial(m)
+            for subset in itertools.combinations(others, size):
+                phi[i] += weight * (v(set(subset) | {i}) - v(set(subset)))
+    return phi
+
+
+def forest(n_features, n_estimators, max_depth, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(400, n_features))
+    X[:, 0] = rng.integers(0, 3, 400)
+    y = X[:, 0] * X[:, 1] + np.sin(X[:, 2]) + rng.normal(scale=0.1, size=400)
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, random_state=seed).fit(X, y)
+    return model, X
+
+
+class TreeExplainerTests(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        model, X = forest(n_features=5, n_estimators=4, max_depth=6)
+        explainer = TreeExplainer(model)
+        phi = explainer.explain(X[:5])
+        for row, x in zip(phi, X[:5]):
+            np.testing.assert_allclose(row, brute_force_shap(model, x), atol=1e-10)
+
+    def test_local_accuracy(self):
+        model, X = forest(n_features=8, n_estimators=50, max_depth=10, seed=1)
+        explainer = TreeExplainer(model)
+        phi = explainer.explain(X)
+        np.testing.assert_allclose(phi.sum(axis=1) + explainer.expected_value, model.predict(X), atol=1e-9)
+
+    def test_cache_returns_same_values(self):
+        model, X = forest(n_features=4, n_estimators=10, max_depth=5)
+        explainer = TreeExplainer(model, version="1", cache_size=3)
+        first = explainer.explain(X[:5])
+        self.assertEqual(len(explainer._cache), 3)
+        np.testing.assert_allclose(explainer.explain(X[[4, 0, 3]]), first[[4, 0, 3]], atol=1e-12)
+        self.assertIn(X[0].astype(np.float32).tobytes(), explainer._cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
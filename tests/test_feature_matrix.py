@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from src.data.synthetic import generate_transactions
+from src.data.data_preprocessing import preprocessing
+from src.features.feature_engineering import build_features, save_matrix
+from src.model.diagnostics import _npy_file, permutation_importance
+from src.model.model_building import model_traing
+from src.utils import load_matrix, matrix_paths, model_fingerprint
+
+PARAMS = {"random_forest": {"n_estimators": 10, "max_depth": 8, "min_samples_leaf": 2, "max_features": 1.0,
+                            "min_samples_split": 2, "random_state": 0}}
+
+
+class FeatureMatrixTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = build_features(preprocessing(generate_transactions(60_000, seed=21)), backend="numpy")
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "processed", "train")
+
+    def test_round_trip_is_mapped_without_copies(self):
+        save_matrix(self.df, self.path)
+        X, y = load_matrix(self.path)
+
+        self.assertEqual(list(X.columns), [column for column in self.df.columns if column != "target_clv"])
+        self.assertTrue((X.dtypes == np.float32).all())
+        np.testing.assert_array_equal(X.to_numpy(), self.df.drop(columns=["target_clv"]).to_numpy(dtype=np.float32))
+        np.testing.assert_array_equal(y.to_numpy(), self.df["target_clv"].to_numpy())
+        # X is the mapped file itself, read-only
+        self.assertEqual(_npy_file(X.to_numpy()), matrix_paths(self.path)[0])
+        self.assertFalse(X.to_numpy().flags.writeable)
+        self.assertIsNone(_npy_file(X.to_numpy()[:10]))
+
+        with open(matrix_paths(self.path)[2]) as file:
+            meta = json.load(file)
+        self.assertEqual(meta["source_dtypes"]["unique_invoices"], "int64")
+
+    def test_same_model_as_from_the_frame(self):
+        save_matrix(self.df, self.path)
+        frame_model = model_traing(self.df.drop(columns=["target_clv"]), self.df["target_clv"], PARAMS)
+        matrix_model = model_traing(*load_matrix(self.path), PARAMS)
+
+        # The forest casts its input to float32, so the float32 matrix loses nothing
+        self.assertEqual(model_fingerprint(matrix_model), model_fingerprint(frame_model))
+        X, y = load_matrix(self.path)
+        np.testing.assert_array_equal(matrix_model.predict(X), frame_model.predict(self.df.drop(columns=["target_clv"])))
+        # Workers map the matrix file rather than a temporary copy
+        self.assertEqual(permutation_importance(matrix_model, X, y, n_repeats=2, n_jobs=2),
+                         permutation_importance(matrix_model, X, y, n_repeats=2, n_jobs=1))
+
+    def test_sidecar_mismatch_is_rejected(self):
+        save_matrix(self.df, self.path)
+        np.save(matrix_paths(self.path)[1], np.zeros(3))
+        with self.assertRaises(ValueError):
+            load_matrix(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
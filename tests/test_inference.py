@@ -0,0 +1,71 @@
+import os
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from src.serving.inference import STRATEGIES, AdaptivePredictor, worker_threads
+
+
+class AdaptivePredictorTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        cls.X = pd.DataFrame({"a": rng.integers(0, 1000, 500), "b": rng.normal(size=500),
+                              "c": rng.integers(0, 2, 500)})
+        y = np.log1p(cls.X["a"] / 10 + 5 * cls.X["c"] + rng.gamma(2.0, 1.0, 500))
+        cls.forest = RandomForestRegressor(n_estimators=20, random_state=0).fit(cls.X, y)
+
+    def test_strategies_match_sklearn(self):
+        predictor = AdaptivePredictor(self.forest, threads=3, calibrate=False)
+        expected = self.forest.predict(self.X)
+        for strategy in STRATEGIES:
+            with self.subTest(strategy=strategy):
+                for rows in (1, 2, 500):
+                    A = predictor._validate(self.X.iloc[:rows])
+                    if strategy == "trees":
+                        np.testing.assert_allclose(predictor._run(strategy, A), expected[:rows])
+                    else:
+                        np.testing.assert_array_equal(predictor._run(strategy, A), expected[:rows])
+
+    def test_calibrated_plan_picks_strategy_by_size(self):
+        calls = []
+        predictor = AdaptivePredictor(self.forest, threads=2, calibrate=False,
+                                      on_predict=lambda strategy, rows: calls.append((strategy, rows)))
+        timings = predictor.calibrate(sizes=(1, 64), repeats=1)
+        self.assertEqual(set(timings), {1, 64})
+        self.assertEqual(set(timings[64]), set(STRATEGIES))
+        for size, strategy in zip(predictor.sizes, predictor.strategies):
+            self.assertEqual(strategy, min(timings[size], key=timings[size].get))
+
+        predictor.sizes, predictor.strategies = [1, 64], ["inline", "rows"]
+        self.assertEqual([predictor.strategy(rows) for rows in (0, 1, 63, 64, 10_000)],
+                         ["inline", "inline", "inline", "rows", "rows"])
+        np.testing.assert_array_equal(predictor.predict(self.X.iloc[:100]), self.forest.predict(self.X.iloc[:100]))
+        self.assertEqual(calls, [("rows", 100)])
+        self.assertEqual(predictor.describe(), "inline from 1 rows, rows from 64 rows on 2 threads")
+
+    def test_rejects_bad_input(self):
+        predictor = AdaptivePredictor(self.forest, threads=1)
+        with self.assertRaises(ValueError):
+            predictor.predict(self.X[["b", "a", "c"]])
+        with self.assertRaises(ValueError):
+            predictor.predict(self.X.to_numpy()[:, :2])
+        with self.assertRaises(ValueError):
+            predictor.predict(self.X.iloc[:2].assign(b=np.nan))
+
+    def test_threads_are_shared_between_workers(self):
+        with mock.patch.object(os, "sched_getaffinity", return_value=set(range(8)), create=True), \
+                mock.patch.dict(os.environ, {"GUNICORN_WORKERS": "3"}):
+            os.environ.pop("INFERENCE_THREADS", None)
+            self.assertEqual(worker_threads(), 2)
+            os.environ["INFERENCE_THREADS"] = "5"
+            self.assertEqual(worker_threads(), 5)
+            os.environ["GUNICORN_WORKERS"] = "16"
+            os.environ.pop("INFERENCE_THREADS")
+            self.assertEqual(worker_threads(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
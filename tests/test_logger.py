@@ -0,0 +1,33 @@
+import unittest
+import json
+import logging
+from src.logger import JsonFormatter, RateLimitFilter, SamplingFilter
+
+
+def make_record(level=logging.INFO, msg="row %d", args=(1,)):
+    return logging.LogRecord("hot", level, __file__, 1, msg, args, None)
+
+
+class LoggerTests(unittest.TestCase):
+
+    def test_rate_limit_drops_info_but_keeps_warnings(self):
+        limiter = RateLimitFilter(rate=0.001, burst=5)
+        passed = sum(limiter.filter(make_record()) for _ in range(50))
+        self.assertEqual(passed, 5)
+        self.assertEqual(limiter.dropped, 45)
+        self.assertTrue(limiter.filter(make_record(level=logging.WARNING)))
+
+    def test_sampling_filter(self):
+        self.assertFalse(SamplingFilter(0.0).filter(make_record()))
+        self.assertTrue(SamplingFilter(1.0).filter(make_record()))
+        self.assertTrue(SamplingFilter(0.0).filter(make_record(level=logging.ERROR)))
+
+    def test_json_formatter(self):
+        entry = json.loads(JsonFormatter().format(make_record()))
+        self.assertEqual(entry["message"], "row 1")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "hot")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
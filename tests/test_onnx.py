@@ -0,0 +1,68 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from src.data.synthetic import generate_transactions
+from src.data.data_preprocessing import preprocessing
+from src.features.feature_engineering import build_features, build_snapshot
+
+
+@unittest.skipUnless(importlib.util.find_spec("skl2onnx") and importlib.util.find_spec("onnxruntime"),
+                     "skl2onnx or onnxruntime is not installed")
+class OnnxModelTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = preprocessing(generate_transactions(50_000, seed=8))
+        features = build_features(cls.df.copy())
+        cls.X = features.drop(columns=["target_clv"])
+        cls.model = RandomForestRegressor(n_estimators=20, max_depth=8, min_samples_leaf=5,
+                                          random_state=0).fit(cls.X, features["target_clv"])
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.onnx_path = os.path.join(cls.tmp.name, "rf_model.onnx")
+
+        from src.model.onnx_model import export_and_verify
+
+        cls.report = export_and_verify(cls.model, features, {"onnx": {"tolerance": 1e-4}}, cls.onnx_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_matches_sklearn_on_float32_array(self):
+        from src.model.onnx_model import OnnxRegressor
+        from src.utils import model_fingerprint
+
+        onnx_model = OnnxRegressor(self.onnx_path)
+        self.assertEqual(onnx_model.fingerprint, model_fingerprint(self.model))
+        self.assertEqual(onnx_model.feature_names, list(self.X.columns))
+        self.assertEqual(self.report["rows"], len(self.X))
+        self.assertEqual(self.report["rows_over_tolerance"], 0)
+        preds = onnx_model.predict(self.X.to_numpy(dtype=np.float32)[:1])
+        self.assertEqual(preds.dtype, np.float64)
+        np.testing.assert_allclose(preds, self.model.predict(self.X.iloc[:1]), atol=1e-4)
+
+    def test_parity_failure_raises(self):
+        from src.model.onnx_model import OnnxRegressor, check_parity
+
+        other = RandomForestRegressor(n_estimators=5, random_state=1).fit(self.X, np.zeros(len(self.X)))
+        with self.assertRaises(ValueError):
+            check_parity(other, OnnxRegressor(self.onnx_path), self.X, 1e-4)
+
+    def test_batch_scoring_with_onnx_runtime(self):
+        from src.model.batch_scoring import score_customers
+        from src.serving.prediction_store import PredictionStore
+        from src.utils import model_fingerprint
+
+        snapshot = build_snapshot(self.df)
+        store_path = os.path.join(self.tmp.name, "p.sqlite")
+        score_customers(self.model, snapshot, store_path, os.path.join(self.tmp.name, "r.npz"),
+                        runtime="onnx", onnx_path=self.onnx_path)
+        stored = PredictionStore(store_path, model_fingerprint(self.model)).lookup(snapshot["Customer ID"])
+        np.testing.assert_allclose(stored, self.model.predict(snapshot.drop(columns=["Customer ID"])), atol=1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main()
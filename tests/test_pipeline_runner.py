@@ -0,0 +1,204 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+import numpy as np
+import pandas as pd
+import yaml
+from src import perf
+from src.pipeline.runner import PipelineRunner, Stage, STAGES, _tracked_run, plan, resolve_deps
+
+
+def make_transactions():
+    rows = []
+    dates = pd.date_range("2010-01-01", periods=400, freq="D")
+    for customer in range(20):
+        for i in range(6):
+            date = dates[(customer * 17 + i * 61) % len(dates)]
+            invoice = f"{'C' if i == 5 else ''}{customer * 10 + i}"
+            rows.append((invoice, date, 2 + i, 1.5 + customer * 0.1, float(customer)))
+    rows.append(("999", dates[-1], 1, 1.0, None))
+    return pd.DataFrame(rows, columns=["Invoice", "InvoiceDate", "Quantity", "Price", "Customer ID"])
+
+
+class PipelineRunnerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        with open("params.yaml", "w") as file:
+            yaml.safe_dump({"feature_engineering": {"test_size": 0.25}, "toy": {"scale": 2}}, file)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def toy_stages(self, calls):
+        def record(name, value):
+            calls.append(name)
+            return value
+
+        def save(path):
+            def _save(value):
+                with open(path, "w") as file:
+                    file.write(str(value))
+            return _save
+
+        def load(path):
+            return lambda: int(open(path).read())
+
+        return [
+            Stage("source", lambda i, p: record("source", 3), outs=["source.txt"],
+                  save=save("source.txt"), load=load("source.txt")),
+            Stage("left", lambda i, p: record("left", i["source"] * p["toy"]["scale"]),
+                  deps=["source"], params=["toy"], outs=["left.txt"],
+                  save=save("left.txt"), load=load("left.txt")),
+            Stage("right", lambda i, p: record("right", i["source"] + 1),
+                  deps=["source"], outs=["right.txt"],
+                  save=save("right.txt"), load=load("right.txt")),
+            Stage("join", lambda i, p: record("join", i["left"] + i["right"]),
+                  deps=["left", "right"], outs=["join.txt"],
+                  save=save("join.txt"), load=load("join.txt")),
+        ]
+
+    def test_runs_dag_and_skips_unchanged_stages(self):
+        calls = []
+        outputs = PipelineRunner(self.toy_stages(calls)).run()
+        self.assertEqual(outputs["join"], 3 * 2 + 3 + 1)
+        self.assertEqual(sorted(calls), ["join", "left", "right", "source"])
+
+        calls.clear()
+        self.assertEqual(PipelineRunner(self.toy_stages(calls)).run(), {})
+        self.assertEqual(calls, [])
+
+    def test_param_change_reruns_only_dependent_stages(self):
+        PipelineRunner(self.toy_stages([])).run()
+        with open("params.yaml", "w") as file:
+            yaml.safe_dump({"feature_engineering": {"test_size": 0.25}, "toy": {"scale": 5}}, file)
+
+        calls = []
+        outputs = PipelineRunner(self.toy_stages(calls)).run()
+        self.assertEqual(sorted(calls), ["join", "left"])
+        self.assertEqual(outputs["join"], 3 * 5 + 3 + 1)
+
+    def test_missing_out_reruns_stage(self):
+        PipelineRunner(self.toy_stages([])).run()
+        os.remove("right.txt")
+
+        calls = []
+        PipelineRunner(self.toy_stages(calls)).run()
+        self.assertEqual(calls, ["right"])
+
+    def test_independent_branches_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def branch(value):
+            def _run(inputs, params):
+                barrier.wait()
+                return value
+            return _run
+
+        stages = [
+            Stage("a", branch(1), outs=["a.txt"]),
+            Stage("b", branch(2), outs=["b.txt"]),
+        ]
+        outputs = PipelineRunner(stages, max_workers=2).run()
+        self.assertEqual(outputs, {"a": 1, "b": 2})
+
+    def test_rescoring_reruns_only_batch_scoring(self):
+        for stage in STAGES:
+            for path in stage.outs:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                open(path, "w").close()
+        keys = {stage.name: stage.name for stage in STAGES}
+        state = {"stages": dict(keys, batch_scoring="stale"), "files": {}}
+
+        for runtime in ("sklearn", "onnx"):
+            stages = resolve_deps(STAGES, {"batch_scoring": {"runtime": runtime}})
+            self.assertEqual(plan(stages, keys, state), {"batch_scoring"})
+
+    def test_onnx_export_is_a_dep_only_for_the_onnx_runtime(self):
+        def scoring_deps(runtime):
+            stages = resolve_deps(STAGES, {"batch_scoring": {"runtime": runtime}})
+            return next(stage.deps for stage in stages if stage.name == "batch_scoring")
+
+        self.assertNotIn("onnx_export", scoring_deps("sklearn"))
+        self.assertIn("onnx_export", scoring_deps("onnx"))
+
+    def test_parallel_stages_log_to_their_own_mlflow_runs(self):
+        import mlflow
+
+        def log(name):
+            with _tracked_run(run_name=name) as run:
+                for step in range(5):
+                    mlflow.log_metric(name, step)
+                    time.sleep(0.01)
+                runs[name] = run.info.run_id
+
+        runs = {}
+        uri = f"file:{os.path.join(self.tmp.name, 'mlruns')}"
+        with mock.patch("src.model.model_evaluation.setup_tracking", lambda: mlflow.set_tracking_uri(uri)):
+            threads = [threading.Thread(target=log, args=(name,)) for name in ("surrogate", "evaluation")]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        client = mlflow.MlflowClient(uri)
+        for name, run_id in runs.items():
+            run = client.get_run(run_id)
+            self.assertEqual(set(run.data.metrics), {name})
+            self.assertEqual(run.info.status, "FINISHED")
+
+    def test_feature_stages_in_memory(self):
+        raw = make_transactions()
+        stages = [Stage("data_ingestion", lambda i, p: raw.copy(), outs=["data/raw/data.csv"],
+                        save=STAGES[0].save, load=STAGES[0].load, intermediate=True)]
+        stages += STAGES[1:3]
+
+        outputs = PipelineRunner(stages, persist_intermediate=False).run()
+        train_df, test_df = outputs["feature_engineering"]
+
+        self.assertFalse(os.path.exists("data/raw/data.csv"))
+        self.assertFalse(os.path.exists("data/interim/data.csv"))
+        self.assertTrue(os.path.exists("data/processed/train_data.csv"))
+        self.assertEqual(len(pd.read_csv("data/processed/train_data.csv")), len(train_df))
+        self.assertIn("target_clv", train_df.columns)
+
+    def test_writes_perf_report(self):
+        raw = make_transactions()
+        stages = [Stage("data_ingestion", lambda i, p: raw.copy(), outs=["data/raw/data.csv"],
+                        save=STAGES[0].save, load=STAGES[0].load, intermediate=True)]
+        stages += STAGES[1:3]
+        PipelineRunner(stages).run()
+
+        with open("reports/perf.json") as file:
+            report = json.load(file)
+        stage = report["feature_engineering"]
+        self.assertIn("build_features.groupby", stage["steps"])
+        self.assertIn("save_outs", stage["steps"])
+        for key in ("wall_s", "cpu_s", "peak_rss_mb"):
+            self.assertGreater(stage[key], 0)
+        self.assertIn("rss_growth_mb", stage)
+        self.assertTrue(os.path.exists("reports/perf/data_preprocessing.json"))
+
+    def test_rss_is_measured_per_stage(self):
+        with perf.stage("large"):
+            block = np.ones(20_000_000)
+        del block
+        with perf.stage("small"):
+            pass
+
+        records = perf.get_records()
+        self.assertGreater(records["large"]["rss_growth_mb"], 100)
+        self.assertLess(records["small"]["rss_growth_mb"], 10)
+        # The small stage no longer reports the large one's peak
+        self.assertLess(records["small"]["peak_rss_mb"], records["large"]["peak_rss_mb"] - 100)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,78 @@
+import glob
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+import pandas as pd
+from src.serving.prediction_log import PredictionLog, read_prediction_logs
+
+FEATURES = ["a", "b"]
+
+
+def frame(rows, start=0):
+    return pd.DataFrame({"a": np.arange(start, start + rows, dtype=float), "b": 1.0})
+
+
+class PredictionLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.written, self.dropped = [], []
+
+    def make_log(self, **kwargs):
+        return PredictionLog(self.tmp.name, FEATURES, on_write=self.written.append,
+                             on_drop=lambda rows, reason: self.dropped.append((rows, reason)), **kwargs)
+
+    def test_rows_round_trip_across_buffer_wraps(self):
+        log = self.make_log(capacity=10, flush_rows=4, flush_interval=0.05)
+        expected = []
+        for i in range(10):
+            X = frame(3, start=3 * i)
+            stored = np.array([False, True, False]) if i == 4 else None
+            ids = [100 + 3 * i, 101 + 3 * i, None] if i % 2 else None
+            # The buffer holds three requests, so wait for the writer when it is full
+            while not log.record(X, X["a"].to_numpy() / 10, "7", "/predict", "live", stored, ids):
+                time.sleep(0.01)
+            expected.append(X.assign(customer_id=pd.array(ids or [None] * 3, dtype="Int64"),
+                                     prediction_log=X["a"] / 10,
+                                     source=["live", "store", "live"] if stored is not None else "live"))
+        log.close()
+        self.assertFalse(glob.glob(os.path.join(self.tmp.name, "*", "*.inprogress")))
+
+        df = read_prediction_logs(self.tmp.name, pd.Timestamp.now("UTC") - pd.Timedelta(hours=1),
+                                  pd.Timestamp.now("UTC") + pd.Timedelta(hours=1))
+        expected = pd.concat(expected, ignore_index=True)
+        self.assertEqual(sum(self.written), 30)
+        self.assertTrue(all(reason == "overflow" for rows, reason in self.dropped))
+        self.assertEqual(list(df.columns), ["timestamp", "model_version", "endpoint", "source", "customer_id",
+                                            "a", "b", "prediction_log"])
+        np.testing.assert_array_equal(df["a"], expected["a"])
+        np.testing.assert_array_equal(df["prediction_log"], expected["prediction_log"])
+        self.assertEqual(df["source"].astype(str).tolist(), expected["source"].tolist())
+        self.assertEqual(df["customer_id"].astype("Int64").tolist(), expected["customer_id"].tolist())
+        self.assertEqual(set(df["model_version"].astype(str)), {"7"})
+
+    def test_full_buffer_drops_rows(self):
+        log = self.make_log(capacity=5, flush_rows=5, flush_interval=60)
+        self.assertTrue(log.record(frame(4), np.zeros(4), "1", "/predict"))
+        self.assertFalse(log.record(frame(2), np.zeros(2), "1", "/predict"))
+        log.close()
+        self.assertEqual(self.dropped, [(2, "overflow")])
+        self.assertEqual(self.written, [4])
+
+    def test_reader_filters_the_date_range(self):
+        log = self.make_log()
+        log.record(frame(2), np.zeros(2), "1", "/predict-form")
+        log.close()
+        today = pd.Timestamp.now("UTC").normalize().tz_localize(None)
+        self.assertEqual(len(read_prediction_logs(self.tmp.name, today, today + pd.Timedelta(days=1))), 2)
+        self.assertEqual(len(read_prediction_logs(self.tmp.name, today - pd.Timedelta(days=3), today)), 0)
+        self.assertEqual(list(read_prediction_logs(self.tmp.name, "2000-01-01", "2000-01-02",
+                                                   columns=["prediction_log"]).columns),
+                         ["timestamp", "prediction_log"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from src.data.synthetic import generate_transactions
+from src.data.data_preprocessing import preprocessing
+from src.features.feature_engineering import build_features, build_snapshot
+from src.model.batch_scoring import score_customers
+from src.serving.prediction_store import PredictionStore, write_store
+from src.serving.ranking import Ranking
+from src.utils import model_fingerprint
+
+
+class PredictionStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "predictions.sqlite")
+        self.ids = np.arange(10_000, 12_500)
+        self.preds = np.random.default_rng(0).normal(5, 1, len(self.ids))
+        write_store(self.path, self.ids[::-1], self.preds[::-1], "abc", "3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lookup_single_and_batches(self):
+        store = PredictionStore(self.path, "abc")
+        self.assertEqual(store.n_customers, len(self.ids))
+        self.assertEqual(store.lookup([10_007])[0], self.preds[7])
+        # More IDs than one IN (...) query takes, with repeats and in any order
+        wanted = np.concatenate([self.ids[::-1], self.ids[:10]])
+        np.testing.assert_array_equal(store.lookup(wanted), np.concatenate([self.preds[::-1], self.preds[:10]]))
+
+    def test_unknown_and_malformed_ids(self):
+        result = PredictionStore(self.path, "abc").lookup([10_001.0, "10002", 99, None, "x", 10_003.5])
+        np.testing.assert_array_equal(result[:2], self.preds[1:3])
+        self.assertTrue(np.isnan(result[2:]).all())
+
+    def test_other_model_sees_nothing(self):
+        store = PredictionStore(self.path, "another-model")
+        self.assertEqual(store.n_customers, 0)
+        self.assertTrue(np.isnan(store.lookup([10_000])).all())
+
+    def test_connection_per_thread(self):
+        store = PredictionStore(self.path, "abc")
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(store.lookup([10_000 + i])[0]))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results), sorted(self.preds[:4]))
+
+
+class BatchScoringTests(unittest.TestCase):
+
+    def test_store_and_ranking_match_model(self):
+        df = preprocessing(generate_transactions(50_000, seed=6))
+        train = build_features(df.copy())
+        model = RandomForestRegressor(n_estimators=10, min_samples_leaf=5, random_state=0).fit(
+            train.drop(columns=["target_clv"]), train["target_clv"])
+        snapshot = build_snapshot(df)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path, ranking_path = os.path.join(tmp, "p.sqlite"), os.path.join(tmp, "r.npz")
+            self.assertEqual(score_customers(model, snapshot, store_path, ranking_path), len(snapshot))
+            store = PredictionStore(store_path, model_fingerprint(model))
+            ranking = Ranking.load(ranking_path)
+            stored = store.lookup(snapshot["Customer ID"])
+
+        expected = model.predict(snapshot.drop(columns=["Customer ID"]))
+        np.testing.assert_array_equal(stored, expected)
+        self.assertEqual(ranking.fingerprint, store.fingerprint)
+        self.assertAlmostEqual(ranking.top(1)[0][0]["predicted_clv"], float(np.expm1(expected.max())))
+
+
+if __name__ == "__main__":
+    unittest.main()
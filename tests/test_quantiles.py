@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from src.model.quantiles import LeafQuantiles, parse_quantiles, interval_coverage
+
+
+def training_data(seed=0, n=600):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(n, 3)), columns=["a", "b", "c"])
+    y = np.round(X["a"] * 2 + rng.gamma(2.0, 1.0 + np.abs(X["b"]), n), 1)
+    return X, y
+
+
+def brute_force_quantiles(model, X_train, y_train, X, quantiles):
+    """Meinshausen's weights from the training rows sharing each leaf."""
+    train_leaves, leaves = model.apply(X_train), model.apply(X)
+    values = np.sort(np.unique(y_train))
+    result = np.empty((len(X), len(quantiles)))
+    for i, row in enumerate(leaves):
+        same = train_leaves == row
+        weights = (same / same.sum(axis=0)).mean(axis=1)
+        cdf = np.array([weights[y_train <= v].sum() for v in values])
+        for j, q in enumerate(quantiles):
+            result[i, j] = values[np.searchsorted(cdf, q - 1e-12)]
+    return result
+
+
+class LeafQuantilesTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.X, cls.y = training_data()
+        cls.model = RandomForestRegressor(n_estimators=20, min_samples_leaf=5, random_state=0).fit(cls.X, cls.y)
+
+    def test_matches_brute_force_when_sketch_holds_whole_leaf(self):
+        sketch = LeafQuantiles(self.model, self.X, self.y, sketch_size=len(self.X))
+        X_new, _ = training_data(seed=1, n=25)
+        quantiles = [0.1, 0.5, 0.9]
+        point, result = sketch.predict(self.model, X_new, quantiles)
+        np.testing.assert_array_equal(result, brute_force_quantiles(self.model, self.X, self.y.to_numpy(), X_new, quantiles))
+        np.testing.assert_array_equal(point, self.model.predict(X_new))
+
+    def test_sketched_intervals(self):
+        self.model.leaf_quantiles_ = LeafQuantiles(self.model, self.X, self.y, sketch_size=4)
+        X_new, y_new = training_data(seed=2, n=400)
+        _, result = self.model.leaf_quantiles_.predict(self.model, X_new, [0.1, 0.5, 0.9])
+        self.assertTrue(np.all(np.diff(result, axis=1) >= 0))
+        self.assertGreater(interval_coverage(self.model, X_new, y_new), 0.6)
+
+    def test_parse_quantiles(self):
+        np.testing.assert_array_equal(parse_quantiles("0.1, 0.9"), [0.1, 0.9])
+        for text in ["", "0", "1.5", ",".join(["0.5"] * 10), "low"]:
+            with self.assertRaises(ValueError):
+                parse_quantiles(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from src.data.synthetic import generate_transactions
+from src.data.data_preprocessing import preprocessing
+from src.features.feature_engineering import build_features, build_snapshot
+from src.model.diagnostics import segment_labels
+from src.serving.ranking import Ranking, build_ranking
+
+
+class RankingTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        df = preprocessing(generate_transactions(100_000, seed=4))
+        train = build_features(df.copy())
+        cls.model = RandomForestRegressor(n_estimators=10, min_samples_leaf=5, random_state=0).fit(
+            train.drop(columns=["target_clv"]), train["target_clv"])
+        cls.snapshot = build_snapshot(df)
+        cls.ranking = build_ranking(cls.model, cls.snapshot, "7")
+        cls.expected = np.expm1(cls.model.predict(cls.snapshot.drop(columns=["Customer ID"])))
+
+    def brute_force(self, mask):
+        rows = np.flatnonzero(mask)
+        return rows[np.argsort(-self.expected[rows], kind="stable")]
+
+    def ids(self, customers):
+        return [customer["customer_id"] for customer in customers]
+
+    def test_snapshot_covers_every_customer(self):
+        self.assertEqual(len(self.snapshot), self.snapshot["Customer ID"].nunique())
+        self.assertEqual(list(self.snapshot.columns[1:]), list(self.model.feature_names_in_))
+
+    def test_top_k_matches_full_sort(self):
+        customers, total = self.ranking.top(20)
+        order = self.brute_force(np.ones(len(self.snapshot), dtype=bool))
+        self.assertEqual(total, len(self.snapshot))
+        self.assertEqual(self.ids(customers), self.snapshot["Customer ID"].to_numpy()[order[:20]].astype(int).tolist())
+        self.assertEqual([customer["rank"] for customer in customers], list(range(1, 21)))
+        np.testing.assert_allclose([customer["predicted_clv"] for customer in customers], self.expected[order[:20]])
+
+    def test_filters_and_pagination(self):
+        tenure = segment_labels(self.snapshot)["tenure"].astype(str).to_numpy()
+        mask = (self.snapshot["is_onetime_buyer"].to_numpy() == 0) & (tenure == "365-730d")
+        order = self.brute_force(mask)
+        ids = self.snapshot["Customer ID"].to_numpy()[order].astype(int).tolist()
+
+        pages = []
+        for offset in range(0, len(ids), 7):
+            customers, total = self.ranking.top(7, offset, {"is_onetime_buyer": 0, "tenure": "365-730d"})
+            self.assertEqual(total, len(ids))
+            pages += self.ids(customers)
+        self.assertEqual(pages, ids)
+
+        _, total = self.ranking.top(5, filters={"tenure": "no-such-bucket"})
+        self.assertEqual(total, 0)
+        with self.assertRaises(ValueError):
+            self.ranking.top(5, filters={"country": "EIRE"})
+        with self.assertRaises(ValueError):
+            self.ranking.top(0)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ranking.npz")
+            self.ranking.save(path)
+            loaded = Ranking.load(path)
+        self.assertEqual(loaded.fingerprint, self.ranking.fingerprint)
+        self.assertEqual(loaded.model_version, "7")
+        self.assertEqual(loaded.top(50, 10, {"is_onetime_buyer": "1"}), self.ranking.top(50, 10, {"is_onetime_buyer": "1"}))
+
+    def test_fingerprint_changes_with_model(self):
+        other = RandomForestRegressor(n_estimators=10, min_samples_leaf=5, random_state=1).fit(
+            self.snapshot.drop(columns=["Customer ID"]), np.log1p(self.expected))
+        self.assertNotEqual(build_ranking(other, self.snapshot).fingerprint, self.ranking.fingerprint)
+
+
+if __name__ == "__main__":
+    unittest.main()
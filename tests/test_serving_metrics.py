@@ -0,0 +1,30 @@
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from src.serving.metrics import registry, phase, model_nbytes, generate_metrics
+
+
+class ServingMetricsTests(unittest.TestCase):
+
+    def test_phase_observes_duration(self):
+        labels = {"endpoint": "/test", "phase": "predict"}
+        before = registry.get_sample_value("app_request_phase_seconds_sum", labels) or 0.0
+        with phase("/test", "predict"):
+            sum(range(1000))
+        after = registry.get_sample_value("app_request_phase_seconds_sum", labels)
+        self.assertGreater(after, before)
+
+        body, content_type = generate_metrics()
+        self.assertIn(b'app_request_phase_seconds_count{endpoint="/test",phase="predict"} 1.0', body)
+        self.assertTrue(content_type.startswith("text/plain"))
+
+    def test_model_nbytes(self):
+        rng = np.random.default_rng(0)
+        model = RandomForestRegressor(n_estimators=3, random_state=0).fit(rng.random((50, 4)), rng.random(50))
+        expected = sum(e.tree_.__getstate__()["nodes"].nbytes + e.tree_.value.nbytes for e in model.estimators_)
+        self.assertEqual(model_nbytes(model), expected)
+        self.assertEqual(model_nbytes(object()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from src.serving.shadow import ShadowScorer
+
+
+class ShadowScorerTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        cls.X = rng.random((20, 3))
+        cls.model = RandomForestRegressor(n_estimators=5, random_state=0).fit(cls.X, rng.random(20))
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, "candidate.pkl")
+        with open(cls.path, "wb") as file:
+            pickle.dump(cls.model, file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_scores_sampled_batches_and_drops_when_busy(self):
+        results, skipped, done = [], [], threading.Event()
+
+        def on_result(production, candidate, seconds):
+            results.append((production, candidate, seconds))
+            done.set()
+
+        scorer = ShadowScorer(self.path, sample_rate=1.0, max_pending=1,
+                              on_result=on_result, on_skip=skipped.append)
+        try:
+            production = np.zeros(len(self.X))
+            self.assertTrue(scorer.submit(self.X, production))
+            # The first batch is still waiting for the candidate to load
+            self.assertFalse(scorer.submit(self.X, production))
+            self.assertTrue(done.wait(60))
+        finally:
+            scorer.close()
+
+        self.assertEqual(skipped, ["busy"])
+        np.testing.assert_array_equal(results[0][1], self.model.predict(self.X))
+        self.assertGreater(results[0][2], 0)
+
+    def test_sample_rate_zero_never_submits(self):
+        scorer = ShadowScorer(self.path, sample_rate=0.0)
+        try:
+            self.assertFalse(scorer.submit(self.X, np.zeros(len(self.X))))
+        finally:
+            scorer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
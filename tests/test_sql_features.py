@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from src.data.synthetic import generate_transactions, write_transactions
+from src.data.data_preprocessing import preprocessing
+from src.features.feature_engineering import build_features
+
+
+class SqlFeaturesTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from src.features.sql_features import build_features_sql
+
+        cls.build_features_sql = staticmethod(build_features_sql)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.csv_path = write_transactions(os.path.join(cls.tmp.name, "raw.csv"), 200_000, seed=5)
+        cls.expected = build_features(preprocessing(pd.read_csv(cls.csv_path)), backend="pandas")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def assert_matches(self, result):
+        # Parallel float sums may differ from pandas in the last bits
+        pd.testing.assert_frame_equal(result, self.expected, check_exact=False, rtol=1e-9, atol=0.011)
+        for column in ["unique_invoices", "total_quantity", "customer_age_days",
+                       "days_since_last_purchase", "is_onetime_buyer"]:
+            pd.testing.assert_series_equal(result[column], self.expected[column], check_exact=True)
+
+    def test_raw_csv_matches_pandas(self):
+        self.assert_matches(self.build_features_sql(self.csv_path))
+
+    def test_spills_under_memory_limit(self):
+        spill_dir = os.path.join(self.tmp.name, "spill")
+        result = self.build_features_sql(self.csv_path, memory_limit="64MB", threads=2, temp_directory=spill_dir)
+        self.assert_matches(result)
+
+    def test_dataframe_source_through_build_features(self):
+        df = preprocessing(generate_transactions(50_000, seed=9))
+        expected = build_features(df.copy(), backend="pandas")
+        result = build_features(df, backend="duckdb")
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9, atol=0.011)
+
+    def test_historical_cutoff_matches_pandas(self):
+        df = preprocessing(generate_transactions(50_000, seed=9))
+        cutoff = pd.Timestamp("2011-03-01 12:00:00")
+        expected = build_features(df.copy(), backend="pandas", cutoff_date=cutoff, horizon_days=60)
+        result = build_features(df, backend="duckdb", cutoff_date=cutoff, horizon_days=60)
+        pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9, atol=0.011)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+import importlib.util
+import os
+
+REPORT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "benchmarks", "import_time_report.py")
+spec = importlib.util.spec_from_file_location("import_time_report", REPORT_PATH)
+import_time_report = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(import_time_report)
+
+
+class StartupBudgetTests(unittest.TestCase):
+    """Entry points must import within their budget (see benchmarks/import_time_report.py)."""
+
+    def test_entry_points_within_budget(self):
+        for module, budget in import_time_report.ENTRY_POINTS.items():
+            with self.subTest(module=module):
+                total_ms = min(import_time_report.measure(module)[0] for _ in range(2))
+                self.assertLessEqual(total_ms, budget, f"{module} imports in {total_ms:.0f} ms")
+
+    def test_no_remote_setup_or_metrics_stack_at_import(self):
+        _, breakdown = import_time_report.measure("src.data.data_ingestion")
+        self.assertNotIn("sklearn", breakdown)
+        self.assertNotIn("scipy", breakdown)
+
+        _, breakdown = import_time_report.measure("flask_app.app")
+        self.assertNotIn("mlflow", breakdown)
+        self.assertNotIn("dagshub", breakdown)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,37 @@
+import unittest
+import pandas as pd
+from src.data.synthetic import generate_transactions, COLUMNS
+from src.data.data_preprocessing import preprocessing
+from src.features.feature_engineering import build_features
+
+
+class SyntheticDataTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = generate_transactions(200_000, seed=7, chunk_rows=50_000)
+
+    def test_shape_and_schema(self):
+        self.assertEqual(len(self.df), 200_000)
+        self.assertEqual(list(self.df.columns), COLUMNS)
+        self.assertTrue(self.df["InvoiceDate"].is_monotonic_increasing)
+
+    def test_seeded(self):
+        pd.testing.assert_frame_equal(generate_transactions(5_000, seed=3), generate_transactions(5_000, seed=3))
+        self.assertFalse(generate_transactions(5_000, seed=3).equals(generate_transactions(5_000, seed=4)))
+
+    def test_online_retail_quirks(self):
+        cancelled = self.df["Invoice"].str.startswith("C")
+        self.assertTrue(0.005 < cancelled.mean() < 0.05)
+        self.assertTrue((self.df.loc[cancelled, "Quantity"] < 0).all())
+        self.assertTrue(0.1 < self.df["Customer ID"].isna().mean() < 0.35)
+        self.assertTrue((self.df["Price"] > 0).all())
+
+    def test_runs_through_feature_engineering(self):
+        features = build_features(preprocessing(self.df))
+        self.assertGreater(len(features), 50)
+        self.assertGreater(features["is_onetime_buyer"].mean(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)